@@ -0,0 +1,199 @@
+"""
+Bản asyncio của các API chỉ đọc cho dashboard (Quart + aiomysql).
+
+    hypercorn async_api:app --bind 0.0.0.0:5001 --workers 2
+    python async_api.py                     # dev
+
+- Không chiếm 1 thread / request khi chờ MySQL → 1 process phục vụ được nhiều client poll hơn
+- Các query độc lập trong 1 request (dayvalues + production_output) chạy song song
+  bằng asyncio.gather trên 2 connection của pool
+- Cùng SQL + cùng cấu trúc JSON với main.py (dashboard.py), FE chỉ cần đổi base URL
+
+Endpoint:
+    GET /api/lines
+    GET /api/lines/<idline>/machines
+    GET /api/machines/<machine_id>/day?day=
+    GET /api/lines/<line_id>/day?day=
+    GET /api/machines/day?day=&line_id= | &machine_ids=
+    GET /api/pool-stats
+"""
+import asyncio
+import os
+
+import aiomysql
+from quart import Quart, jsonify, request
+from quart_cors import cors
+
+from dashboard import (
+    LINE_DAY_SQL,
+    LINE_PRODUCT_SQL,
+    MACHINE_DAY_SQL,
+    MACHINE_PRODUCT_SQL,
+    line_day_payload,
+    machine_day_payload,
+    machines_day_items,
+    machines_day_sql,
+    machines_filter,
+)
+from db import DB_CONFIG
+from periods import parse_day
+
+POOL_MIN = int(os.environ.get("ASYNC_DB_POOL_MIN", "2"))
+POOL_MAX = int(os.environ.get("ASYNC_DB_POOL_MAX", "20"))
+POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+
+app = Quart(__name__)
+app = cors(app)
+
+_pool = None
+
+
+@app.before_serving
+async def open_pool():
+    global _pool
+    _pool = await aiomysql.create_pool(
+        host=DB_CONFIG["host"],
+        port=DB_CONFIG["port"],
+        user=DB_CONFIG["user"],
+        password=DB_CONFIG["password"],
+        db=DB_CONFIG["database"],
+        minsize=POOL_MIN,
+        maxsize=POOL_MAX,
+        pool_recycle=POOL_RECYCLE,
+        autocommit=True,
+    )
+
+
+@app.after_serving
+async def close_pool():
+    _pool.close()
+    await _pool.wait_closed()
+
+
+async def fetch_all(sql, params=()):
+    async with _pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(sql, params)
+            return await cursor.fetchall()
+
+
+async def fetch_one(sql, params=()):
+    rows = await fetch_all(sql, params)
+    return rows[0] if rows else None
+
+
+# ==== DANH MỤC ====
+@app.route("/api/lines")
+async def get_lines():
+    rows = await fetch_all("""
+        SELECT
+            LineID   AS idline,
+            LineName AS ten_line
+        FROM productionline
+    """)
+    return jsonify(rows)
+
+
+@app.route("/api/lines/<int:idline>/machines")
+async def get_machines_by_line(idline):
+    rows = await fetch_all("""
+        SELECT
+            MachineID   AS id,
+            MachineName AS name
+        FROM machine
+        WHERE LineID = %s
+        AND IsActive = 1
+    """, (idline,))
+    return jsonify(rows)
+
+
+# ==== NGÀY ====
+@app.route("/api/machines/<int:machine_id>/day")
+async def get_machine_day(machine_id):
+    day = request.args.get("day")
+    if not day:
+        return jsonify({"error": "Missing day param"}), 400
+
+    # 2 query độc lập → chạy song song
+    row, prod = await asyncio.gather(
+        fetch_one(MACHINE_DAY_SQL, (machine_id, day)),
+        fetch_one(MACHINE_PRODUCT_SQL, (machine_id, day)),
+    )
+    if not row:
+        return jsonify({"machine_id": machine_id, "day": day, "data": None})
+    return jsonify(machine_day_payload(machine_id, row, prod))
+
+
+@app.route("/api/lines/<int:line_id>/day")
+async def get_line_day(line_id):
+    day = request.args.get("day")
+    if not day:
+        return jsonify({"error": "Missing day param"}), 400
+
+    row, prod = await asyncio.gather(
+        fetch_one(LINE_DAY_SQL, (line_id, day)),
+        fetch_one(LINE_PRODUCT_SQL, (line_id, day)),
+    )
+    if not row:
+        return jsonify({"line_id": line_id, "day": day, "data": None})
+    return jsonify(line_day_payload(line_id, row, prod))
+
+
+@app.route("/api/machines/day")
+async def get_machines_day():
+    """Như /api/machines/day của main.py; query máy và query product chạy song song."""
+    day = request.args.get("day")
+    if not day:
+        return jsonify({"error": "Missing day param"}), 400
+    try:
+        day = parse_day(day)
+    except ValueError:
+        return jsonify({"error": "Invalid day format, expected YYYY-MM-DD"}), 400
+
+    line_id = request.args.get("line_id", type=int)
+    machine_ids = None
+    if line_id is None:
+        try:
+            machine_ids = sorted({
+                int(x) for x in request.args.get("machine_ids", "").split(",") if x.strip()
+            })
+        except ValueError:
+            return jsonify({"error": "Invalid machine_ids param"}), 400
+        if not machine_ids:
+            return jsonify({"error": "Missing line_id or machine_ids param"}), 400
+    where, params = machines_filter(line_id, machine_ids)
+
+    rows, prods = await asyncio.gather(
+        fetch_all(machines_day_sql(where), [day] + params),
+        fetch_all(
+            f"""
+            SELECT
+                po.machineid,
+                po.totalproduct_actual AS Total,
+                po.totalproduct_ok AS OK,
+                po.totalproduct_ng AS NG
+            FROM production_output po
+            JOIN machine m ON po.machineid = m.MachineID
+            WHERE po.days = %s AND {where}
+            """,
+            [day] + params,
+        ),
+    )
+    machines = machines_day_items(day, rows, prods)
+
+    return jsonify({"day": day.isoformat(), "line_id": line_id, "machines": machines})
+
+
+@app.route("/api/pool-stats")
+async def pool_stats():
+    return jsonify({
+        "minsize": _pool.minsize,
+        "maxsize": _pool.maxsize,
+        "size": _pool.size,
+        "free": _pool.freesize,
+        "in_use": _pool.size - _pool.freesize,
+    })
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.environ.get("ASYNC_APP_PORT", "5001")))
@@ -0,0 +1,102 @@
+"""
+Microbenchmark: code cũ (dict 11 key / dòng + cộng dồn bằng vòng for) so với aggregation.py.
+Không cần DB – dữ liệu giả giống kết quả cursor(dictionary=True) (Decimal, có NULL).
+
+    python bench/bench_aggregation.py
+    python bench/bench_aggregation.py --repeat 2000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregation import category_series, detail_rows, slot_matrix, totals  # noqa: E402
+from metrics import RATIO_COLUMNS, TIME_CATEGORIES  # noqa: E402
+
+
+def fake_rows(n_days, start=date(2025, 1, 1), null_ratio=0.05):
+    rng = random.Random(42)
+    rows = []
+    for i in range(n_days):
+        row = {"Days": start + timedelta(days=i)}
+        for c in RATIO_COLUMNS + TIME_CATEGORIES:
+            row[c] = None if rng.random() < null_ratio else Decimal(f"{rng.uniform(0, 8):.4f}")
+        rows.append(row)
+    return rows
+
+
+# ---------- CODE CŨ (copy từ handler trước khi đổi) ----------
+def legacy_month(rows, max_day=31):
+    day_map = {}
+    monthly_totals = {c: 0.0 for c in TIME_CATEGORIES}
+    for row in rows:
+        dnum = row["Days"].day
+        categories = {c: float(row.get(c) or 0.0) for c in TIME_CATEGORIES}
+        day_map[dnum] = categories
+    days = []
+    for d in range(1, max_day + 1):
+        categories = day_map[d] if d in day_map else {c: 0.0 for c in TIME_CATEGORIES}
+        for k in monthly_totals:
+            monthly_totals[k] += categories[k]
+        days.append({"day": d, "categories": categories})
+    return days, {k: round(v, 2) for k, v in monthly_totals.items()}
+
+
+def legacy_detail(rows):
+    out = []
+    for r in rows:
+        ratios = [float(r.get(c) or 0.0) for c in RATIO_COLUMNS]
+        times = [float(r.get(c) or 0.0) for c in TIME_CATEGORIES]
+        total_time = sum(times)
+        pcts = [round((v * 100.0) / total_time, 2) if total_time > 0 else 0.0 for v in times]
+        out.append([str(r["Days"])] + ratios + times + pcts)
+    return out
+
+
+# ---------- CODE MỚI ----------
+def vector_month(rows, max_day=31):
+    matrix = slot_matrix(rows, "Days", max_day)
+    return category_series(matrix, "day"), totals(matrix)
+
+
+def vector_detail(rows):
+    return detail_rows([str(r["Days"]) for r in rows], rows)
+
+
+def bench(label, fn, rows, repeat):
+    t = min(timeit.repeat(lambda: fn(rows), number=repeat, repeat=3)) / repeat
+    print(f"  {label:<10} {t * 1e6:>10.1f} µs / lần")
+    return t
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    month = fake_rows(31)
+    # phải giống hệt (==), không dùng sai số
+    assert legacy_month(month) == vector_month(month), "kết quả tháng lệch"
+    assert legacy_detail(fake_rows(365)) == vector_detail(fake_rows(365)), "kết quả export lệch"
+
+    cases = [
+        ("month API (31 dòng)", legacy_month, vector_month, month),
+        ("export tháng (31 dòng)", legacy_detail, vector_detail, month),
+        ("export 1 năm theo ngày (365 dòng)", legacy_detail, vector_detail, fake_rows(365)),
+        ("export 20 máy x 1 năm (7300 dòng)", legacy_detail, vector_detail, fake_rows(7300)),
+    ]
+    for title, old, new, rows in cases:
+        print(title)
+        repeat = max(1, args.repeat * 31 // len(rows))
+        t_old = bench("cũ", old, rows, repeat)
+        t_new = bench("numpy", new, rows, repeat)
+        print(f"  → x{t_old / t_new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+So sánh kế hoạch thực thi (EXPLAIN) + thời gian chạy giữa lọc kiểu cũ
+YEAR()/MONTH()/DATE() và lọc theo khoảng [start, end).
+
+    python bench/explain_periods.py --machine 1 --line 1 --year 2025 --month 7 --day 2025-07-14
+
+Nên chạy trước và sau `python migrate.py` để thấy type=ALL → type=range/ref.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import connect  # noqa: E402
+from periods import day_range, month_range, year_range  # noqa: E402
+
+
+def build_cases(args):
+    m_start, m_end = month_range(args.year, args.month)
+    y_start, y_end = year_range(args.year)
+    d_start, d_end = day_range(args.day)
+
+    return [
+        (
+            "machine month (dayvalues)",
+            "SELECT Days, OEERatio FROM dayvalues WHERE YEAR(Days) = %s AND MachineID = %s AND MONTH(Days) = %s",
+            (args.year, args.machine, args.month),
+            "SELECT Days, OEERatio FROM dayvalues WHERE MachineID = %s AND Days >= %s AND Days < %s",
+            (args.machine, m_start, m_end),
+        ),
+        (
+            "machine year (dayvalues)",
+            "SELECT MONTH(Days) m, SUM(Operation) FROM dayvalues WHERE MachineID = %s AND YEAR(Days) = %s GROUP BY MONTH(Days)",
+            (args.machine, args.year),
+            "SELECT MONTH(Days) m, SUM(Operation) FROM dayvalues WHERE MachineID = %s AND Days >= %s AND Days < %s GROUP BY MONTH(Days)",
+            (args.machine, y_start, y_end),
+        ),
+        (
+            "line month (dayvalues ⋈ machine)",
+            """SELECT dv.Days, SUM(dv.Operation) FROM dayvalues dv JOIN machine m ON dv.MachineID = m.MachineID
+               WHERE m.LineID = %s AND IsActive = 1 AND MONTH(dv.Days) = %s AND YEAR(dv.Days) = %s GROUP BY dv.Days""",
+            (args.line, args.month, args.year),
+            """SELECT dv.Days, SUM(dv.Operation) FROM dayvalues dv JOIN machine m ON dv.MachineID = m.MachineID
+               WHERE m.LineID = %s AND IsActive = 1 AND dv.Days >= %s AND dv.Days < %s GROUP BY dv.Days""",
+            (args.line, m_start, m_end),
+        ),
+        (
+            "error events day (errorevent ⋈ machine)",
+            """SELECT dv.MachineID, COUNT(*) FROM errorevent dv JOIN machine pl ON dv.MachineID = pl.MachineID
+               WHERE DATE(dv.StartTime) = %s AND pl.LineID = %s GROUP BY dv.MachineID""",
+            (args.day, args.line),
+            """SELECT dv.MachineID, COUNT(*) FROM errorevent dv JOIN machine pl ON dv.MachineID = pl.MachineID
+               WHERE dv.StartTime >= %s AND dv.StartTime < %s AND pl.LineID = %s GROUP BY dv.MachineID""",
+            (d_start, d_end, args.line),
+        ),
+    ]
+
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    return cursor.fetchall()
+
+
+def timed(cursor, sql, params, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000.0
+
+
+def print_plan(label, plan):
+    print(f"  {label}:")
+    for row in plan:
+        print(
+            f"    table={row.get('table')!s:<4} type={row.get('type')!s:<6} "
+            f"key={row.get('key')!s:<32} rows={row.get('rows')!s:<8} extra={row.get('Extra')}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--machine", type=int, default=1)
+    parser.add_argument("--line", type=int, default=1)
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--month", type=int, default=7)
+    parser.add_argument("--day", default="2025-07-14")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+
+    for name, old_sql, old_params, new_sql, new_params in build_cases(args):
+        print(f"=== {name} ===")
+        print_plan("cũ  (hàm trên cột)", explain(cursor, old_sql, old_params))
+        print_plan("mới (khoảng [start, end))", explain(cursor, new_sql, new_params))
+        old_ms = timed(cursor, old_sql, old_params, args.repeat)
+        new_ms = timed(cursor, new_sql, new_params, args.repeat)
+        print(f"  thời gian tốt nhất / {args.repeat} lần: cũ {old_ms:.2f} ms, mới {new_ms:.2f} ms")
+        print()
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
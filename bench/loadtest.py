@@ -0,0 +1,110 @@
+"""
+Load test đơn giản (chỉ dùng thư viện chuẩn): N client song song gọi lặp các URL
+trong D giây, in requests/sec + latency p50/p95/p99 + số lỗi.
+
+So sánh dev server với gunicorn:
+    python main.py                                   # cửa sổ 1: dev server
+    python bench/loadtest.py --base http://127.0.0.1:5000 --label dev
+
+    gunicorn -c gunicorn.conf.py wsgi:app            # cửa sổ 1: production
+    python bench/loadtest.py --base http://127.0.0.1:5000 --label gunicorn
+
+Đổi URL:
+    python bench/loadtest.py --path "/api/machines/1/day?day=2025-07-14" --path /api/lines
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    "/api/lines",
+    "/api/machines/1/day?day=2025-07-14",
+    "/api/machines/1/month-ratio?month=7",
+    "/api/machines/1/year-ratio?year=2025",
+]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def client(host, port, paths, deadline, latencies, errors, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    local_lat, local_err, i = [], 0, 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 400:
+                local_err += 1
+        except (OSError, http.client.HTTPException):
+            local_err += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        local_lat.append(time.perf_counter() - t0)
+    conn.close()
+    with lock:
+        latencies.extend(local_lat)
+        errors[0] += local_err
+
+
+def run(base, paths, concurrency, duration):
+    url = urlsplit(base)
+    host, port = url.hostname, url.port or 80
+
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client, args=(host, port, paths, deadline, latencies, errors, lock))
+        for _ in range(concurrency)
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test các endpoint GET")
+    parser.add_argument("--base", default="http://127.0.0.1:5000")
+    parser.add_argument("--path", action="append", dest="paths", help="lặp lại để thêm URL")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=15, help="giây cho mỗi mức concurrency")
+    parser.add_argument("--label", default="", help="nhãn in kèm kết quả (dev / gunicorn ...)")
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    print(f"{args.label or args.base}: {len(paths)} URL, {args.duration:.0f}s / mức")
+    print(f"{'conc':>5} {'req':>8} {'err':>6} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for conc in args.concurrency:
+        r = run(args.base, paths, conc, args.duration)
+        print(
+            f"{conc:>5} {r['requests']:>8} {r['errors']:>6} {r['rps']:>9.1f} "
+            f"{r['p50_ms']:>6.1f}ms {r['p95_ms']:>6.1f}ms {r['p99_ms']:>6.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
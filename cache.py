@@ -0,0 +1,231 @@
+"""
+Cache response JSON trong process cho các endpoint chỉ đọc (dashboard poll liên tục).
+
+    @app.route("/api/lines")
+    @cached("lines", ttl=300, group="catalog")
+    def get_lines(): ...
+
+- Key: (tên endpoint, path params, query args, data version nếu có @conditional)
+- TTL riêng từng endpoint, LRU khi vượt CACHE_MAX_BYTES
+- Chỉ cache response 200
+- Invalidate:
+    response_cache.invalidate(group="dayvalues", machine_id=5)   # trong process
+    publish_invalidation(cursor, "dayvalues", machine_id=5)      # cho mọi worker/process
+  Mỗi worker đọc bảng cache_invalidation tối đa 1 lần / CACHE_POLL_INTERVAL giây,
+  nên script ngoài (insert.py) cũng xoá được cache của app.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, make_response, request
+
+from db import get_connection
+
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_POLL_INTERVAL = float(os.environ.get("CACHE_POLL_INTERVAL", "2"))
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "1") != "0"
+
+ENTRY_OVERHEAD = 256  # byte ước lượng cho key + metadata mỗi entry
+
+
+class _Entry:
+    __slots__ = ("endpoint", "view_args", "group", "expires", "body", "mimetype", "size")
+
+    def __init__(self, endpoint, view_args, group, expires, body, mimetype):
+        self.endpoint = endpoint
+        self.view_args = view_args
+        self.group = group
+        self.expires = expires
+        self.body = body
+        self.mimetype = mimetype
+        self.size = len(body) + ENTRY_OVERHEAD
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = {}
+        self._misses = {}
+        self._evictions = 0
+        self._expired = 0
+        self._invalidations = 0
+
+        self._last_poll = 0.0
+        self._poll_watermark = None
+        self._poll_lock = threading.Lock()
+
+    # ---------- ĐỌC / GHI ----------
+    def get(self, key):
+        endpoint = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                self._drop(key)
+                self._expired += 1
+                entry = None
+            if entry is None:
+                self._misses[endpoint] = self._misses.get(endpoint, 0) + 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits[endpoint] = self._hits.get(endpoint, 0) + 1
+            return entry
+
+    def set(self, key, body, mimetype, ttl, group):
+        entry = _Entry(key[0], dict(key[1]), group, time.monotonic() + ttl, body, mimetype)
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    # ---------- INVALIDATE ----------
+    def invalidate(self, group=None, endpoints=None, **match):
+        """
+        Xoá entry khớp group (nếu có), thuộc endpoints (nếu có)
+        và có path param trùng tất cả giá trị trong match (VD machine_id=5).
+        Không truyền gì = xoá hết.
+        """
+        removed = 0
+        with self._lock:
+            for key in list(self._entries):
+                e = self._entries[key]
+                if group is not None and e.group != group:
+                    continue
+                if endpoints is not None and e.endpoint not in endpoints:
+                    continue
+                if any(e.view_args.get(k) != v for k, v in match.items()):
+                    continue
+                self._drop(key)
+                removed += 1
+            self._invalidations += removed
+        return removed
+
+    def poll(self):
+        """Áp dụng các invalidation mới trong bảng cache_invalidation (do process khác ghi)."""
+        if time.monotonic() - self._last_poll < CACHE_POLL_INTERVAL:
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_poll = time.monotonic()
+            conn = get_connection()
+            cursor = conn.cursor()
+            if self._poll_watermark is None:
+                # lần đầu: cache đang rỗng, chỉ cần lấy mốc
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidation")
+                self._poll_watermark = int(cursor.fetchone()[0])
+            else:
+                cursor.execute(
+                    """
+                    SELECT id, grp, machine_id, line_id
+                    FROM cache_invalidation
+                    WHERE id > %s
+                    ORDER BY id
+                    """,
+                    (self._poll_watermark,),
+                )
+                for inv_id, grp, machine_id, line_id in cursor.fetchall():
+                    self._apply(grp, machine_id, line_id)
+                    self._poll_watermark = int(inv_id)
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            print("Cache poll error:", e)
+        finally:
+            self._poll_lock.release()
+
+    def _apply(self, grp, machine_id, line_id):
+        if machine_id is None and line_id is None:
+            self.invalidate(group=grp)
+            return
+        if machine_id is not None:
+            self.invalidate(group=grp, machine_id=machine_id)
+        if line_id is not None:
+            self.invalidate(group=grp, line_id=line_id)
+            self.invalidate(group=grp, idline=line_id)
+
+    # ---------- METRICS ----------
+    def stats(self):
+        with self._lock:
+            endpoints = sorted(set(self._hits) | set(self._misses))
+            hits = sum(self._hits.values())
+            misses = sum(self._misses.values())
+            return {
+                "enabled": CACHE_ENABLED,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "evictions": self._evictions,
+                "expired": self._expired,
+                "invalidated": self._invalidations,
+                "per_endpoint": {
+                    ep: {"hits": self._hits.get(ep, 0), "misses": self._misses.get(ep, 0)}
+                    for ep in endpoints
+                },
+            }
+
+
+response_cache = ResponseCache()
+
+
+def publish_invalidation(cursor, group, machine_id=None, line_id=None):
+    """
+    Ghi 1 dòng invalidation cho mọi worker (commit cùng transaction ghi dữ liệu).
+    machine_id / line_id = None → xoá cả group.
+    """
+    cursor.execute(
+        "INSERT INTO cache_invalidation (grp, machine_id, line_id) VALUES (%s, %s, %s)",
+        (group, machine_id, line_id),
+    )
+    response_cache._apply(group, machine_id, line_id)
+
+
+def cached(name, ttl, group="dayvalues"):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            if not CACHE_ENABLED:
+                return view(**view_args)
+
+            response_cache.poll()
+            key = (
+                name,
+                tuple(sorted(view_args.items())),
+                tuple(sorted(request.args.items(multi=True))),
+                g.get("data_version"),  # có @conditional bên ngoài → dữ liệu đổi là key đổi
+            )
+            entry = response_cache.get(key)
+            if entry is not None:
+                resp = Response(entry.body, status=200, mimetype=entry.mimetype)
+                resp.headers["X-Cache"] = "HIT"
+                return resp
+
+            resp = make_response(view(**view_args))
+            if resp.status_code == 200 and not resp.direct_passthrough:
+                response_cache.set(key, resp.get_data(), resp.mimetype, ttl, group)
+            resp.headers["X-Cache"] = "MISS"
+            return resp
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,118 @@
+"""
+HTTP conditional request (ETag / Last-Modified / 304) cho các API đọc.
+
+    @app.route("/api/machines/<int:machine_id>/month")
+    @conditional("dayvalues", "machine")
+    @cached("machine_month", ttl=60)
+    def get_machine_month_time(machine_id): ...
+
+- ETag (weak) = hash(path, query, version các bảng mà endpoint đọc) – version lấy từ versions.py
+  (bộ đếm thay đổi do trigger tăng), nhớ trong process tối đa ETAG_VERSION_TTL giây cho khỏi query mỗi request
+- If-None-Match / If-Modified-Since khớp → 304 luôn, KHÔNG chạy handler, không serialize JSON
+- Version cũng được đưa vào key của response cache (g.data_version) → dữ liệu đổi là cache tự "hết hạn"
+- Cache-Control: public, max-age=<max_age>, must-revalidate (mặc định max_age=0:
+  trình duyệt / reverse proxy được lưu nhưng phải hỏi lại server mỗi lần – rẻ nhờ 304)
+- vary: hàm () -> giá trị | None cho endpoint mà kết quả còn phụ thuộc thời điểm gọi
+  (VD khoảng chứa "hôm nay") hoặc nguồn trễ hơn bảng gốc (kho dvstore); khác None → ghép vào version
+  (ETag + key cache), bỏ Last-Modified
+- refresh: hàm () gọi trước khi lấy version cho endpoint đọc bảng dẫn xuất (VD rollup.maybe_sync):
+  version lấy theo bảng dẫn xuất → ETag / key cache khớp đúng dữ liệu response trả về
+"""
+import hashlib
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Response, g, make_response, request
+
+from db import get_connection
+from versions import tables_state
+
+ETAG_ENABLED = os.environ.get("ETAG_ENABLED", "1") != "0"
+ETAG_VERSION_TTL = float(os.environ.get("ETAG_VERSION_TTL", "2"))
+
+_versions = {}   # tuple(bảng) -> (hết hạn, version, last_modified)
+_versions_lock = threading.Lock()
+
+
+def current_version(tables, fresh=False):
+    """
+    (version gộp, last_modified aware datetime | None) của các bảng, nhớ ETAG_VERSION_TTL giây
+    (fresh=True: đọc lại ngay, VD vừa sync bảng dẫn xuất).
+    """
+    key = tuple(tables)
+    now = time.monotonic()
+    with _versions_lock:
+        cached_state = _versions.get(key)
+        if cached_state and cached_state[0] > now and not fresh:
+            return cached_state[1], cached_state[2]
+
+    conn = get_connection()
+    try:
+        state = tables_state(conn, key)
+    finally:
+        conn.close()
+
+    version = "|".join(state[t][0] for t in key)
+    stamps = [state[t][1] for t in key if state[t][1] is not None]
+    last_modified = max(stamps) if stamps else None
+
+    with _versions_lock:
+        _versions[key] = (now + ETAG_VERSION_TTL, version, last_modified)
+    return version, last_modified
+
+
+def _etag(version):
+    raw = repr((request.path, sorted(request.args.items(multi=True)), version))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def _set_headers(resp, etag, last_modified, max_age):
+    resp.set_etag(etag, weak=True)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.headers["Cache-Control"] = f"public, max-age={max_age}, must-revalidate"
+
+
+def conditional(*tables, max_age=0, vary=None, refresh=None):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            synced = refresh() if refresh else False
+            if not ETAG_ENABLED:
+                return view(**view_args)
+            try:
+                version, last_modified = current_version(tables, fresh=bool(synced))
+            except Exception as e:
+                print("ETag version error:", e)
+                return view(**view_args)
+
+            extra = vary() if vary else None
+            if extra is not None:
+                # Last-Modified của bảng không đổi theo giá trị này → If-Modified-Since sẽ trả 304 sai
+                version, last_modified = f"{version}|{extra}", None
+
+            g.data_version = version
+            etag = _etag(version)
+            if _not_modified(etag, last_modified):
+                resp = Response(status=304)
+                _set_headers(resp, etag, last_modified, max_age)
+                return resp
+
+            resp = make_response(view(**view_args))
+            if resp.status_code == 200:
+                _set_headers(resp, etag, last_modified, max_age)
+            return resp
+
+        return wrapper
+
+    return decorator
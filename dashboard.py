@@ -0,0 +1,232 @@
+"""
+Payload màn hình NGÀY của máy (pie + bảng chi tiết + product).
+
+Dùng chung cho:
+  - /api/machines/<id>/day   : 1 máy
+  - /api/lines/<id>/day      : tổng cả line
+  - /api/machines/day        : cả line / danh sách máy, chỉ 2 query cho N máy
+  - async_api.py             : cùng SQL + payload, chạy query song song
+"""
+from metrics import TIME_CATEGORIES
+
+CATEGORY_COLORS = {
+    "Operation":          "#00a03e",
+    "SmallStop":          "#f97316",
+    "Fault":              "#ef4444",
+    "Break":              "#eab308",
+    "Maintenance":        "#6b21a8",
+    "Eat":                "#22c55e",
+    "Waiting":            "#0ea5e9",
+    "MachineryEdit":      "#1d4ed8",
+    "ChangeProductCode":  "#a855f7",
+    "Glue_CleaningPaper": "#fb7185",
+    "Others":             "#6b7280",
+}
+
+DAY_COLUMNS = ("Days", "PowerRun") + TIME_CATEGORIES
+
+
+# ==== SQL dùng chung cho bản sync (main.py) và async (async_api.py) ====
+MACHINE_DAY_SQL = f"""
+    SELECT 
+        Days,
+        PowerRun,
+        {", ".join(f"`{c}`" for c in TIME_CATEGORIES)}
+    FROM dayvalues
+    WHERE MachineID = %s AND Days = %s
+    LIMIT 1
+"""
+
+MACHINE_PRODUCT_SQL = """
+    SELECT 
+        totalproduct_actual AS Total,
+        totalproduct_ok as OK,
+        totalproduct_ng as NG
+    FROM production_output
+    WHERE machineid = %s AND days = %s
+    LIMIT 1
+"""
+
+# SUM thời gian, AVG PowerRun cho tất cả máy thuộc line
+LINE_DAY_SQL = f"""
+    SELECT 
+        dv.Days,
+        AVG(dv.PowerRun) AS PowerRun,
+        {", ".join(f"SUM(dv.`{c}`) AS `{c}`" for c in TIME_CATEGORIES)}
+    FROM sdvn.dayvalues dv
+    JOIN sdvn.machine m ON dv.MachineID = m.MachineID
+    WHERE m.LineID = %s AND dv.Days = %s AND IsActive = 1
+    GROUP BY dv.Days
+    LIMIT 1
+"""
+
+LINE_PRODUCT_SQL = """
+    SELECT 
+        SUM(po.totalproduct_actual) AS Total,
+        SUM(po.totalproduct_ok)     AS OK,
+        SUM(po.totalproduct_ng)     AS NG
+    FROM production_output po
+    JOIN machine m ON po.machineid = m.MachineID
+    WHERE m.LineID = %s AND po.days = %s AND IsActive = 1
+"""
+
+
+def _day_payload(id_key, id_value, row, prod):
+    # ---- POWER RUN: 2 chữ sau dấu chấm ----
+    raw_power = row.get("PowerRun")
+    try:
+        power_val = float(raw_power) if raw_power else 0.0
+    except (TypeError, ValueError):
+        power_val = 0.0
+    power_run_str = f"{power_val:.2f}"
+
+    # ---- CÁC CATEGORY (cho pie + bảng) ----
+    categories_raw = {c: float(row[c] or 0.0) for c in TIME_CATEGORIES}
+
+    total_hours = sum(categories_raw.values())
+    if total_hours <= 0:
+        total_hours = 1.0
+
+    detail_rows = []
+    pie_data = []
+
+    for label, hours in categories_raw.items():
+        h = int(hours)
+        m = int(round((hours - h) * 60))
+        time_str = f"{h}h {m}m"
+
+        ratio = round((hours / total_hours) * 100.0, 2)
+        ratio_text = f"{ratio:.2f}%"
+
+        detail_rows.append({
+            "label": label,
+            "value": hours,
+            "time": time_str,
+            "ratio": ratio,
+            "ratio_text": ratio_text,
+            "color": CATEGORY_COLORS[label],
+        })
+
+        pie_data.append({
+            "name": label,
+            "value": ratio,
+            "color": CATEGORY_COLORS[label],
+        })
+
+    # ---- PRODUCT: TOTAL / OK / NG / RATIO ----
+    if prod:
+        total = float(prod["Total"] or 0)
+        ok = float(prod["OK"] or 0)
+        ng = float(prod["NG"] or 0)
+    else:
+        total, ok, ng = 0.0, 0.0, 0.0
+
+    ratio = (ok * 100.0 / total) if total > 0 else 0.0
+
+    product = {
+        "total": int(total),
+        "ok": int(ok),
+        "ng": int(ng),
+        "ratio": round(ratio, 2),
+        "ratio_text": f"{ratio:.2f}%"
+    }
+
+    return {
+        id_key: id_value,
+        "day": row["Days"],
+        "power_run": power_run_str,
+        "total_hours": round(total_hours, 2),
+        "pie": pie_data,
+        "details": detail_rows,
+        "product": product,
+    }
+
+
+def machine_day_payload(machine_id, row, prod):
+    """
+    row: dòng MACHINE_DAY_SQL, prod: dòng MACHINE_PRODUCT_SQL (Total, OK, NG) hoặc None.
+    Trả về đúng cấu trúc /api/machines/<id>/day.
+    """
+    return _day_payload("machine_id", machine_id, row, prod)
+
+
+def line_day_payload(line_id, row, prod):
+    """Như machine_day_payload nhưng cho cả line (LINE_DAY_SQL / LINE_PRODUCT_SQL)."""
+    return _day_payload("line_id", line_id, row, prod)
+
+
+def machines_filter(line_id=None, machine_ids=None):
+    """(điều kiện WHERE trên alias m, params): máy IsActive của line, hoặc danh sách máy. Không có máy → None."""
+    if line_id is not None:
+        return "m.LineID = %s AND m.IsActive = 1", [line_id]
+    if not machine_ids:
+        return None
+    return f"m.MachineID IN ({', '.join(['%s'] * len(machine_ids))})", list(machine_ids)
+
+
+def machines_day_sql(where):
+    """machine LEFT JOIN dayvalues 1 ngày (máy không có dữ liệu vẫn có mặt). Params: day + params của where."""
+    return f"""
+        SELECT m.MachineID, m.MachineName, {", ".join(f"dv.`{c}`" for c in DAY_COLUMNS)}
+        FROM machine m
+        LEFT JOIN dayvalues dv
+               ON dv.MachineID = m.MachineID AND dv.Days = %s
+        WHERE {where}
+        ORDER BY m.MachineID
+    """
+
+
+def machines_day_items(day, rows, prods):
+    """
+    rows: dòng machines_day_sql, prods: dòng production_output (machineid, Total, OK, NG).
+    → payload từng máy (+ machine_name); máy không có dayvalues → data None.
+    """
+    # (machineid, days) có thể trùng → giữ dòng đầu như LIMIT 1 của API 1 máy
+    prod_by_machine = {}
+    for p in prods:
+        prod_by_machine.setdefault(p["machineid"], p)
+
+    result = []
+    for r in rows:
+        machine_id = r["MachineID"]
+        if r["Days"] is None:
+            item = {"machine_id": machine_id, "day": str(day), "data": None}
+        else:
+            item = machine_day_payload(machine_id, r, prod_by_machine.get(machine_id))
+        item["machine_name"] = r["MachineName"]
+        result.append(item)
+    return result
+
+
+def machines_day(cursor, day, line_id=None, machine_ids=None):
+    """
+    Payload NGÀY cho nhiều máy bằng 2 query:
+      1. machine LEFT JOIN dayvalues (máy không có dữ liệu vẫn có mặt, data = None)
+      2. production_output WHERE machineid IN (...)
+    Truyền line_id (máy IsActive của line) hoặc machine_ids.
+    """
+    machine_filter = machines_filter(line_id, machine_ids)
+    if machine_filter is None:
+        return []
+    where, params = machine_filter
+
+    cursor.execute(machines_day_sql(where), [day] + params)
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+
+    ids = [r["MachineID"] for r in rows]
+    cursor.execute(
+        f"""
+        SELECT
+            machineid,
+            totalproduct_actual AS Total,
+            totalproduct_ok AS OK,
+            totalproduct_ng AS NG
+        FROM production_output
+        WHERE days = %s
+          AND machineid IN ({", ".join(["%s"] * len(ids))})
+        """,
+        [day] + ids,
+    )
+    return machines_day_items(day, rows, cursor.fetchall())
@@ -1,10 +1,285 @@
+import os
+import threading
+import time
+from collections import deque
+
 import mysql.connector
 
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "127.0.0.1"),      # hoặc localhost
+    "port": int(os.environ.get("DB_PORT", "3306")),      # 👉 cổng mặc định MySQL, sửa nếu khác
+    "user": os.environ.get("DB_USER", "root"),           # tài khoản MySQL của bạn
+    "password": os.environ.get("DB_PASSWORD", "2804"),   # mật khẩu MySQL của bạn
+    "database": os.environ.get("DB_NAME", "sdvn"),       # tên database
+}
+
+# ==== CẤU HÌNH POOL (có thể chỉnh qua biến môi trường, tính theo từng worker) ====
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))                # số connection giữ lại khi rảnh
+POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", "10"))  # số connection mở thêm khi cao điểm
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))       # giây chờ tối đa khi pool đầy
+POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", "1800"))     # tuổi thọ tối đa 1 connection (giây)
+POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") != "0"      # ping trước khi giao connection
+
+# Mốc histogram thời gian checkout (ms), mốc cuối là +inf
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolTimeout(Exception):
+    """Hết thời gian chờ connection rảnh trong pool."""
+
+
+def connect(**overrides):
+    """Mở 1 connection MySQL MỚI (không qua pool) – dùng cho script/batch."""
+    params = dict(DB_CONFIG)
+    params.update(overrides)
+    return mysql.connector.connect(**params)
+
+
+class PooledConnection:
+    """
+    Bọc connection thật của mysql.connector.
+    - close() KHÔNG đóng socket mà trả connection về pool
+    - các thuộc tính khác (cursor, commit, rollback...) chuyển thẳng vào connection thật
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # handler quên close() → vẫn trả connection về pool khi object bị thu hồi
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool connection MySQL có:
+      - pool_size: số connection rảnh được giữ lại
+      - max_overflow: số connection mở thêm vượt pool_size (đóng luôn khi trả về)
+      - timeout: thời gian chờ tối đa khi đã dùng hết pool_size + max_overflow
+      - recycle: connection sống quá số giây này sẽ bị đóng và mở lại
+      - pre_ping: ping connection trước khi giao cho handler
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                 timeout=POOL_TIMEOUT, recycle=POOL_RECYCLE, pre_ping=POOL_PRE_PING,
+                 **connect_args):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.connect_args = connect_args
+
+        self._idle = deque()          # (raw_conn, created_at)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        # --- metrics ---
+        self._checkouts = 0
+        self._timeouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._created = 0
+        self._recycled = 0
+        self._ping_failures = 0
+        self._latency_hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    # ---------- MỞ / ĐÓNG CONNECTION THẬT ----------
+    def _open(self):
+        raw = connect(**self.connect_args)
+        with self._cond:
+            self._created += 1
+        return raw, time.monotonic()
+
+    @staticmethod
+    def _discard(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    # ---------- CHECKOUT ----------
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()   # LIFO: lấy connection "nóng" nhất
+                    self._in_use += 1
+                    break
+                if self._in_use < self.pool_size + self.max_overflow:
+                    raw, created_at = None, None          # mở mới bên ngoài lock
+                    self._in_use += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Không lấy được connection sau {self.timeout}s "
+                        f"(in_use={self._in_use}, max={self.pool_size + self.max_overflow})"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+        try:
+            raw, created_at = self._validate(raw, created_at)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_total += elapsed
+                self._wait_max = max(self._wait_max, elapsed)
+            self._latency_hist[self._bucket(elapsed * 1000.0)] += 1
+
+        return PooledConnection(self, raw, created_at)
+
+    def _validate(self, raw, created_at):
+        """Kiểm tra tuổi thọ + ping; hỏng/hết hạn thì mở connection mới."""
+        if raw is not None and self.recycle and time.monotonic() - created_at > self.recycle:
+            self._discard(raw)
+            with self._cond:
+                self._recycled += 1
+            raw = None
+
+        if raw is not None and self.pre_ping and not self._is_alive(raw):
+            self._discard(raw)
+            with self._cond:
+                self._ping_failures += 1
+            raw = None
+
+        if raw is None:
+            raw, created_at = self._open()
+        return raw, created_at
+
+    @staticmethod
+    def _bucket(ms):
+        for i, limit in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= limit:
+                return i
+        return len(LATENCY_BUCKETS_MS)
+
+    # ---------- TRẢ VỀ ----------
+    def _release(self, raw, created_at):
+        # huỷ transaction dở dang (handler SELECT xong không commit)
+        try:
+            raw.rollback()
+            reusable = True
+        except Exception:
+            reusable = False
+
+        with self._cond:
+            self._in_use -= 1
+            expired = self.recycle and time.monotonic() - created_at > self.recycle
+            if reusable and not expired and len(self._idle) < self.pool_size:
+                self._idle.append((raw, created_at))
+                raw = None
+            self._cond.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def dispose(self):
+        """Đóng toàn bộ connection rảnh (VD: sau khi fork worker)."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for raw, _ in idle:
+            self._discard(raw)
+
+    # ---------- METRICS ----------
+    def stats(self):
+        with self._cond:
+            labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "overflow": max(0, self._in_use + len(self._idle) - self.pool_size),
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "waits": self._waits,
+                "wait_time_total_s": round(self._wait_total, 4),
+                "wait_time_avg_ms": round(self._wait_total * 1000.0 / self._waits, 2) if self._waits else 0.0,
+                "wait_time_max_ms": round(self._wait_max * 1000.0, 2),
+                "connections_created": self._created,
+                "recycled": self._recycled,
+                "ping_failures": self._ping_failures,
+                "checkout_latency_hist": dict(zip(labels, self._latency_hist)),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_inherited_pools = []
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(**DB_CONFIG)
+    return _pool
+
+
+def reset_pool():
+    """
+    Bỏ pool kế thừa từ process cha (sau fork) – KHÔNG đóng socket vì process cha
+    vẫn đang dùng chung. Lần get_connection() sau sẽ tạo pool mới cho process này.
+    """
+    global _pool, _pool_lock
+    if _pool is not None:
+        # giữ tham chiếu để GC không gọi close()/COM_QUIT trên connection của process cha
+        _inherited_pools.append(_pool)
+    _pool_lock = threading.Lock()
+    _pool = None
+
+
 def get_connection():
-    return mysql.connector.connect(
-        host="127.0.0.1",      # hoặc localhost
-        port=3306,             # 👉 cổng mặc định MySQL, sửa nếu khác
-        user="root",           # tài khoản MySQL của bạn
-        password="2804",           # mật khẩu MySQL của bạn
-        database="sdvn"   # tên database
-    )
\ No newline at end of file
+    """Lấy connection từ pool. conn.close() sẽ trả connection về pool."""
+    return get_pool().acquire()
+
+
+def get_pool_stats():
+    return get_pool().stats()
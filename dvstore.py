@@ -0,0 +1,274 @@
+"""
+Kho dayvalues dạng cột trong RAM (NumPy) cho các API dashboard – tuỳ chọn, DVSTORE_ENABLED=1.
+
+    values[máy, ngày, cột]  float64 (NaN = NULL), cột = 4 ratio + 11 nhóm giờ
+    present[máy, ngày]      bool    (có dòng dayvalues hay không)
+
+- ngày = số ngày tính từ base (1/1 của DVSTORE_YEARS năm gần nhất)
+- Thread nền: nạp toàn bộ lúc khởi động, sau đó mỗi DVSTORE_REFRESH_INTERVAL giây, nếu version
+  của dayvalues / machine (versions.py) đổi: đọc các dòng idDayValues > watermark + đọc lại tháng hiện tại
+  (dòng hôm nay bị UPDATE/upsert liên tục, id không đổi)
+  và nạp lại toàn bộ mỗi DVSTORE_FULL_RELOAD giây (bắt các upsert tháng cũ)
+- version(): version nguồn mà kho đang phản ánh – @conditional(..., vary=dayvalues_store.version)
+  ghép vào ETag / key cache, nên response dựng từ kho (trễ tới 1 chu kỳ refresh) không bị
+  cache / 304 dưới version mới của bảng gốc mãi
+- machine_days() / line_days() trả về list dòng giống kết quả SQL của handler,
+  hoặc None khi kho chưa nạp / khoảng ngày nằm ngoài kho → handler query SQL như cũ
+"""
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from db import get_connection
+from metrics import RATIO_COLUMNS, TIME_CATEGORIES
+from versions import tables_state
+
+DVSTORE_ENABLED = os.environ.get("DVSTORE_ENABLED", "0") == "1"
+DVSTORE_YEARS = int(os.environ.get("DVSTORE_YEARS", "2"))
+DVSTORE_REFRESH_INTERVAL = float(os.environ.get("DVSTORE_REFRESH_INTERVAL", "30"))
+DVSTORE_FULL_RELOAD = float(os.environ.get("DVSTORE_FULL_RELOAD", "3600"))
+
+COLUMNS = RATIO_COLUMNS + TIME_CATEGORIES
+COLUMN_INDEX = {c: i for i, c in enumerate(COLUMNS)}
+FETCH_BATCH = 10000
+SOURCE_TABLES = ("dayvalues", "machine")
+
+
+class DayValuesStore:
+    def __init__(self, years=DVSTORE_YEARS):
+        self.years = years
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._base = None          # date của cột ngày 0
+        self._n_days = 0
+        self._machine_index = {}   # MachineID -> hàng
+        self._machine_ids = np.empty(0, dtype=np.int64)
+        self._line_ids = np.empty(0, dtype=np.int64)
+        self._active = np.empty(0, dtype=bool)
+        self._values = np.empty((0, 0, len(COLUMNS)))
+        self._present = np.empty((0, 0), dtype=bool)
+        self._watermark = 0
+        self._source_version = None   # version SOURCE_TABLES lúc bắt đầu lần nạp / refresh gần nhất
+        self._last_full = 0.0
+        self._thread = None
+
+    # ---------- NẠP / LÀM MỚI ----------
+    def load(self, conn):
+        """Nạp lại toàn bộ (dựng mảng mới rồi mới thay, request đang đọc không bị ảnh hưởng)."""
+        today = date.today()
+        base = date(today.year - self.years + 1, 1, 1)
+        end = date(today.year + 1, 1, 1)
+        # đọc version TRƯỚC dữ liệu: ghi xen giữa → version cũ hơn dữ liệu, lần refresh sau đọc lại
+        source_version = self._read_source_version(conn)
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(idDayValues), 0) FROM dayvalues")
+        watermark = int(cursor.fetchone()[0])
+        machine_ids, line_ids, active = self._read_machines(cursor)
+
+        n_days = (end - base).days
+        index = {int(mid): i for i, mid in enumerate(machine_ids)}
+        values = np.full((len(machine_ids), n_days, len(COLUMNS)), np.nan)
+        present = np.zeros((len(machine_ids), n_days), dtype=bool)
+
+        cursor.execute(
+            f"""
+            SELECT MachineID, Days, {", ".join(f"`{c}`" for c in COLUMNS)}
+            FROM dayvalues
+            WHERE Days >= %s AND Days < %s AND idDayValues <= %s
+            """,
+            (base, end, watermark),
+        )
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH)
+            if not batch:
+                break
+            self._fill(values, present, index, base, batch)
+        cursor.close()
+
+        with self._lock:
+            self._base, self._n_days = base, n_days
+            self._machine_index = index
+            self._machine_ids, self._line_ids, self._active = machine_ids, line_ids, active
+            self._values, self._present = values, present
+            self._watermark = watermark
+            self._source_version = source_version
+            self._loaded = True
+            self._last_full = time.monotonic()
+
+    def refresh(self, conn):
+        """Version nguồn đổi → đọc dòng mới theo watermark idDayValues + toàn bộ tháng hiện tại."""
+        if not self._loaded or time.monotonic() - self._last_full > DVSTORE_FULL_RELOAD:
+            self.load(conn)
+            return
+
+        source_version = self._read_source_version(conn)
+        if source_version == self._source_version:
+            return
+
+        today = date.today()
+        cursor = conn.cursor()
+        machine_ids, line_ids, active = self._read_machines(cursor)
+        cursor.execute(
+            f"""
+            SELECT idDayValues, MachineID, Days, {", ".join(f"`{c}`" for c in COLUMNS)}
+            FROM dayvalues
+            WHERE idDayValues > %s OR Days >= %s
+            """,
+            (self._watermark, date(today.year, today.month, 1)),
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+
+        with self._lock:
+            if set(int(m) for m in machine_ids) != set(self._machine_index) or today >= self._end():
+                # có máy mới / sang năm mới → dựng lại cho gọn
+                self._loaded = False
+            else:
+                order = [self._machine_index[int(m)] for m in machine_ids]
+                self._line_ids[order] = line_ids
+                self._active[order] = active
+                if rows:
+                    self._watermark = max(self._watermark, max(int(r[0]) for r in rows))
+                    self._fill(self._values, self._present, self._machine_index, self._base,
+                               [r[1:] for r in rows])
+                self._source_version = source_version
+        if not self._loaded:
+            self.load(conn)
+
+    @staticmethod
+    def _read_source_version(conn):
+        state = tables_state(conn, SOURCE_TABLES)
+        return "|".join(state[t][0] for t in SOURCE_TABLES)
+
+    def version(self):
+        """Version nguồn của dữ liệu trong kho, None nếu kho chưa nạp (API đọc SQL)."""
+        with self._lock:
+            return f"dvstore:{self._source_version}" if self._loaded else None
+
+    @staticmethod
+    def _read_machines(cursor):
+        cursor.execute("SELECT MachineID, COALESCE(LineID, 0), COALESCE(IsActive, 0) FROM machine ORDER BY MachineID")
+        rows = cursor.fetchall()
+        machine_ids = np.array([int(r[0]) for r in rows], dtype=np.int64)
+        line_ids = np.array([int(r[1]) for r in rows], dtype=np.int64)
+        active = np.array([int(r[2]) == 1 for r in rows], dtype=bool)
+        return machine_ids, line_ids, active
+
+    @staticmethod
+    def _fill(values, present, index, base, rows):
+        n_days = present.shape[1]
+        for r in rows:
+            i = index.get(int(r[0]))
+            if i is None or r[1] is None:
+                continue
+            d = (r[1] - base).days
+            if not 0 <= d < n_days:
+                continue
+            values[i, d] = [np.nan if v is None else float(v) for v in r[2:]]
+            present[i, d] = True
+
+    def _end(self):
+        return self._base + timedelta(days=self._n_days)
+
+    # ---------- THREAD NỀN ----------
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="dvstore", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                conn = get_connection()
+                try:
+                    self.refresh(conn)
+                finally:
+                    conn.close()
+            except Exception as e:
+                print("DayValues store refresh error:", e)
+            time.sleep(DVSTORE_REFRESH_INTERVAL)
+
+    # ---------- ĐỌC ----------
+    def _slice(self, start, end):
+        """[start, end) → (d0, d1) hoặc None nếu kho chưa nạp / không phủ hết."""
+        if not self._loaded or start < self._base or end > self._end():
+            return None
+        return (start - self._base).days, (end - self._base).days
+
+    @staticmethod
+    def _to_rows(days, base, d0, matrix, columns):
+        rows = []
+        for k, d in enumerate(days):
+            row = {"Days": base + timedelta(days=int(d0 + d))}
+            for j, c in enumerate(columns):
+                v = matrix[k, j]
+                row[c] = None if np.isnan(v) else float(v)
+            rows.append(row)
+        return rows
+
+    def machine_days(self, machine_id, start, end, columns=COLUMNS):
+        """Các ngày có dữ liệu của 1 máy trong [start, end), giống SELECT ... ORDER BY Days."""
+        with self._lock:
+            span = self._slice(start, end)
+            if span is None:
+                return None
+            d0, d1 = span
+            i = self._machine_index.get(machine_id)
+            if i is None:
+                return []
+            cols = [COLUMN_INDEX[c] for c in columns]
+            days = np.flatnonzero(self._present[i, d0:d1])
+            matrix = self._values[i, d0:d1][days][:, cols]
+            return self._to_rows(days, self._base, d0, matrix, columns)
+
+    def line_days(self, line_id, start, end, avg_columns=(), sum_columns=()):
+        """
+        Gộp theo ngày cho máy IsActive của line (như GROUP BY dv.Days):
+        avg_columns → AVG bỏ qua NULL, sum_columns → SUM bỏ qua NULL (toàn NULL → None).
+        """
+        with self._lock:
+            span = self._slice(start, end)
+            if span is None:
+                return None
+            d0, d1 = span
+            mask = (self._line_ids == line_id) & self._active
+            columns = tuple(avg_columns) + tuple(sum_columns)
+            cols = [COLUMN_INDEX[c] for c in columns]
+            block = self._values[mask, d0:d1][:, :, cols]       # (máy, ngày, cột)
+            days = np.flatnonzero(self._present[mask, d0:d1].any(axis=0))
+            block = block[:, days]
+
+        counts = (~np.isnan(block)).sum(axis=0)                # (ngày, cột)
+        sums = np.nansum(block, axis=0)
+        n_avg = len(avg_columns)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sums[:, :n_avg] = sums[:, :n_avg] / counts[:, :n_avg]
+        sums[counts == 0] = np.nan
+        return self._to_rows(days, self._base, d0, sums, columns)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": DVSTORE_ENABLED,
+                "loaded": self._loaded,
+                "base": self._base.isoformat() if self._base else None,
+                "days": self._n_days,
+                "machines": len(self._machine_index),
+                "rows": int(self._present.sum()),
+                "bytes": int(self._values.nbytes + self._present.nbytes),
+                "watermark": self._watermark,
+            }
+
+
+dayvalues_store = DayValuesStore()
+
+
+def start_store():
+    """Gọi trong init_worker(); DVSTORE_ENABLED=0 → không làm gì, mọi API đọc SQL."""
+    if DVSTORE_ENABLED:
+        dayvalues_store.start()
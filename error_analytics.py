@@ -0,0 +1,249 @@
+"""
+1 đường query cho mọi API thống kê lỗi (ngày / tháng / năm, line, máy tuỳ chọn):
+
+    rows = error_groups(cursor, "month", line_id=3, machine_id=None, sort="count", limit=20,
+                        year=2025, month=8)
+
+Sinh đúng 1 câu SQL trên errorevent_daily (error_rollup.py):
+  - điều kiện khoảng nửa mở Days >= start AND Days < end (dùng PK MachineID, Days, ErrorTypeID)
+  - lọc máy chỉ thêm khi có máy (không dùng "%s IS NULL OR ..." – MySQL không dùng được index)
+  - ORDER BY chọn sẵn từ SORTS (không dùng CASE WHEN ... – không dùng được index / sort rẻ)
+  - top-N đẩy xuống DB bằng LIMIT
+
+Group theo (máy, ErrorCode, ErrorName_Vie). Cursor phải là dictionary=True.
+source="raw": cùng câu SQL nhưng gộp thẳng errorevent (khi errorevent_daily chưa sẵn sàng –
+error_rollup.error_source()).
+
+error_pareto(): top-N mã lỗi (theo số lần / thời gian) + % tích luỹ + nhóm "others",
+tính hết trong DB bằng window function – phạm vi máy, line hoặc cả nhà máy.
+"""
+from periods import period_range
+
+SORTS = {
+    "name": "pl.MachineName, m.ErrorCode",
+    "count": "ErrorCount DESC, TotalErrorSeconds DESC",
+    "time": "TotalErrorSeconds DESC, ErrorCount DESC",
+}
+MAX_LIMIT = 10000
+
+# biểu thức theo nguồn: bảng tổng hợp hoặc bảng gốc (cùng alias dv)
+SOURCES = {
+    "summary": {
+        "table": "errorevent_daily",
+        "day": "dv.Days",
+        "count": "SUM(dv.EventCount)",
+        "seconds": "SUM(dv.TotalSeconds)",
+        "first": "MIN(dv.FirstStart)",
+        "last": "MAX(dv.LastEnd)",
+    },
+    "raw": {
+        "table": "errorevent",
+        "day": "dv.StartTime",
+        "count": "COUNT(*)",
+        "seconds": "SUM(TIMESTAMPDIFF(SECOND, dv.StartTime, dv.EndTime))",
+        "first": "MIN(dv.StartTime)",
+        "last": "MAX(dv.EndTime)",
+    },
+}
+
+PARETO_METRICS = {"count": "ErrorCount", "time": "TotalErrorSeconds"}
+PARETO_DEFAULT_TOP = 10
+PARETO_MAX_TOP = 100
+
+
+def parse_machine(raw):
+    """None / "" / "All" → None (cả line); ngược lại MachineID int (sai → ValueError)."""
+    if raw is None or raw == "" or raw == "All":
+        return None
+    return int(raw)
+
+
+def parse_limit(raw):
+    """None / "" → không giới hạn; ngược lại 1..MAX_LIMIT (sai → ValueError)."""
+    if raw is None or raw == "":
+        return None
+    limit = int(raw)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit phải trong 1..{MAX_LIMIT}")
+    return limit
+
+
+def error_groups(cursor, granularity, line_id, machine_id=None, sort="name", limit=None, source="summary",
+                 **period):
+    """
+    period: day=... | year=..., month=... | year=... (xem periods.period_range).
+    Mỗi dòng: MachineID, MachineName, ErrorCode, ErrorName_Vie, ErrorCount,
+              FirstErrorStart, LastErrorEnd, TotalErrorSeconds (None nếu mọi event chưa có EndTime).
+    """
+    start, end = period_range(granularity, **period)
+    order_by = SORTS.get(sort, SORTS["name"])
+    src = SOURCES[source]
+
+    sql = f"""
+        SELECT
+            pl.MachineID,
+            pl.MachineName,
+            m.ErrorCode,
+            m.ErrorName_Vie,
+            CAST({src["count"]} AS SIGNED) AS ErrorCount,
+            {src["first"]} AS FirstErrorStart,
+            {src["last"]} AS LastErrorEnd,
+            CAST({src["seconds"]} AS SIGNED) AS TotalErrorSeconds
+        FROM machine pl
+        JOIN {src["table"]} dv ON dv.MachineID = pl.MachineID
+        JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
+        WHERE pl.LineID = %s
+          AND {src["day"]} >= %s AND {src["day"]} < %s
+    """
+    params = [line_id, start, end]
+
+    if machine_id is not None:
+        sql += " AND pl.MachineID = %s"
+        params.append(machine_id)
+
+    sql += f"""
+        GROUP BY pl.MachineID, pl.MachineName, m.ErrorCode, m.ErrorName_Vie
+        ORDER BY {order_by}
+    """
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+# ==== PARETO ====
+def error_pareto(cursor, granularity, line_id=None, machine_id=None, by="count", top=PARETO_DEFAULT_TOP,
+                 source="summary", **period):
+    """
+    Phạm vi: machine_id → 1 máy; line_id → 1 line; cả 2 None → cả nhà máy.
+    Trả về {"by", "total", "items": [top N theo thứ hạng], "others": phần còn lại | None};
+    mỗi item: rank, error_code, error_name, error_count, total_error_seconds, share, cumulative_share (%).
+    """
+    start, end = period_range(granularity, **period)
+    metric = PARETO_METRICS[by]
+    src = SOURCES[source]
+
+    scope_join, scope_filter, scope_params = "", "", []
+    if machine_id is not None:
+        scope_filter, scope_params = "AND dv.MachineID = %s", [machine_id]
+    elif line_id is not None:
+        scope_join = "JOIN machine pl ON dv.MachineID = pl.MachineID"
+        scope_filter, scope_params = "AND pl.LineID = %s", [line_id]
+
+    cursor.execute(
+        f"""
+        WITH grouped AS (
+            SELECT
+                m.ErrorCode,
+                m.ErrorName_Vie,
+                CAST({src["count"]} AS SIGNED) AS ErrorCount,
+                CAST(COALESCE({src["seconds"]}, 0) AS SIGNED) AS TotalErrorSeconds
+            FROM {src["table"]} dv
+            JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
+            {scope_join}
+            WHERE {src["day"]} >= %s AND {src["day"]} < %s {scope_filter}
+            GROUP BY m.ErrorCode, m.ErrorName_Vie
+        ),
+        ranked AS (
+            SELECT
+                grouped.*,
+                ROW_NUMBER() OVER (ORDER BY {metric} DESC, ErrorCode) AS rn
+            FROM grouped
+        ),
+        buckets AS (
+            SELECT
+                LEAST(rn, %s + 1) AS bucket,
+                MAX(CASE WHEN rn <= %s THEN ErrorCode END) AS ErrorCode,
+                MAX(CASE WHEN rn <= %s THEN ErrorName_Vie END) AS ErrorName_Vie,
+                COUNT(*) AS Codes,
+                SUM(ErrorCount) AS ErrorCount,
+                SUM(TotalErrorSeconds) AS TotalErrorSeconds
+            FROM ranked
+            GROUP BY LEAST(rn, %s + 1)
+        )
+        SELECT
+            bucket,
+            ErrorCode,
+            ErrorName_Vie,
+            Codes,
+            ErrorCount,
+            TotalErrorSeconds,
+            SUM({metric}) OVER () AS GrandTotal,
+            SUM({metric}) OVER (ORDER BY bucket) AS Cumulative
+        FROM buckets
+        ORDER BY bucket
+        """,
+        [start, end] + scope_params + [top, top, top, top],
+    )
+    rows = cursor.fetchall()
+
+    def share(value, total):
+        return round(float(value) * 100 / float(total), 2) if total else 0.0
+
+    items, others = [], None
+    for r in rows:
+        item = {
+            "error_count": int(r["ErrorCount"] or 0),
+            "total_error_seconds": int(r["TotalErrorSeconds"] or 0),
+            "total_error_duration": fmt_hms(r["TotalErrorSeconds"]),
+            "share": share(r[metric] or 0, r["GrandTotal"]),
+            "cumulative_share": share(r["Cumulative"] or 0, r["GrandTotal"]),
+        }
+        if r["bucket"] <= top:
+            items.append({
+                "rank": int(r["bucket"]),
+                "error_code": r["ErrorCode"],
+                "error_name": r["ErrorName_Vie"],
+                **item,
+            })
+        else:
+            others = {"codes": int(r["Codes"]), **item}
+
+    return {
+        "by": by,
+        "total": int(rows[0]["GrandTotal"] or 0) if rows else 0,
+        "items": items,
+        "others": others,
+    }
+
+
+# ==== FORMAT RESPONSE ====
+def fmt_dt(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S") if dt else None
+
+
+def fmt_hms(seconds):
+    """giây → "Xh Ym Zs" (None / 0 → "0h 0m 0s")."""
+    s = int(seconds or 0)
+    return f"{s // 3600}h {(s % 3600) // 60}m {s % 60}s"
+
+
+def event_item(row):
+    """Dạng của /api/error-events, /api/error-events-month, /api/error-events-year."""
+    total_seconds = int(row["TotalErrorSeconds"] or 0)
+    return {
+        "machineName": row["MachineName"],
+        "errorCode": row["ErrorCode"],
+        "errorName": row["ErrorName_Vie"],
+        "errorCount": int(row["ErrorCount"] or 0),
+        "firstErrorStart": fmt_dt(row["FirstErrorStart"]),
+        "lastErrorEnd": fmt_dt(row["LastErrorEnd"]),
+        "totalErrorSeconds": total_seconds,
+        "totalErrorDuration": fmt_hms(total_seconds),
+    }
+
+
+def analysis_item(row):
+    """Dạng của /api/erroranalys/day, /api/error-analysis/month, /api/error-analysis/year."""
+    total_seconds = int(row["TotalErrorSeconds"] or 0)
+    return {
+        "MachineID": row["MachineID"],
+        "MachineName": row["MachineName"],
+        "ErrorCode": row["ErrorCode"],
+        "ErrorName_Vie": row["ErrorName_Vie"],
+        "ErrorCount": int(row["ErrorCount"] or 0),
+        "TotalErrorSeconds": total_seconds,
+        "RecoveryTime": fmt_hms(total_seconds),
+    }
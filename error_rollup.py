@@ -0,0 +1,400 @@
+"""
+Bảng tổng hợp errorevent_daily: 1 dòng / (MachineID, ngày, ErrorTypeID)
+  EventCount, TotalSeconds (SUM TIMESTAMPDIFF), FirstStart (MIN StartTime), LastEnd (MAX EndTime),
+  OpenCount (số event chưa có EndTime)
+
+6 API lỗi (ngày / tháng / năm) đọc bảng này thay vì gộp lại toàn bộ errorevent mỗi request:
+năm của 1 line ~ 365 x số máy x số loại lỗi dòng, không phụ thuộc số event.
+
+Cập nhật:
+  - sync(): event mới theo watermark ERROREVENT_ID_COLUMN → tính lại đúng các (máy, ngày) bị ảnh hưởng;
+    khi errorevent có thay đổi: tính lại ERROR_ROLLUP_HOT_DAYS ngày gần nhất + các (máy, ngày) cũ hơn
+    còn OpenCount > 0 (EndTime của event đang mở được UPDATE sau khi insert, có thể nhiều ngày sau).
+    "Có thay đổi" = bộ đếm table_version của errorevent (trigger AFTER INSERT/UPDATE/DELETE,
+    migrations/009) → UPDATE EndTime đóng event cũng tính; không dựa vào MAX(StartTime) / UPDATE_TIME
+  - start_error_rollup(): thread nền / process, sync mỗi ERROR_ROLLUP_INTERVAL giây
+    (GET_LOCK → mỗi lúc chỉ 1 worker làm). Có thay đổi thì ghi cache_invalidation group "errorevent"
+    → version của errorevent_daily (versions.py) đổi → ETag các API lỗi đổi
+  - summary_ready(): bảng chưa dựng / lâu hơn ERROR_ROLLUP_MAX_LAG giây không sync (sync lỗi,
+    ERROR_ROLLUP_ENABLED=0, process không gọi init_worker...) → API lỗi đọc thẳng errorevent
+
+Cột id (watermark): ERROREVENT_ID_COLUMN, không đặt thì lấy khoá chính kiểu số của errorevent
+trong information_schema; không xác định được → sync báo lỗi (API vẫn chạy bằng errorevent).
+
+Dòng lệnh:
+    python error_rollup.py --rebuild [--year 2025]
+    python error_rollup.py --sync
+    python error_rollup.py --check [--year 2025]
+
+Lưu ý: sửa / xoá event đã đóng cũ hơn cửa sổ hot → chạy --rebuild (hoặc --rebuild --year).
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+from db import connect, get_connection
+from periods import year_range
+from versions import data_version
+
+ERROREVENT_ID_COLUMN = os.environ.get("ERROREVENT_ID_COLUMN", "")   # rỗng = khoá chính của errorevent
+ERROR_ROLLUP_ENABLED = os.environ.get("ERROR_ROLLUP_ENABLED", "1") != "0"
+ERROR_ROLLUP_INTERVAL = float(os.environ.get("ERROR_ROLLUP_INTERVAL", "30"))
+ERROR_ROLLUP_HOT_DAYS = int(os.environ.get("ERROR_ROLLUP_HOT_DAYS", "2"))
+ERROR_ROLLUP_MAX_LAG = float(os.environ.get("ERROR_ROLLUP_MAX_LAG", "300"))
+READY_CHECK_INTERVAL = 5
+
+STATE_NAME = "errorevent"
+LOCK_NAME = "rollup_errorevent"
+INVALIDATION_GROUP = "errorevent"
+
+SUMMARY_COLUMNS = "MachineID, Days, ErrorTypeID, EventCount, TotalSeconds, FirstStart, LastEnd, OpenCount"
+_AGGREGATES = """
+    COUNT(*),
+    SUM(TIMESTAMPDIFF(SECOND, StartTime, EndTime)),
+    MIN(StartTime),
+    MAX(EndTime),
+    COUNT(*) - COUNT(EndTime)
+"""
+
+
+# ==== REFRESH ====
+def refresh_days(cursor, start, end, machine_ids=None):
+    """Tính lại [start, end) cho mọi máy hoặc các máy machine_ids. KHÔNG commit."""
+    machine_filter, machine_params = "", []
+    if machine_ids is not None:
+        machine_ids = sorted(machine_ids)
+        if not machine_ids:
+            return
+        machine_filter = f"AND MachineID IN ({', '.join(['%s'] * len(machine_ids))})"
+        machine_params = machine_ids
+
+    cursor.execute(
+        f"DELETE FROM errorevent_daily WHERE Days >= %s AND Days < %s {machine_filter}",
+        [start, end] + machine_params,
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO errorevent_daily ({SUMMARY_COLUMNS})
+        SELECT MachineID, DATE(StartTime), ErrorTypeID, {_AGGREGATES}
+        FROM errorevent
+        WHERE StartTime >= %s AND StartTime < %s {machine_filter}
+        GROUP BY MachineID, DATE(StartTime), ErrorTypeID
+        """,
+        [start, end] + machine_params,
+    )
+
+
+def refresh_buckets(cursor, buckets):
+    """buckets = {(MachineID, ngày)}; gộp theo ngày → 2 câu lệnh / ngày. KHÔNG commit."""
+    by_day = {}
+    for machine_id, day in buckets:
+        by_day.setdefault(day, set()).add(int(machine_id))
+    for day in sorted(by_day):
+        refresh_days(cursor, day, day + timedelta(days=1), by_day[day])
+    return len(buckets)
+
+
+# ==== ĐỒNG BỘ THEO WATERMARK ====
+def _read_watermark(cursor):
+    cursor.execute("SELECT watermark FROM rollup_state WHERE name = %s", (STATE_NAME,))
+    row = cursor.fetchone()
+    return int(row[0]) if row else None
+
+
+def _write_watermark(cursor, watermark):
+    cursor.execute(
+        """
+        INSERT INTO rollup_state (name, watermark, refreshed_at)
+        VALUES (%s, %s, NOW())
+        ON DUPLICATE KEY UPDATE watermark = VALUES(watermark), refreshed_at = VALUES(refreshed_at)
+        """,
+        (STATE_NAME, watermark),
+    )
+
+
+_id_column = None
+
+
+def id_column(cursor):
+    """Tên cột id tăng dần của errorevent (xem docstring module). Sai / không tìm được → RuntimeError."""
+    global _id_column
+    if _id_column:
+        return _id_column
+
+    name = ERROREVENT_ID_COLUMN
+    if not name:
+        cursor.execute(
+            """
+            SELECT COLUMN_NAME
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'errorevent'
+              AND COLUMN_KEY = 'PRI'
+              AND DATA_TYPE IN ('tinyint', 'smallint', 'mediumint', 'int', 'bigint')
+            """
+        )
+        rows = cursor.fetchall()
+        if len(rows) != 1:
+            raise RuntimeError(
+                "Không xác định được cột id của errorevent (cần 1 khoá chính kiểu số) – đặt ERROREVENT_ID_COLUMN"
+            )
+        name = rows[0][0]
+
+    # cột không tồn tại → lỗi ngay ở đây thay vì ở giữa sync
+    cursor.execute(f"SELECT `{name}` FROM errorevent LIMIT 0")
+    cursor.fetchall()
+    _id_column = name
+    return name
+
+
+def _top_id(cursor):
+    cursor.execute(f"SELECT COALESCE(MAX(`{id_column(cursor)}`), 0) FROM errorevent")
+    return int(cursor.fetchone()[0])
+
+
+def _open_buckets(cursor, before):
+    """(MachineID, ngày) trước ngày before còn event chưa đóng (index idx_eed_open)."""
+    cursor.execute(
+        "SELECT DISTINCT MachineID, Days FROM errorevent_daily WHERE OpenCount > 0 AND Days < %s",
+        (before,),
+    )
+    return {(int(mid), day) for mid, day in cursor.fetchall()}
+
+
+def _publish(cursor):
+    cursor.execute("INSERT INTO cache_invalidation (grp) VALUES (%s)", (INVALIDATION_GROUP,))
+
+
+_last_raw_version = None
+
+
+def sync(conn, hot=True):
+    """
+    Gộp event có id > watermark. Nếu bộ đếm thay đổi của errorevent (trigger, gồm cả UPDATE EndTime)
+    khác lần sync trước: tính lại các (máy, ngày) còn event mở và (hot=True) ERROR_ROLLUP_HOT_DAYS
+    ngày gần nhất. Chưa có watermark → rebuild.
+    Trả về None nếu worker khác đang sync, ngược lại số bucket (máy, ngày) đã tính lại.
+    """
+    global _last_raw_version
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        return None
+
+    try:
+        watermark = _read_watermark(cursor)
+        if watermark is None:
+            rebuild(conn)
+            return 0
+
+        # đọc trước khi quét: ghi xen giữa làm version đổi → tick sau quét lại
+        raw_version = data_version(conn, "errorevent")
+        top = _top_id(cursor)
+        id_col = id_column(cursor)
+
+        buckets = set()
+        if top > watermark:
+            cursor.execute(
+                f"""
+                SELECT DISTINCT MachineID, DATE(StartTime)
+                FROM errorevent
+                WHERE `{id_col}` > %s AND `{id_col}` <= %s
+                """,
+                (watermark, top),
+            )
+            buckets = {(int(mid), day) for mid, day in cursor.fetchall() if None not in (mid, day)}
+
+        refreshed = 0
+        if raw_version != _last_raw_version:
+            hot_start = date.today() + timedelta(days=1)
+            if hot and ERROR_ROLLUP_HOT_DAYS > 0:
+                hot_start = date.today() - timedelta(days=ERROR_ROLLUP_HOT_DAYS - 1)
+                refresh_days(cursor, hot_start, date.today() + timedelta(days=1))
+                refreshed = 1
+            buckets |= _open_buckets(cursor, hot_start)
+            buckets = {b for b in buckets if b[1] < hot_start}
+
+        refreshed += refresh_buckets(cursor, buckets)
+        _write_watermark(cursor, top)
+        if refreshed:
+            _publish(cursor)
+        conn.commit()
+        _last_raw_version = raw_version
+        return refreshed
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("DO RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.close()
+
+
+_syncer = None
+_syncer_lock = threading.Lock()
+
+
+def _sync_loop():
+    while True:
+        try:
+            conn = get_connection()
+            try:
+                sync(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            print("Error rollup sync error:", e)
+        time.sleep(ERROR_ROLLUP_INTERVAL)
+
+
+def start_error_rollup():
+    """Chạy 1 thread nền / process (gọi nhiều lần không sao). ERROR_ROLLUP_ENABLED=0 để tắt."""
+    global _syncer
+    if not ERROR_ROLLUP_ENABLED:
+        print(
+            "⚠ ERROR_ROLLUP_ENABLED=0: process này không sync errorevent_daily – nếu không có "
+            "process / cron nào khác chạy error_rollup.py --sync, API lỗi sẽ đọc thẳng errorevent"
+        )
+        return
+    with _syncer_lock:
+        if _syncer is None or not _syncer.is_alive():
+            _syncer = threading.Thread(target=_sync_loop, name="error-rollup", daemon=True)
+            _syncer.start()
+
+
+_ready = (0.0, None)   # (hết hạn, ready)
+_ready_lock = threading.Lock()
+
+
+def summary_ready(conn):
+    """
+    True nếu API lỗi đọc được errorevent_daily: đã dựng và sync trong ERROR_ROLLUP_MAX_LAG giây gần nhất
+    (refreshed_at của rollup_state được ghi mỗi lần sync). Nhớ READY_CHECK_INTERVAL giây.
+    """
+    global _ready
+    now = time.monotonic()
+    with _ready_lock:
+        if _ready[0] > now:
+            return _ready[1]
+        previous = _ready[1]
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT TIMESTAMPDIFF(SECOND, refreshed_at, NOW()) FROM rollup_state WHERE name = %s",
+            (STATE_NAME,),
+        )
+        row = cursor.fetchone()
+        ready = bool(row) and row[0] is not None and row[0] <= ERROR_ROLLUP_MAX_LAG
+    except Exception as e:
+        print("Error rollup state error:", e)
+        ready = False
+    finally:
+        cursor.close()
+
+    if not ready and previous is not False:
+        print(
+            f"⚠ errorevent_daily chưa dựng hoặc quá {ERROR_ROLLUP_MAX_LAG:.0f}s chưa sync "
+            "→ API lỗi đọc thẳng errorevent (xem log 'Error rollup sync error' / python error_rollup.py --rebuild)"
+        )
+    with _ready_lock:
+        _ready = (now + READY_CHECK_INTERVAL, ready)
+    return ready
+
+
+def error_source(conn):
+    """"summary" (errorevent_daily) hoặc "raw" (errorevent) cho error_analytics."""
+    return "summary" if summary_ready(conn) else "raw"
+
+
+# ==== DỰNG LẠI / KIỂM TRA ====
+def rebuild(conn, year=None):
+    cursor = conn.cursor()
+    if year:
+        start, end = year_range(year)
+        refresh_days(cursor, start, end)
+    else:
+        top = _top_id(cursor)
+        cursor.execute("DELETE FROM errorevent_daily")
+        cursor.execute(
+            f"""
+            INSERT INTO errorevent_daily ({SUMMARY_COLUMNS})
+            SELECT MachineID, DATE(StartTime), ErrorTypeID, {_AGGREGATES}
+            FROM errorevent
+            GROUP BY MachineID, DATE(StartTime), ErrorTypeID
+            """
+        )
+        _write_watermark(cursor, top)
+    _publish(cursor)
+    conn.commit()
+    cursor.close()
+
+
+def check(conn, year=None):
+    """So errorevent_daily với errorevent. Trả về danh sách chênh lệch (rỗng = khớp)."""
+    cursor = conn.cursor()
+    where, params = "", ()
+    if year:
+        where, params = "WHERE StartTime >= %s AND StartTime < %s", year_range(year)
+    cursor.execute(
+        f"""
+        SELECT MachineID, DATE(StartTime), ErrorTypeID, {_AGGREGATES}
+        FROM errorevent
+        {where}
+        GROUP BY MachineID, DATE(StartTime), ErrorTypeID
+        """,
+        params,
+    )
+    raw = {tuple(r[:3]): tuple(r[3:]) for r in cursor.fetchall()}
+
+    where = where.replace("StartTime", "Days")
+    cursor.execute(
+        f"""
+        SELECT {SUMMARY_COLUMNS}
+        FROM errorevent_daily
+        {where}
+        """,
+        params,
+    )
+    summary = {tuple(r[:3]): tuple(r[3:]) for r in cursor.fetchall()}
+    cursor.close()
+
+    problems = []
+    for key in sorted(set(raw) | set(summary), key=str):
+        exp, act = raw.get(key), summary.get(key)
+        if exp is None or act is None or tuple(map(str, exp)) != tuple(map(str, act)):
+            problems.append({"key": key, "raw": exp, "summary": act})
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bảng tổng hợp errorevent_daily")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--rebuild", action="store_true")
+    group.add_argument("--sync", action="store_true")
+    group.add_argument("--check", action="store_true")
+    parser.add_argument("--year", type=int)
+    args = parser.parse_args()
+
+    conn = connect()
+    t0 = time.perf_counter()
+    if args.rebuild:
+        rebuild(conn, args.year)
+        print(f"✅ Dựng lại errorevent_daily xong ({time.perf_counter() - t0:.2f}s)")
+    elif args.sync:
+        done = sync(conn)
+        print("⚠ Worker khác đang sync, bỏ qua" if done is None else "✅ Sync xong")
+    else:
+        problems = check(conn, args.year)
+        for p in problems[:50]:
+            print("⚠", p)
+        print(f"{'✅ errorevent_daily khớp bảng gốc' if not problems else f'⚠ {len(problems)} chênh lệch'}")
+        conn.close()
+        sys.exit(1 if problems else 0)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
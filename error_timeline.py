@@ -0,0 +1,191 @@
+"""
+Timeline lỗi của 1 máy / 1 line trong 1 khoảng (ngày / tháng) – cho biểu đồ Gantt.
+
+- Đọc errorevent theo thứ tự (MachineID, StartTime) bằng cursor không buffer + fetchmany
+  (index idx_errorevent_machine_start), mỗi lúc chỉ giữ event của 1 máy
+- Mỗi máy: 1 lượt quét gộp các khoảng chồng nhau → thời gian dừng THẬT
+  (SUM(TIMESTAMPDIFF) của các API lỗi đếm trùng phần chồng nhau)
+- Event bắt đầu trước start nhưng còn chạy lúc start (index idx_errorevent_machine_end) cũng được tính
+- Event chưa có EndTime = đang dừng tới hiện tại; mọi khoảng bị cắt vào [start, end)
+- MTTR = downtime / số lần dừng (khoảng đã gộp), MTBF = thời gian chạy / số lần dừng
+  (stop_metrics – reliability.py dùng chung định nghĩa)
+- Timeline nén: segments = [[offset, length, code], ...] theo đơn vị resolution giây tính từ start,
+  khoảng trống giữa các segment = máy chạy; code = chỉ số trong "codes" (lỗi mở đầu của khoảng gộp)
+"""
+from datetime import datetime
+
+FETCH_BATCH = 2000
+DEFAULT_RESOLUTION = 60   # giây / đơn vị timeline
+
+
+def _clip(start, end, range_start, range_end, now):
+    end = end or now
+    return max(start, range_start), min(end, range_end, now)
+
+
+def merge_intervals(events):
+    """
+    events: (start, end, error_code) đã sort theo start.
+    → [(start, end, error_code mở đầu, số event)] không chồng nhau.
+    """
+    merged = []
+    for start, end, code in events:
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            last = merged[-1]
+            if end > last[1]:
+                last[1] = end
+            last[3] += 1
+        else:
+            merged.append([start, end, code, 1])
+    return [tuple(m) for m in merged]
+
+
+def _carried_over(conn, machine_ids, start):
+    """{MachineID: [(StartTime, EndTime, ErrorCode)]} của event bắt đầu trước start, chưa kết thúc lúc start."""
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT dv.MachineID, dv.StartTime, dv.EndTime, m.ErrorCode
+        FROM errorevent dv
+        JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
+        WHERE dv.MachineID IN ({", ".join(["%s"] * len(machine_ids))})
+          AND (dv.EndTime IS NULL OR dv.EndTime > %s)
+          AND dv.StartTime < %s
+        ORDER BY dv.MachineID, dv.StartTime
+        """,
+        list(machine_ids) + [start, start],
+    )
+    carried = {}
+    for machine_id, s, e, code in cursor.fetchall():
+        carried.setdefault(machine_id, []).append((s, e, code))
+    cursor.close()
+    return carried
+
+
+def stop_metrics(span, downtime, stops):
+    """span = giây của khoảng (tới hiện tại), downtime = giây dừng đã gộp, stops = số khoảng đã gộp."""
+    uptime = span - downtime
+    return {
+        "uptime_seconds": int(uptime),
+        "mttr_seconds": round(downtime / stops, 1) if stops else None,
+        "mtbf_seconds": round(uptime / stops, 1) if stops else None,
+    }
+
+
+def _stream(conn, machine_ids, start, end):
+    """(MachineID, StartTime, EndTime, ErrorCode) theo thứ tự máy rồi StartTime."""
+    cursor = conn.cursor(buffered=False)
+    cursor.execute(
+        f"""
+        SELECT dv.MachineID, dv.StartTime, dv.EndTime, m.ErrorCode
+        FROM errorevent dv
+        JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
+        WHERE dv.MachineID IN ({", ".join(["%s"] * len(machine_ids))})
+          AND dv.StartTime >= %s AND dv.StartTime < %s
+        ORDER BY dv.MachineID, dv.StartTime
+        """,
+        list(machine_ids) + [start, end],
+    )
+    try:
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH)
+            if not batch:
+                break
+            yield from batch
+    finally:
+        cursor.close()
+
+
+def _machine_timeline(events, range_start, range_end, now, resolution, codes):
+    clipped = [_clip(s, e, range_start, range_end, now) + (code,) for s, e, code in events]
+    merged = merge_intervals(clipped)
+
+    span = max((min(range_end, now) - range_start).total_seconds(), 0)
+    raw_seconds = sum(
+        max((ce - cs).total_seconds(), 0) for (cs, ce, _), (_, e, _) in zip(clipped, events) if e
+    )
+    downtime = sum((e - s).total_seconds() for s, e, _, _ in merged)
+    stops = len(merged)
+
+    segments = []
+    for s, e, code, _ in merged:
+        offset = int((s - range_start).total_seconds()) // resolution
+        stop = -(-int((e - range_start).total_seconds()) // resolution)   # làm tròn lên
+        idx = codes.setdefault(code, len(codes))
+        # khoảng rơi vào cùng / sát đơn vị trước → nối luôn (sau khi làm tròn)
+        if segments and offset <= segments[-1][0] + segments[-1][1]:
+            prev = segments[-1]
+            prev[1] = max(prev[1], stop - prev[0])
+        else:
+            segments.append([offset, max(stop - offset, 1), idx])
+
+    return {
+        "events": len(events),
+        "stops": stops,
+        "downtime_seconds": int(downtime),
+        "raw_error_seconds": int(raw_seconds),   # cách cộng cũ (đếm trùng)
+        **stop_metrics(span, downtime, stops),
+        "segments": segments,
+    }
+
+
+def live_bucket(end, resolution, now=None):
+    """
+    Khoảng kết thúc tại end (date) chưa qua hết → số thứ tự đơn vị resolution hiện tại
+    (kết quả còn đổi theo now: event đang mở, uptime); đã qua → None.
+    """
+    now = now or datetime.now()
+    if datetime.combine(end, datetime.min.time()) <= now:
+        return None
+    return int(now.timestamp()) // resolution
+
+
+def error_timeline(conn, machines, start, end, resolution=DEFAULT_RESOLUTION, now=None):
+    """
+    machines: [(MachineID, MachineName)], start / end: date (khoảng nửa mở).
+    Trả về {"start", "end", "resolution", "codes": [...], "machines": [...], "totals": {...}}.
+    """
+    now = now or datetime.now()
+    range_start = datetime.combine(start, datetime.min.time())
+    range_end = datetime.combine(end, datetime.min.time())
+    names = dict(machines)
+    codes = {}
+
+    timelines = {}
+    if names:
+        # đọc trước (ít dòng) – cursor không buffer của _stream phải đọc hết mới chạy được query khác
+        carried = _carried_over(conn, list(names), range_start)
+        current_id, events = None, []
+        for machine_id, s, e, code in _stream(conn, list(names), range_start, range_end):
+            if machine_id != current_id:
+                if current_id is not None:
+                    timelines[current_id] = _machine_timeline(events, range_start, range_end, now, resolution, codes)
+                current_id, events = machine_id, carried.pop(machine_id, [])
+            events.append((s, e, code))
+        if current_id is not None:
+            timelines[current_id] = _machine_timeline(events, range_start, range_end, now, resolution, codes)
+        # máy chỉ có event kéo dài từ trước start
+        for machine_id, events in carried.items():
+            timelines[machine_id] = _machine_timeline(events, range_start, range_end, now, resolution, codes)
+
+    empty = _machine_timeline([], range_start, range_end, now, resolution, codes)
+    result_machines = []
+    for machine_id, name in machines:
+        item = timelines.get(machine_id, empty)
+        result_machines.append({"machine_id": machine_id, "machine_name": name, **item})
+
+    totals = {
+        key: sum(m[key] for m in result_machines)
+        for key in ("events", "stops", "downtime_seconds", "raw_error_seconds", "uptime_seconds")
+    }
+    return {
+        "start": range_start.isoformat(),
+        "end": range_end.isoformat(),
+        "resolution": resolution,
+        "codes": list(codes),
+        "machines": result_machines,
+        "totals": totals,
+    }
+
@@ -0,0 +1,142 @@
+"""
+Engine xuất Excel dùng chung cho các endpoint *-export.
+
+- Workbook write-only: mỗi dòng ghi thẳng ra file tạm của openpyxl, không giữ cả sheet trong RAM
+- Ô được tạo sẵn style (border mảnh) ngay lúc ghi, không phải quét lại ws.iter_rows
+- stream_workbook(): vừa nén xlsx vừa gửi cho client theo từng chunk (generator response)
+- write_workbook(): ghi ra file (dùng cho job export nền)
+"""
+import queue
+import threading
+from collections import namedtuple
+from urllib.parse import quote
+
+from flask import Response
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Border, Side
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CHUNK_SIZE = 64 * 1024
+QUEUE_CHUNKS = 16          # tối đa ~1MB chờ gửi → RAM cố định
+PRODUCER_TIMEOUT = 300     # giây chờ client đọc trước khi huỷ
+
+_thin = Side(style="thin")
+THIN_BORDER = Border(left=_thin, right=_thin, top=_thin, bottom=_thin)
+
+# title: tên sheet, rows: iterable các list giá trị, width: số cột kẻ bảng (pad None cho đủ)
+Sheet = namedtuple("Sheet", ["title", "rows", "width"])
+
+
+def _styled_row(ws, row, width):
+    values = list(row)
+    values += [None] * (width - len(values))
+    cells = []
+    for v in values:
+        cell = WriteOnlyCell(ws, value=v)
+        cell.border = THIN_BORDER
+        cells.append(cell)
+    return cells
+
+
+def write_workbook(fileobj, sheets):
+    """Ghi các Sheet vào fileobj (path hoặc file-like, không cần seek được)."""
+    wb = Workbook(write_only=True)
+    for sheet in sheets:
+        ws = wb.create_sheet(title=(sheet.title or "Sheet")[:31])
+        for row in sheet.rows:
+            ws.append(_styled_row(ws, row, sheet.width))
+    wb.save(fileobj)
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _QueueWriter:
+    """File-like chỉ có write(): gom byte thành chunk rồi đẩy vào queue."""
+
+    def __init__(self, q, cancelled):
+        self._q = q
+        self._cancelled = cancelled
+        self._buf = bytearray()
+
+    def write(self, data):
+        self._buf += data
+        if len(self._buf) >= CHUNK_SIZE:
+            self._push(bytes(self._buf))
+            self._buf.clear()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close_stream(self):
+        if self._buf:
+            self._push(bytes(self._buf))
+            self._buf.clear()
+
+    def _push(self, item):
+        waited = 0
+        while True:
+            if self._cancelled.is_set():
+                raise _Cancelled()
+            try:
+                self._q.put(item, timeout=1)
+                return
+            except queue.Full:
+                waited += 1
+                if waited >= PRODUCER_TIMEOUT:
+                    raise _Cancelled()
+
+
+_DONE = object()
+
+
+def _content_disposition(filename):
+    ascii_name = filename.encode("ascii", "ignore").decode() or "export.xlsx"
+    ascii_name = ascii_name.replace('"', "")
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def stream_workbook(sheets, filename):
+    """
+    Trả về Response stream file xlsx. Thread nền build + nén workbook,
+    generator của response đọc từ queue giới hạn và gửi dần cho client.
+    """
+    q = queue.Queue(maxsize=QUEUE_CHUNKS)
+    cancelled = threading.Event()
+
+    def produce():
+        writer = _QueueWriter(q, cancelled)
+        try:
+            write_workbook(writer, sheets)
+            writer.close_stream()
+            writer._push(_DONE)
+        except _Cancelled:
+            pass
+        except Exception as e:
+            print("Excel export error:", e)
+            try:
+                writer._push(e)
+            except _Cancelled:
+                pass
+
+    def generate():
+        threading.Thread(target=produce, name="xlsx-export", daemon=True).start()
+        try:
+            while True:
+                item = q.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # client ngắt giữa chừng → báo thread nền dừng
+            cancelled.set()
+
+    resp = Response(generate(), mimetype=XLSX_MIMETYPE, direct_passthrough=True)
+    resp.headers["Content-Disposition"] = _content_disposition(filename)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
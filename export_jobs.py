@@ -0,0 +1,222 @@
+"""
+Export Excel chạy nền: POST tạo job, GET xem trạng thái / tải file.
+
+    POST /api/exports                 {"type": "kpi", "params": {"year": 2025, "month": 9}}
+    GET  /api/exports/<job_id>        → {"status": "queued|running|done|failed", ...}
+    GET  /api/exports/<job_id>/download
+
+- job_id = sha1(type, params, version các bảng report đọc) → cùng tháng, dữ liệu chưa đổi
+  thì trả luôn file đã build trên đĩa, không query lại MySQL để dựng workbook.
+  Version = bộ đếm trigger (versions.py) → UPDATE tại chỗ / upsert dayvalues, đổi tên máy / line
+  cũng ra job mới; report năm đồng bộ rollup trước rồi mới lấy version của rollup
+- Trạng thái job lưu file <job_id>.json cạnh <job_id>.xlsx trong EXPORT_DIR,
+  nên worker nào (gunicorn nhiều process) cũng poll / tải được
+- Build trong ThreadPoolExecutor (EXPORT_WORKERS thread / process)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_connection
+from excel_export import write_workbook
+from periods import month_range
+from reports import (
+    kpi_report,
+    line_month_report,
+    line_year_report,
+    machine_month_report,
+    machine_year_report,
+)
+from rollup import sync as sync_rollups
+from versions import tables_state
+
+EXPORT_DIR = os.environ.get(
+    "EXPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "exports")
+)
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", "2"))
+EXPORT_JOB_TIMEOUT = int(os.environ.get("EXPORT_JOB_TIMEOUT", "900"))       # job treo quá lâu → chạy lại
+EXPORT_ARTIFACT_TTL = int(os.environ.get("EXPORT_ARTIFACT_TTL", str(7 * 86400)))
+CLEANUP_INTERVAL = 3600
+
+MONTH_TABLES = ("dayvalues", "machine", "productionline")
+YEAR_TABLES = ("dayvalues_machine_month", "dayvalues_line_month", "machine", "productionline")
+
+# type -> (hàm build, các param bắt buộc, các bảng report đọc → key job)
+REPORTS = {
+    "machine-month": (machine_month_report, ("machine_id", "year", "month"), MONTH_TABLES),
+    "line-month": (line_month_report, ("line_id", "year", "month"), MONTH_TABLES),
+    "machine-year": (machine_year_report, ("machine_id", "year"), YEAR_TABLES),
+    "line-year": (line_year_report, ("line_id", "year"), YEAR_TABLES),
+    "kpi": (kpi_report, ("year", "month"), MONTH_TABLES),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_last_cleanup = 0.0
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+        return _executor
+
+
+def parse_params(export_type, params):
+    """Chuẩn hoá params → dict (int cho id/năm/tháng, data mặc định ALL). Sai → ValueError."""
+    if export_type not in REPORTS:
+        raise ValueError(f"Unknown export type: {export_type}")
+    _, required, _ = REPORTS[export_type]
+
+    clean = {}
+    for name in required:
+        value = params.get(name)
+        if value is None:
+            raise ValueError(f"Missing param: {name}")
+        try:
+            clean[name] = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid param: {name}")
+    if "month" in clean:
+        month_range(clean["year"], clean["month"])
+    clean["data_type"] = str(params.get("data") or "ALL")
+    return clean
+
+
+# ---------- FILE TRÊN ĐĨA ----------
+def _state_path(job_id):
+    return os.path.join(EXPORT_DIR, f"{job_id}.json")
+
+
+def artifact_path(job_id):
+    return os.path.join(EXPORT_DIR, f"{job_id}.xlsx")
+
+
+def _valid_job_id(job_id):
+    return len(job_id) == 40 and all(c in "0123456789abcdef" for c in job_id)
+
+
+def _write_state(state):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = _state_path(state["job_id"])
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def get_job(job_id):
+    if not _valid_job_id(job_id):
+        return None
+    try:
+        with open(_state_path(job_id), encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state["status"] == "done" and not os.path.exists(artifact_path(job_id)):
+        # file bị xoá tay → coi như chưa có
+        return None
+    return state
+
+
+def _is_stale(state):
+    return (
+        state["status"] in ("queued", "running")
+        and time.time() - state["updated_at"] > EXPORT_JOB_TIMEOUT
+    )
+
+
+# ---------- JOB ----------
+def submit(export_type, params):
+    """
+    Tạo (hoặc dùng lại) job export. Trả về state dict.
+    Đã có file cùng version → status "done" ngay, không build lại.
+    """
+    params = parse_params(export_type, params)
+
+    _, _, tables = REPORTS[export_type]
+    conn = get_connection()
+    try:
+        if tables is YEAR_TABLES:
+            # rollup trễ tối đa 1 chu kỳ sync → đồng bộ ngay (không chờ maybe_sync tới lượt),
+            # version khớp dữ liệu builder sẽ đọc. Worker khác đang sync → sync trả None, bỏ qua.
+            try:
+                sync_rollups(conn)
+            except Exception as e:
+                print("Rollup sync error:", e)
+        state = tables_state(conn, tables)
+    finally:
+        conn.close()
+    version = "|".join(state[t][0] for t in tables)
+
+    key = json.dumps([export_type, params, version], sort_keys=True)
+    job_id = hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    state = get_job(job_id)
+    if state and state["status"] == "done":
+        return state
+    if state and state["status"] in ("queued", "running") and not _is_stale(state):
+        return state
+
+    now = time.time()
+    state = {
+        "job_id": job_id,
+        "type": export_type,
+        "params": params,
+        "version": version,
+        "status": "queued",
+        "filename": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    _write_state(state)
+    _get_executor().submit(_run, state)
+    _maybe_cleanup()
+    return state
+
+
+def _run(state):
+    builder, _, _ = REPORTS[state["type"]]
+    job_id = state["job_id"]
+    state.update(status="running", updated_at=time.time())
+    _write_state(state)
+
+    path = artifact_path(job_id)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        filename, sheets = builder(**state["params"])
+        with open(tmp, "wb") as f:
+            write_workbook(f, sheets)
+        os.replace(tmp, path)
+        state.update(status="done", filename=filename, updated_at=time.time())
+    except Exception as e:
+        print("Export job error:", job_id, e)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        state.update(status="failed", error=str(e), updated_at=time.time())
+    _write_state(state)
+
+
+def _maybe_cleanup():
+    """Xoá file export / state cũ hơn EXPORT_ARTIFACT_TTL (tối đa 1 lần / giờ)."""
+    global _last_cleanup
+    if time.monotonic() - _last_cleanup < CLEANUP_INTERVAL:
+        return
+    _last_cleanup = time.monotonic()
+
+    cutoff = time.time() - EXPORT_ARTIFACT_TTL
+    try:
+        for name in os.listdir(EXPORT_DIR):
+            path = os.path.join(EXPORT_DIR, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+    except OSError as e:
+        print("Export cleanup error:", e)
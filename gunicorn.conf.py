@@ -0,0 +1,57 @@
+"""
+Cấu hình gunicorn:  gunicorn -c gunicorn.conf.py wsgi:app
+
+Biến môi trường:
+    APP_BIND              (0.0.0.0:5000)
+    WEB_CONCURRENCY       số worker; không đặt → tự tính theo CPU
+    APP_THREADS           thread / worker (4)
+    DB_MAX_CONNECTIONS    max_connections của MySQL dành cho app (150)
+    GUNICORN_TIMEOUT      giây (120 – export Excel lớn)
+    GUNICORN_PRELOAD      1 = import app 1 lần ở master (khởi động nhanh, ít RAM)
+                          nhưng kill -HUP không nạp lại code → mặc định 0
+
+Số worker tự tính = 2 * CPU + 1, nhưng không vượt quá số worker mà MySQL chịu được:
+    worker * (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW) <= DB_MAX_CONNECTIONS
+"""
+import multiprocessing
+import os
+
+from db import POOL_MAX_OVERFLOW, POOL_SIZE
+
+
+def _auto_workers():
+    cpu_workers = multiprocessing.cpu_count() * 2 + 1
+    db_budget = int(os.environ.get("DB_MAX_CONNECTIONS", "150"))
+    db_workers = max(1, db_budget // max(1, POOL_SIZE + POOL_MAX_OVERFLOW))
+    return max(1, min(cpu_workers, db_workers))
+
+
+bind = os.environ.get("APP_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY") or _auto_workers())
+worker_class = "gthread"
+threads = int(os.environ.get("APP_THREADS", "4"))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+# thay worker định kỳ (chống phình RAM), jitter để không restart cùng lúc
+max_requests = 2000
+max_requests_jitter = 200
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    # worker vừa fork + nạp app: tạo pool MySQL + thread nền riêng cho process này
+    from main import init_worker
+
+    init_worker()
+    worker.log.info("worker %s ready (threads=%s)", worker.pid, threads)
+
+
+def on_reload(arbiter):
+    arbiter.log.info("reloading: starting new workers, old workers finish in-flight requests")
@@ -1,136 +1,319 @@
+"""
+Nạp file CSV lịch sử vào bảng dayvalues.
+
+    python insert.py                                  # mặc định dc4.csv
+    python insert.py history.csv --batch-size 5000 --commit-every 100000
+    python insert.py history.csv --mode insert --load-data   # bảng trống: LOAD DATA (nhanh nhất)
+
+Chế độ ghi (--mode):
+  upsert (mặc định) – INSERT ... ON DUPLICATE KEY UPDATE theo khoá (MachineID, Days),
+                      chạy lại CSV chồng ngày không tạo dòng trùng; dòng không đổi thì bỏ qua
+  insert            – chỉ INSERT (dùng cho lần nạp đầu vào bảng trống)
+
+- Đọc CSV theo từng chunk (không load cả file vào RAM)
+- Chuẩn hoá cột bằng pandas (vector hoá, không iterrows)
+- Ghi theo batch bằng executemany (hoặc LOAD DATA), commit theo từng đợt
+- upsert: so với dữ liệu đang có trong DB, chỉ ghi dòng mới / dòng thay đổi
+- Xong thì cập nhật rollup tháng + báo app xoá cache
+"""
+import argparse
+import os
+import tempfile
+import time
+
 import pandas as pd
-import mysql.connector
-from db import get_connection
-# ==== 1. ĐỌC FILE CSV ====
-csv_path = r"dc4.csv"
-df = pd.read_csv(csv_path)
-
-# Xoá khoảng trắng thừa ở tên cột nếu có
-df.columns = df.columns.str.strip()
-
-print("Đọc CSV thành công, số dòng:", len(df))
-print("Cột CSV:", list(df.columns))
-
-# ==== 1.1 CHUYỂN NaN -> None ====
-df = df.astype(object).where(pd.notnull(df), None)
-
-# ==== 1.2 CHUYỂN 0.0 -> "0" (trừ MachineID, Days) ====
-def convert_number(x):
-    if x is None:
-        return None
-    # giữ nguyên kiểu cho MachineID & Days (xử lý riêng khi insert)
-    return x
-
-df = df.map(convert_number)
-
-# ==== 2. KẾT NỐI MYSQL ====
-conn = get_connection()
-
-cursor = conn.cursor()
-
-# ==== 3. LẤY DANH SÁCH MACHINEID HỢP LỆ TỪ BẢNG machine ====
-cursor.execute("SELECT MachineID FROM machine")
-valid_machine_ids = {row[0] for row in cursor.fetchall()}
-print("MachineID hợp lệ trong bảng machine:", valid_machine_ids)
-
-csv_machine_ids = set(df["MachineID"])
-print("MachineID có trong CSV:", csv_machine_ids)
-
-missing_ids = csv_machine_ids - valid_machine_ids
-if missing_ids:
-    print("⚠ MachineID có trong CSV nhưng KHÔNG tồn tại trong bảng machine:", missing_ids)
-else:
-    print("✅ Tất cả MachineID trong CSV đều tồn tại trong bảng machine.")
-
-# ==== 4. CÂU LỆNH INSERT (KHÔNG CÓ idDayValues, KHÔNG CÓ MachineryEdit) ====
-sql = """
-INSERT INTO dayvalues (
-    MachineID,
-    Days,
-    PowerRun,
-    Operation,
-    SmallStop,
-    Fault,
-    Break,
-    Maintenance,
-    Eat,
-    Waiting,
-    CheckMachinery,
-    ChangeProductCode,
-    Glue_CleaningPaper,
-    Others,
-    TargetDayHours,
-    OEERatio,
-    OKProductRatio,
-    OutputRatio,
-    ActivityRatio,
-    Note
-) VALUES (
-    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+
+from db import connect
+from rollup import refresh_buckets
+from cache import publish_invalidation
+
+# ==== CÁC CỘT GHI VÀO dayvalues (KHÔNG CÓ idDayValues, KHÔNG CÓ MachineryEdit) ====
+INSERT_COLUMNS = [
+    "MachineID",
+    "Days",
+    "PowerRun",
+    "Operation",
+    "SmallStop",
+    "Fault",
+    "Break",
+    "Maintenance",
+    "Eat",
+    "Waiting",
+    "CheckMachinery",
+    "ChangeProductCode",
+    "Glue_CleaningPaper",
+    "Others",
+    "TargetDayHours",
+    "OEERatio",
+    "OKProductRatio",
+    "OutputRatio",
+    "ActivityRatio",
+    "Note",
+]
+NUMERIC_COLUMNS = INSERT_COLUMNS[2:-1]
+
+INSERT_SQL = (
+    "INSERT INTO dayvalues ("
+    + ", ".join(f"`{c}`" for c in INSERT_COLUMNS)
+    + ") VALUES ("
+    + ", ".join(["%s"] * len(INSERT_COLUMNS))
+    + ")"
 )
-"""
 
-# ==== 5. INSERT CHỈ NHỮNG DÒNG CÓ MachineID HỢP LỆ ====
-count_ok = 0
-count_skip = 0
+KEY_COLUMNS = ["MachineID", "Days"]
+UPDATE_COLUMNS = INSERT_COLUMNS[2:]
 
-for _, row in df.iterrows():
-    mid = row["MachineID"]
-    # ép MachineID về int nếu có thể
-    if mid is None or str(mid).strip() == "":
-        count_skip += 1
-        continue
+UPSERT_SQL = (
+    INSERT_SQL
+    + " ON DUPLICATE KEY UPDATE "
+    + ", ".join(f"`{c}` = VALUES(`{c}`)" for c in UPDATE_COLUMNS)
+)
 
-    try:
-        mid_int = int(float(mid))
-    except ValueError:
-        print("⚠ MachineID không convert được sang int, bỏ qua dòng:", mid)
-        count_skip += 1
-        continue
-
-    if mid_int not in valid_machine_ids:
-        # bỏ qua dòng vì MachineID không tồn tại trong bảng machine
-        count_skip += 1
-        continue
-
-    # xử lý các giá trị số khác: 0.0 -> "0"
-    def norm(v):
-        if v is None:
-            return None
-        if isinstance(v, float) and v.is_integer():
-            return str(int(v))
-        return v
-
-    values = (
-        mid_int,                 # MachineID là int
-        row["Days"],             # format yyyy-mm-dd trong CSV là ok
-        norm(row["PowerRun"]),
-        norm(row["Operation"]),
-        norm(row["SmallStop"]),
-        norm(row["Fault"]),
-        norm(row["Break"]),
-        norm(row["Maintenance"]),
-        norm(row["Eat"]),
-        norm(row["Waiting"]),
-        norm(row["CheckMachinery"]),
-        norm(row["ChangeProductCode"]),
-        norm(row["Glue_CleaningPaper"]),
-        norm(row["Others"]),
-        norm(row["TargetDayHours"]),
-        norm(row["OEERatio"]),
-        norm(row["OKProductRatio"]),
-        norm(row["OutputRatio"]),
-        norm(row["ActivityRatio"]),
-        row["Note"],
+LOAD_DATA_SQL = (
+    "LOAD DATA LOCAL INFILE %s INTO TABLE dayvalues "
+    "CHARACTER SET utf8mb4 "
+    "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+    "LINES TERMINATED BY '\\n' ("
+    + ", ".join(f"`{c}`" for c in INSERT_COLUMNS)
+    + ")"
+)
+
+
+# ==== 1. CHUẨN HOÁ (VECTOR HOÁ) ====
+def norm_numeric(col):
+    """
+    Giống norm() cũ nhưng chạy trên cả cột:
+      NaN -> None, 0.0 -> "0" (số nguyên ghi dạng chuỗi int), số lẻ -> chuỗi số,
+      giá trị không phải số -> giữ nguyên.
+    """
+    num = pd.to_numeric(col, errors="coerce")
+    out = col.astype(object).where(col.notna(), None)
+
+    is_num = num.notna()
+    is_int = is_num & (num % 1 == 0)
+    is_frac = is_num & ~is_int
+
+    out[is_int] = num[is_int].astype("int64").astype(str)
+    out[is_frac] = num[is_frac].astype(str)
+    return out
+
+
+def normalize_chunk(df, valid_machine_ids):
+    """
+    Trả về (DataFrame sạch theo đúng INSERT_COLUMNS, số dòng bỏ qua, MachineID lạ).
+    Dòng bị bỏ: MachineID trống / không phải số / không có trong bảng machine, Days sai định dạng.
+    """
+    df.columns = df.columns.str.strip()
+    for c in INSERT_COLUMNS:
+        if c not in df.columns:
+            df[c] = None
+
+    mid = pd.to_numeric(df["MachineID"], errors="coerce")
+    days = pd.to_datetime(df["Days"], format="%Y-%m-%d", errors="coerce")
+
+    has_mid = mid.notna() & (mid % 1 == 0)
+    known = has_mid & mid.isin(list(valid_machine_ids))
+    keep = known & days.notna()
+    unknown_ids = set(mid[has_mid & ~known].astype("int64").unique().tolist())
+
+    src = df[keep]
+    out = pd.DataFrame(index=src.index)
+    out["MachineID"] = mid[keep].astype("int64")
+    out["Days"] = days[keep].dt.strftime("%Y-%m-%d")
+    for c in NUMERIC_COLUMNS:
+        out[c] = norm_numeric(src[c])
+    out["Note"] = norm_note(src["Note"])
+
+    return out, int((~keep).sum()), unknown_ids
+
+
+def norm_note(col):
+    return col.astype(object).where(col.notna(), None)
+
+
+def fetch_existing(cursor, clean):
+    """
+    Lấy các dòng đang có trong DB cho cùng máy + khoảng ngày của chunk (1 query),
+    chuẩn hoá giống CSV để so sánh.
+    """
+    machine_ids = sorted(clean["MachineID"].unique().tolist())
+    placeholders = ", ".join(["%s"] * len(machine_ids))
+    cursor.execute(
+        f"""
+        SELECT {", ".join(f"`{c}`" for c in INSERT_COLUMNS)}
+        FROM dayvalues
+        WHERE MachineID IN ({placeholders})
+          AND Days >= %s AND Days <= %s
+        """,
+        machine_ids + [clean["Days"].min(), clean["Days"].max()],
+    )
+    existing = pd.DataFrame(cursor.fetchall(), columns=INSERT_COLUMNS)
+    if existing.empty:
+        return existing
+
+    existing["MachineID"] = existing["MachineID"].astype("int64")
+    existing["Days"] = pd.to_datetime(existing["Days"]).dt.strftime("%Y-%m-%d")
+    for c in NUMERIC_COLUMNS:
+        raw = existing[c]
+        existing[c] = norm_numeric(raw.astype(str).where(raw.notna(), None))
+    existing["Note"] = norm_note(existing["Note"])
+    return existing
+
+
+def split_changes(clean, existing):
+    """
+    Trả về (dòng cần ghi, số dòng mới, số dòng thay đổi, số dòng giữ nguyên).
+    So sánh trên giá trị đã chuẩn hoá; None == None.
+    """
+    if existing.empty:
+        return clean, len(clean), 0, 0
+
+    merged = clean.reset_index(drop=True).merge(
+        existing, on=KEY_COLUMNS, how="left", suffixes=("", "_db"), indicator=True
     )
+    is_new = merged["_merge"] == "left_only"
+
+    differs = pd.Series(False, index=merged.index)
+    for c in UPDATE_COLUMNS:
+        a, b = merged[c], merged[f"{c}_db"]
+        differs |= ~((a == b) | (a.isna() & b.isna()))
+
+    to_write = merged.loc[is_new | differs, INSERT_COLUMNS]
+    n_new = int(is_new.sum())
+    n_changed = int((differs & ~is_new).sum())
+    return to_write, n_new, n_changed, len(merged) - n_new - n_changed
+
+
+def chunk_buckets(clean):
+    """{(MachineID, năm, tháng)} bị ảnh hưởng bởi chunk – để refresh rollup."""
+    d = pd.to_datetime(clean["Days"])
+    keys = pd.DataFrame({"m": clean["MachineID"], "y": d.dt.year, "mo": d.dt.month}).drop_duplicates()
+    return set(zip(keys["m"].tolist(), keys["y"].tolist(), keys["mo"].tolist()))
+
+
+def to_rows(clean):
+    """DataFrame → list tuple kiểu Python thuần (int/str/None) cho executemany."""
+    return list(zip(*(clean[c].tolist() for c in INSERT_COLUMNS)))
+
+
+# ==== 2. GHI DỮ LIỆU ====
+def write_executemany(cursor, clean, batch_size, sql=INSERT_SQL):
+    rows = to_rows(clean)
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[i:i + batch_size])
+    return len(rows)
+
+
+def _load_data_field(v):
+    # NULL không bọc nháy = SQL NULL; còn lại bọc "..." và nhân đôi dấu " bên trong
+    if v is None:
+        return "NULL"
+    return '"' + str(v).replace('"', '""') + '"'
+
+
+def write_load_data(cursor, clean):
+    # ghi chunk ra file tạm rồi LOAD DATA LOCAL INFILE
+    fd, path = tempfile.mkstemp(suffix=".csv", prefix="dayvalues_")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            for row in to_rows(clean):
+                f.write(",".join(_load_data_field(v) for v in row))
+                f.write("\n")
+        cursor.execute(LOAD_DATA_SQL, (path,))
+    finally:
+        os.remove(path)
+    return len(clean)
+
+
+# ==== 3. CHƯƠNG TRÌNH CHÍNH ====
+def parse_args():
+    parser = argparse.ArgumentParser(description="Nạp CSV vào bảng dayvalues")
+    parser.add_argument("csv_path", nargs="?", default="dc4.csv")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="số dòng đọc mỗi lần từ CSV")
+    parser.add_argument("--batch-size", type=int, default=2000, help="số dòng mỗi lần executemany")
+    parser.add_argument("--commit-every", type=int, default=50000, help="commit sau mỗi N dòng")
+    parser.add_argument("--mode", choices=("upsert", "insert"), default="upsert",
+                        help="upsert: ghi đè theo (MachineID, Days), bỏ qua dòng không đổi")
+    parser.add_argument("--load-data", action="store_true",
+                        help="dùng LOAD DATA LOCAL INFILE (chỉ với --mode insert)")
+    args = parser.parse_args()
+    if args.load_data and args.mode != "insert":
+        parser.error("--load-data chỉ dùng được với --mode insert")
+    return args
+
+
+def main():
+    args = parse_args()
+    t0 = time.perf_counter()
+
+    conn = connect(allow_local_infile=True) if args.load_data else connect()
+    cursor = conn.cursor()
+
+    # ---- MachineID hợp lệ ----
+    cursor.execute("SELECT MachineID FROM machine")
+    valid_machine_ids = {row[0] for row in cursor.fetchall()}
+    print("MachineID hợp lệ trong bảng machine:", valid_machine_ids)
+
+    count_ok = 0
+    count_skip = 0
+    count_new = count_changed = count_same = 0
+    since_commit = 0
+    missing_ids = set()
+    buckets = set()
+
+    reader = pd.read_csv(args.csv_path, chunksize=args.chunk_size, dtype=str, skipinitialspace=True)
+    for chunk in reader:
+        clean, skipped, unknown = normalize_chunk(chunk, valid_machine_ids)
+        count_skip += skipped
+        missing_ids |= unknown
+        if clean.empty:
+            continue
+
+        if args.mode == "upsert":
+            # trong cùng file, ngày trùng thì dòng sau cùng thắng
+            clean = clean.drop_duplicates(KEY_COLUMNS, keep="last")
+            clean, n_new, n_changed, n_same = split_changes(clean, fetch_existing(cursor, clean))
+            count_new += n_new
+            count_changed += n_changed
+            count_same += n_same
+            if clean.empty:
+                continue
+            written = write_executemany(cursor, clean, args.batch_size, UPSERT_SQL)
+        elif args.load_data:
+            written = write_load_data(cursor, clean)
+        else:
+            written = write_executemany(cursor, clean, args.batch_size)
+        buckets |= chunk_buckets(clean)
+
+        count_ok += written
+        since_commit += written
+        if since_commit >= args.commit_every:
+            conn.commit()
+            since_commit = 0
+            elapsed = time.perf_counter() - t0
+            print(f"… đã ghi {count_ok} dòng ({count_ok / elapsed:,.0f} dòng/giây)")
+
+    # ---- rollup + cache cho các (máy, tháng) vừa ghi ----
+    n_buckets = refresh_buckets(cursor, buckets)
+    if count_ok:
+        publish_invalidation(cursor, "dayvalues")
+    if n_buckets:
+        publish_invalidation(cursor, "rollup")
+    conn.commit()
+    cursor.close()
+    conn.close()
 
-    cursor.execute(sql, values)
-    count_ok += 1
+    elapsed = time.perf_counter() - t0
+    if missing_ids:
+        print("⚠ MachineID có trong CSV nhưng KHÔNG tồn tại trong bảng machine:", missing_ids)
+    print(f"Cập nhật rollup: {n_buckets} bucket (máy, tháng).")
+    print(f"✅ Ghi thành công {count_ok} dòng vào dayvalues trong {elapsed:.2f}s "
+          f"({count_ok / elapsed if elapsed > 0 else 0:,.0f} dòng/giây).")
+    if args.mode == "upsert":
+        print(f"   upsert: {count_new} dòng mới, {count_changed} dòng cập nhật, "
+              f"{count_same} dòng không đổi (bỏ qua).")
+    print(f"⚠ Bỏ qua {count_skip} dòng do MachineID/Days không hợp lệ hoặc thiếu.")
 
-conn.commit()
-cursor.close()
-conn.close()
 
-print(f"✅ Insert thành công {count_ok} dòng vào dayvalues.")
-print(f"⚠ Bỏ qua {count_skip} dòng do MachineID không hợp lệ hoặc thiếu.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+JSON provider của app: encode bằng orjson (nhanh hơn json stdlib nhiều lần với list/dict lớn),
+không có orjson thì giữ nguyên provider mặc định của Flask.
+
+    app.json = FastJSONProvider(app)      # jsonify(...) ở mọi endpoint tự dùng
+
+Giữ đúng output như trước để FE không phải sửa:
+  - Decimal → string (như Flask), date / datetime → HTTP date (như Flask)
+  - key int trong dict → string
+  - không sort key (Flask mặc định sort – tốn thời gian, FE không cần)
+
+Dạng cột cho series tháng / năm (?format=columnar):
+    [{"day": 1, "categories": {"Operation": 5, ...}}, ...]
+ →  {"day": [1, 2, ...], "Operation": [5, ...], ...}
+Tên key chỉ xuất hiện 1 lần thay vì 1 lần / dòng → payload nhỏ hơn ~3-5 lần.
+"""
+import decimal
+import json
+from datetime import date
+
+from flask import request
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # orjson là tuỳ chọn
+    orjson = None
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:  # Flask < 2.2 không có JSON provider
+    DefaultJSONProvider = None
+
+COLUMNAR_FORMAT = "columnar"
+
+
+def _default(o):
+    """Kiểu orjson không tự encode – giống DefaultJSONProvider.default của Flask."""
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+if DefaultJSONProvider is not None:
+
+    class FastJSONProvider(DefaultJSONProvider):
+        sort_keys = False
+
+        def _option(self):
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return option
+
+        def dumps(self, obj, **kwargs):
+            if orjson is None or kwargs:
+                kwargs.setdefault("default", _default)
+                kwargs.setdefault("sort_keys", self.sort_keys)
+                kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+                return json.dumps(obj, **kwargs)
+            return orjson.dumps(obj, default=_default, option=self._option()).decode("utf-8")
+
+        def loads(self, s, **kwargs):
+            if orjson is None or kwargs:
+                return json.loads(s, **kwargs)
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            if orjson is None:
+                return super().response(obj)
+            # bytes thẳng vào response, không qua str; không indent kể cả debug
+            return self._app.response_class(
+                orjson.dumps(obj, default=_default, option=self._option()),
+                mimetype=self.mimetype,
+            )
+
+else:
+    FastJSONProvider = None
+
+
+def install(app):
+    """Gắn FastJSONProvider cho app (bỏ qua nếu Flask quá cũ)."""
+    if FastJSONProvider is not None:
+        app.json = FastJSONProvider(app)
+    return app
+
+
+def columnar(records):
+    """list dict (dict con 1 cấp được trải phẳng) → dict cột; thứ tự cột theo dòng đầu."""
+    columns = {}
+    for r in records:
+        for key, value in r.items():
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    columns.setdefault(sub_key, []).append(sub_value)
+            else:
+                columns.setdefault(key, []).append(value)
+    return columns
+
+
+def series(records):
+    """Series tháng / năm của response: dạng cột nếu request có ?format=columnar, không thì giữ nguyên."""
+    if request.args.get("format") == COLUMNAR_FORMAT:
+        return columnar(records)
+    return records
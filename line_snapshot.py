@@ -0,0 +1,89 @@
+"""
+Ảnh chụp NGÀY theo line: 11 nhóm giờ (SUM), PowerRun (AVG), product (SUM) – 1 query cho 1 / nhiều / mọi line.
+
+    WITH active AS (máy IsActive = 1 của các line cần lấy)
+         dv     AS (dayvalues ngày đó JOIN active, GROUP BY LineID)
+         po     AS (production_output ngày đó JOIN active, GROUP BY LineID)
+    SELECT productionline LEFT JOIN dv LEFT JOIN po
+
+Cả phần giờ lẫn phần product đều chỉ tính máy IsActive (dùng chung CTE active).
+"""
+from dashboard import line_day_payload
+from metrics import TIME_CATEGORIES
+
+
+def _snapshot_sql(n_lines):
+    """n_lines = None → mọi line; ngược lại lọc LineID IN (n_lines tham số)."""
+    line_filter = ""
+    if n_lines is not None:
+        line_filter = f"AND LineID IN ({', '.join(['%s'] * n_lines)})"
+    return f"""
+        WITH active AS (
+            SELECT MachineID, LineID
+            FROM machine
+            WHERE IsActive = 1 {line_filter}
+        ),
+        dv AS (
+            SELECT
+                a.LineID,
+                MAX(d.Days)      AS Days,
+                AVG(d.PowerRun)  AS PowerRun,
+                {", ".join(f"SUM(d.`{c}`) AS `{c}`" for c in TIME_CATEGORIES)}
+            FROM dayvalues d
+            JOIN active a ON a.MachineID = d.MachineID
+            WHERE d.Days = %s
+            GROUP BY a.LineID
+        ),
+        po AS (
+            SELECT
+                a.LineID,
+                SUM(p.totalproduct_actual) AS Total,
+                SUM(p.totalproduct_ok)     AS OK,
+                SUM(p.totalproduct_ng)     AS NG
+            FROM production_output p
+            JOIN active a ON a.MachineID = p.machineid
+            WHERE p.days = %s
+            GROUP BY a.LineID
+        )
+        SELECT
+            pl.LineID,
+            pl.LineName,
+            dv.Days,
+            dv.PowerRun,
+            {", ".join(f"dv.`{c}`" for c in TIME_CATEGORIES)},
+            po.Total,
+            po.OK,
+            po.NG
+        FROM productionline pl
+        LEFT JOIN dv ON dv.LineID = pl.LineID
+        LEFT JOIN po ON po.LineID = pl.LineID
+        WHERE 1 = 1 {line_filter.replace("LineID", "pl.LineID")}
+        ORDER BY pl.LineID
+    """
+
+
+def line_snapshots(cursor, day, line_ids=None):
+    """
+    Payload /api/lines/<id>/day cho từng line (thêm line_name).
+    line_ids = None → mọi line trong productionline. Line không có dayvalues ngày đó → data None.
+    """
+    if line_ids is not None and not line_ids:
+        return []
+
+    if line_ids is None:
+        cursor.execute(_snapshot_sql(None), (day, day))
+    else:
+        ids = list(line_ids)
+        cursor.execute(_snapshot_sql(len(ids)), ids + [day, day] + ids)
+    rows = cursor.fetchall()
+
+    result = []
+    for r in rows:
+        line_id = r["LineID"]
+        if r["Days"] is None:
+            item = {"line_id": line_id, "day": str(day), "data": None}
+        else:
+            item = line_day_payload(line_id, r, r)
+        item["line_name"] = r["LineName"]
+        result.append(item)
+    return result
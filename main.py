@@ -1,12 +1,33 @@
-from flask import Flask, request, jsonify,send_file
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
-from db import get_connection
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import Border, Side
+from db import get_connection, get_pool_stats, reset_pool
+import os
 from datetime import datetime
-import calendar
+from periods import day_range, month_range, parse_day, period_range, year_range
+from rollup import maybe_sync as maybe_sync_rollups
+from dvstore import dayvalues_store, start_store
+from metrics import RATIO_COLUMNS, TIME_CATEGORIES
+from aggregation import category_series, slot_matrix, totals as category_totals
+from stats import line_ratio_rows, machine_ratio_rows, ratio_stats
+from line_snapshot import line_snapshots
+from overview import line_kpi, plant_kpi
+from cache import cached, publish_invalidation, response_cache
+from conditional import conditional
+from json_provider import install as install_json_provider, series
+from dashboard import MACHINE_DAY_SQL, MACHINE_PRODUCT_SQL, machine_day_payload, machines_day
+from plans import bulk_update_plans, default_day_plan_sql, materialize, start_pregenerator
+from error_rollup import error_source, start_error_rollup
+from error_analytics import (
+    PARETO_DEFAULT_TOP, PARETO_MAX_TOP, PARETO_METRICS,
+    analysis_item, error_groups, error_pareto, event_item, parse_limit, parse_machine,
+)
+from error_timeline import DEFAULT_RESOLUTION, error_timeline, live_bucket
+from reliability import GROUPS as RELIABILITY_GROUPS, reliability, rolling_range
+from excel_export import XLSX_MIMETYPE, stream_workbook
+import export_jobs
+from reports import kpi_report, line_month_report, line_year_report, machine_month_report, machine_year_report
 app = Flask(__name__)
+install_json_provider(app)
 CORS(app)
 def get_days_in_month(month: int) -> int:
     """Trả về số ngày trong tháng (không phân biệt năm, Feb = 28)."""
@@ -108,7 +129,40 @@ def register():
     cur.close();
     conn.close()
     return jsonify({"ok": True, "message": "Đăng ký thành công"})
+@app.route("/api/pool-stats")
+def pool_stats():
+    """Số liệu pool connection của worker hiện tại (in_use, idle, wait, histogram checkout)."""
+    return jsonify(get_pool_stats())
+@app.route("/api/cache-stats")
+def cache_stats():
+    """Hit/miss, dung lượng, số entry bị loại của cache response (worker hiện tại)."""
+    return jsonify(response_cache.stats())
+@app.route("/api/dvstore-stats")
+def dvstore_stats():
+    """Trạng thái kho dayvalues trong RAM (worker hiện tại): đã nạp chưa, số dòng, RAM, watermark."""
+    return jsonify(dayvalues_store.stats())
+@app.route("/api/cache/invalidate", methods=["POST"])
+def cache_invalidate():
+    """
+    Xoá cache thủ công cho mọi worker.
+    Body: {"group": "dayvalues" | "catalog", "machine_id": 5, "line_id": 2} (đều optional)
+    """
+    data = request.get_json(silent=True) or {}
+    conn = get_connection()
+    cursor = conn.cursor()
+    publish_invalidation(
+        cursor,
+        data.get("group") or "dayvalues",
+        machine_id=data.get("machine_id"),
+        line_id=data.get("line_id"),
+    )
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return jsonify({"ok": True})
 @app.route("/api/lines")
+@conditional("productionline")
+@cached("lines", ttl=300, group="catalog")
 def get_lines():
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
@@ -126,6 +180,8 @@ def get_lines():
 
     return jsonify(rows)
 @app.route("/api/lines/<int:idline>/machines")
+@conditional("machine")
+@cached("machines_by_line", ttl=300, group="catalog")
 def get_machines_by_line(idline):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
@@ -144,6 +200,7 @@ def get_machines_by_line(idline):
     conn.close()
     return jsonify(rows)
 @app.route("/api/machines/<int:machine_id>/day")
+@conditional("dayvalues", "production_output")
 def get_machine_day(machine_id):
     day = request.args.get("day")
     if not day:
@@ -153,26 +210,7 @@ def get_machine_day(machine_id):
     cursor = conn.cursor(dictionary=True)
 
     # --------- LẤY DỮ LIỆU THỜI GIAN (dayvalues) ----------
-    cursor.execute("""
-        SELECT 
-            Days,
-            PowerRun,
-            Operation,
-            SmallStop,
-            Fault,
-            Break,
-            Maintenance,
-            Eat,
-            Waiting,
-            MachineryEdit,
-            ChangeProductCode,
-            Glue_CleaningPaper,
-            Others
-        FROM dayvalues
-        WHERE MachineID = %s AND Days = %s
-        LIMIT 1
-    """, (machine_id, day))
-
+    cursor.execute(MACHINE_DAY_SQL, (machine_id, day))
     row = cursor.fetchone()
 
     # (tí nữa còn dùng connection, đừng đóng vội)
@@ -185,157 +223,93 @@ def get_machine_day(machine_id):
             "data": None
         })
 
-    # ---- POWER RUN: 2 chữ sau dấu chấm ----
-    raw_power = row.get("PowerRun")
-    try:
-        power_val = float(raw_power) if raw_power else 0.0
-    except:
-        power_val = 0.0
-    power_run_str = f"{power_val:.2f}"
-
-    # ---- CÁC CATEGORY (cho pie + bảng) ----
-    categories_raw = {
-        "Operation":          float(row["Operation"]          or 0.0),
-        "SmallStop":          float(row["SmallStop"]          or 0.0),
-        "Fault":              float(row["Fault"]              or 0.0),
-        "Break":              float(row["Break"]              or 0.0),
-        "Maintenance":        float(row["Maintenance"]        or 0.0),
-        "Eat":                float(row["Eat"]                or 0.0),
-        "Waiting":            float(row["Waiting"]            or 0.0),
-        "MachineryEdit":      float(row["MachineryEdit"]      or 0.0),
-        "ChangeProductCode":  float(row["ChangeProductCode"]  or 0.0),
-        "Glue_CleaningPaper": float(row["Glue_CleaningPaper"] or 0.0),
-        "Others":             float(row["Others"]             or 0.0),
-    }
-
-    total_hours = sum(categories_raw.values())
-    if total_hours <= 0:
-        total_hours = 1.0
-
-    color_map = {
-        "Operation":          "#00a03e",
-        "SmallStop":          "#f97316",
-        "Fault":              "#ef4444",
-        "Break":              "#eab308",
-        "Maintenance":        "#6b21a8",
-        "Eat":                "#22c55e",
-        "Waiting":            "#0ea5e9",
-        "MachineryEdit":      "#1d4ed8",
-        "ChangeProductCode":  "#a855f7",
-        "Glue_CleaningPaper": "#fb7185",
-        "Others":             "#6b7280",
-    }
-
-    detail_rows = []
-    pie_data = []
-
-    for label, value in categories_raw.items():
-        hours = float(value)
-        h = int(hours)
-        m = int(round((hours - h) * 60))
-        time_str = f"{h}h {m}m"
-
-        ratio = round((hours / total_hours) * 100.0, 2)
-        ratio_text = f"{ratio:.2f}%"
-
-        detail_rows.append({
-            "label": label,
-            "value": hours,
-            "time": time_str,
-            "ratio": ratio,
-            "ratio_text": ratio_text,
-            "color": color_map[label],
-        })
-
-        pie_data.append({
-            "name": label,
-            "value": ratio,
-            "color": color_map[label],
-        })
-
-    # --------- THÊM PHẦN PRODUCT: TOTAL / OK / NG / RATIO ----------
-    # TODO: sửa lại tên bảng + cột cho đúng DB thực tế của bạn
-    #
-    # Ví dụ: bảng dayproduct có cột:
-    #   MachineID, Days, Total, OK, NG
-    #
-    cursor.execute("""
-        SELECT 
-            totalproduct_actual AS Total,
-            totalproduct_ok as OK,
-            totalproduct_ng as NG
-        FROM production_output
-        WHERE machineid = %s AND days = %s
-        LIMIT 1
-    """, (machine_id, day))
-
+    # --------- PRODUCT: TOTAL / OK / NG ----------
+    cursor.execute(MACHINE_PRODUCT_SQL, (machine_id, day))
     prod = cursor.fetchone()
     cursor.close()
     conn.close()
 
-    if prod:
-        total = float(prod["Total"] or 0)
-        ok = float(prod["OK"] or 0)
-        ng = float(prod["NG"] or 0)
-    else:
-        total, ok, ng = 0.0, 0.0, 0.0
-
-    ratio = (ok * 100.0 / total) if total > 0 else 0.0
+    # pie + details + product (FE dùng cho bảng PRODUCT)
+    return jsonify(machine_day_payload(machine_id, row, prod))
+@app.route("/api/machines/day")
+@conditional("dayvalues", "production_output", "machine")
+def get_machines_day():
+    """
+    Dữ liệu NGÀY cho nhiều máy 1 lần (thay cho gọi /api/machines/<id>/day từng máy).
+      ?day=2025-08-23&line_id=3          → mọi máy IsActive của line
+      ?day=2025-08-23&machine_ids=1,2,5  → danh sách máy
+    Mỗi phần tử trong "machines" giống hệt response của API 1 máy (+ machine_name).
+    """
+    day = request.args.get("day")
+    if not day:
+        return jsonify({"error": "Missing day param"}), 400
+    try:
+        day = parse_day(day)
+    except ValueError:
+        return jsonify({"error": "Invalid day format, expected YYYY-MM-DD"}), 400
 
-    product = {
-        "total": int(total),
-        "ok": int(ok),
-        "ng": int(ng),
-        "ratio": round(ratio, 2),
-        "ratio_text": f"{ratio:.2f}%"
-    }
+    line_id = request.args.get("line_id", type=int)
+    machine_ids = None
+    if line_id is None:
+        raw_ids = request.args.get("machine_ids", "")
+        try:
+            machine_ids = sorted({int(x) for x in raw_ids.split(",") if x.strip()})
+        except ValueError:
+            return jsonify({"error": "Invalid machine_ids param"}), 400
+        if not machine_ids:
+            return jsonify({"error": "Missing line_id or machine_ids param"}), 400
 
-    # --------- KẾT QUẢ TRẢ VỀ ----------
-    result = {
-        "machine_id": machine_id,
-        "day": row["Days"],
-        "power_run": power_run_str,
-        "total_hours": round(total_hours, 2),
-        "pie": pie_data,
-        "details": detail_rows,
-        "product": product,          # 👈 FE dùng cho bảng PRODUCT
-    }
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    machines = machines_day(cursor, day, line_id=line_id, machine_ids=machine_ids)
+    cursor.close()
+    conn.close()
 
-    return jsonify(result)
+    return jsonify({
+        "day": day.isoformat(),
+        "line_id": line_id,
+        "machines": machines,
+    })
 from flask import request, jsonify
 
 @app.route("/api/machines/<int:machine_id>/month-ratio")
+@conditional("dayvalues", "machine", vary=dayvalues_store.version)
+@cached("machine_month_ratio", ttl=60)
 def get_machine_month_ratio(machine_id):
     try:
         month = int(request.args.get("month"))
+        month_start, month_end = month_range(nam, month)
     except (TypeError, ValueError):
         return jsonify({"error": "Missing or invalid month param"}), 400
 
     data_type = request.args.get("data", "")  # VD "OEE RATIO" (để echo lại cho FE)
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    # Kho RAM (DVSTORE_ENABLED=1) có đủ tháng thì khỏi query
+    rows = dayvalues_store.machine_days(machine_id, month_start, month_end, RATIO_COLUMNS)
+    if rows is None:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
 
-    # Lấy TỪNG DÒNG theo ngày trong tháng (không AVG)
-    cursor.execute(
-        """
-        SELECT
-            Days,
-            OEERatio,
-            OKProductRatio,
-            OutputRatio,
-            ActivityRatio
-        FROM sdvn.dayvalues
-        WHERE YEAR(Days)= %s AND MachineID = %s
-          AND MONTH(Days) = %s
-        ORDER BY Days
-        """,
-        (nam,machine_id, month),
-    )
+        # Lấy TỪNG DÒNG theo ngày trong tháng (không AVG)
+        cursor.execute(
+            """
+            SELECT
+                Days,
+                OEERatio,
+                OKProductRatio,
+                OutputRatio,
+                ActivityRatio
+            FROM sdvn.dayvalues
+            WHERE MachineID = %s
+              AND Days >= %s AND Days < %s
+            ORDER BY Days
+            """,
+            (machine_id, month_start, month_end),
+        )
 
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
 
     # map theo ngày (1..31) => row
     day_map = {}
@@ -386,128 +360,62 @@ def get_machine_month_ratio(machine_id):
             "machine_id": machine_id,
             "month": month,
             "data_type": data_type or None,
-            "days": days,
+            "days": series(days),
         }
     )
 @app.route("/api/machines/<int:machine_id>/month")
+@conditional("dayvalues", "machine", vary=dayvalues_store.version)
+@cached("machine_month", ttl=60)
 def get_machine_month_time(machine_id):
     try:
         month = int(request.args.get("month"))
+        month_start, month_end = month_range(nam, month)
     except (TypeError, ValueError):
         return jsonify({"error": "Missing or invalid month param"}), 400
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # Lấy TỪNG DÒNG theo ngày (không GROUP / SUM trong SQL)
-    cursor.execute(
-        """
-        SELECT
-            Days,
-            Operation,
-            SmallStop,
-            Fault,
-            Break,
-            Maintenance,
-            Eat,
-            Waiting,
-            MachineryEdit,
-            ChangeProductCode,
-            Glue_CleaningPaper,
-            Others
-        FROM sdvn.dayvalues
-        WHERE YEAR(Days)= %s AND MachineID = %s
-          AND MONTH(Days) = %s
-        ORDER BY Days
-        """,
-        (nam,machine_id, month),
-    )
-
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    # map theo ngày => categories
-    day_map = {}
-
-    # totals tháng (để FE hiển thị tổng, nếu cần)
-    monthly_totals = {
-        "Operation": 0.0,
-        "SmallStop": 0.0,
-        "Fault": 0.0,
-        "Break": 0.0,
-        "Maintenance": 0.0,
-        "Eat": 0.0,
-        "Waiting": 0.0,
-        "MachineryEdit": 0.0,
-        "ChangeProductCode": 0.0,
-        "Glue_CleaningPaper": 0.0,
-        "Others": 0.0,
-    }
-
-    for row in rows:
-        day_raw = row["Days"]
-        if hasattr(day_raw, "day"):
-            dnum = day_raw.day
-        else:
-            try:
-                dnum = int(str(day_raw)[-2:])
-            except ValueError:
-                continue
-
-        categories = {
-            "Operation": float(row.get("Operation") or 0.0),
-            "SmallStop": float(row.get("SmallStop") or 0.0),
-            "Fault": float(row.get("Fault") or 0.0),
-            "Break": float(row.get("Break") or 0.0),
-            "Maintenance": float(row.get("Maintenance") or 0.0),
-            "Eat": float(row.get("Eat") or 0.0),
-            "Waiting": float(row.get("Waiting") or 0.0),
-            "MachineryEdit": float(row.get("MachineryEdit") or 0.0),
-            "ChangeProductCode": float(row.get("ChangeProductCode") or 0.0),
-            "Glue_CleaningPaper": float(row.get("Glue_CleaningPaper") or 0.0),
-            "Others": float(row.get("Others") or 0.0),
-        }
+    # Kho RAM (DVSTORE_ENABLED=1) có đủ tháng thì khỏi query
+    rows = dayvalues_store.machine_days(machine_id, month_start, month_end, TIME_CATEGORIES)
+    if rows is None:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
 
-        day_map[dnum] = categories
+        # Lấy TỪNG DÒNG theo ngày (không GROUP / SUM trong SQL)
+        cursor.execute(
+            """
+            SELECT
+                Days,
+                Operation,
+                SmallStop,
+                Fault,
+                Break,
+                Maintenance,
+                Eat,
+                Waiting,
+                MachineryEdit,
+                ChangeProductCode,
+                Glue_CleaningPaper,
+                Others
+            FROM sdvn.dayvalues
+            WHERE MachineID = %s
+              AND Days >= %s AND Days < %s
+            ORDER BY Days
+            """,
+            (machine_id, month_start, month_end),
+        )
 
-    max_day = get_days_in_month(month)
-    days = []
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
 
-    for d in range(1, max_day + 1):
-        if d in day_map:
-            categories = day_map[d]
-        else:
-            categories = {
-                "Operation": 0.0,
-                "SmallStop": 0.0,
-                "Fault": 0.0,
-                "Break": 0.0,
-                "Maintenance": 0.0,
-                "Eat": 0.0,
-                "Waiting": 0.0,
-                "MachineryEdit": 0.0,
-                "ChangeProductCode": 0.0,
-                "Glue_CleaningPaper": 0.0,
-                "Others": 0.0,
-            }
-
-        # cộng dồn totals
-        for k in monthly_totals:
-            monthly_totals[k] += categories[k]
-
-        days.append(
-            {
-                "day": d,
-                "categories": categories,
-            }
-        )
+    # ma trận (ngày x 11 nhóm), ngày không có dữ liệu = 0
+    matrix = slot_matrix(rows, "Days", get_days_in_month(month))
 
     result = {
         "machine_id": machine_id,
         "month": month,
-        "days": days,
-        "monthly_totals": {k: round(v, 2) for k, v in monthly_totals.items()},
+        "days": series(category_series(matrix, "day")),
+        # totals tháng (để FE hiển thị tổng, nếu cần)
+        "monthly_totals": category_totals(matrix),
     }
 
     return jsonify(result)
@@ -515,233 +423,18 @@ def get_machine_month_time(machine_id):
 def export_machine_month_excel(machine_id):
     try:
         month = int(request.args.get("month"))
+        month_range(nam, month)
     except (TypeError, ValueError):
         return jsonify({"error": "Missing or invalid month param"}), 400
 
     data_type = request.args.get("data", "ALL")
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # --- 1. LẤY TÊN MÁY THEO ID ---
-    # Nếu bạn có bảng machines(MachineID, MachineName) thì sửa query này lại cho đúng
-    cursor.execute(
-        "SELECT MachineName FROM machine WHERE MachineID = %s",
-        (machine_id,),
-    )
-    mrow = cursor.fetchone()
-    machine_name = (
-        mrow["MachineName"] if mrow and mrow.get("MachineName") else f"Machine_{machine_id}"
-    )
-
-    # --- 2. LẤY DỮ LIỆU THÁNG TỪ dayvalues ---
-    cursor.execute(
-        """
-        SELECT
-            Days,
-            OEERatio,
-            OKProductRatio,
-            OutputRatio,
-            ActivityRatio,
-            Operation,
-            SmallStop,
-            Fault,
-            Break,
-            Maintenance,
-            Eat,
-            Waiting,
-            MachineryEdit,
-            ChangeProductCode,
-            Glue_CleaningPaper,
-            Others
-        FROM sdvn.dayvalues
-        WHERE MachineID = %s
-          AND MONTH(Days) = %s AND YEAR(Days) = %s
-        ORDER BY Days
-        """,
-        (machine_id, month,nam),
-    )
-    rows = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
-
-    # --- 3. TẠO EXCEL ---
-    wb = Workbook()
-    ws = wb.active
-    ws.title = machine_name
-
-    # Dòng thông tin chung
-    ws.append(
-        [
-            f"Machine: {machine_name}",
-            f"Month: {month}",
-            f"Data filter: {data_type}",
-        ]
-    )
-    ws.append([])
-
-    # Header cột
-    headers = [
-        "Date",
-        # Ratio
-        "OEERatio",
-        "OKProductRatio",
-        "OutputRatio",
-        "ActivityRatio",
-        # Time (giờ)
-        "Operation",
-        "SmallStop",
-        "Fault",
-        "Break",
-        "Maintenance",
-        "Eat",
-        "Waiting",
-        "MachineryEdit",
-        "ChangeProductCode",
-        "Glue_CleaningPaper",
-        "Others",
-        # Time (%)
-        "OperationPct",
-        "SmallStopPct",
-        "FaultPct",
-        "BreakPct",
-        "MaintenancePct",
-        "EatPct",
-        "WaitingPct",
-        "MachineryEditPct",
-        "ChangeProductCodePct",
-        "Glue_CleaningPaperPct",
-        "OthersPct",
-    ]
-    ws.append(headers)
-
-    # Ghi từng ngày
-    for row in rows:
-        # Date
-        day_raw = row["Days"]
-        day_str = (
-            day_raw.strftime("%Y-%m-%d")
-            if hasattr(day_raw, "strftime")
-            else str(day_raw)
-        )
-
-        # Ratio
-        oee = float(row.get("OEERatio") or 0.0)
-        okr = float(row.get("OKProductRatio") or 0.0)
-        out = float(row.get("OutputRatio") or 0.0)
-        act = float(row.get("ActivityRatio") or 0.0)
-
-        # Time (giờ)
-        op = float(row.get("Operation") or 0.0)
-        ss = float(row.get("SmallStop") or 0.0)
-        flt = float(row.get("Fault") or 0.0)
-        brk = float(row.get("Break") or 0.0)
-        mt = float(row.get("Maintenance") or 0.0)
-        eat = float(row.get("Eat") or 0.0)
-        wait = float(row.get("Waiting") or 0.0)
-        me = float(row.get("MachineryEdit") or 0.0)
-        cpc = float(row.get("ChangeProductCode") or 0.0)
-        gcp = float(row.get("Glue_CleaningPaper") or 0.0)
-        oth = float(row.get("Others") or 0.0)
-
-        total_time = (
-            op
-            + ss
-            + flt
-            + brk
-            + mt
-            + eat
-            + wait
-            + me
-            + cpc
-            + gcp
-            + oth
-        )
-
-        def pct(val: float) -> float:
-            if total_time <= 0:
-                return 0.0
-            return round((val * 100.0) / total_time, 2)
-
-        ws.append(
-            [
-                day_str,
-                # Ratio
-                oee,
-                okr,
-                out,
-                act,
-                # Time (giờ)
-                op,
-                ss,
-                flt,
-                brk,
-                mt,
-                eat,
-                wait,
-                me,
-                cpc,
-                gcp,
-                oth,
-                # Time (%)
-                pct(op),
-                pct(ss),
-                pct(flt),
-                pct(brk),
-                pct(mt),
-                pct(eat),
-                pct(wait),
-                pct(me),
-                pct(cpc),
-                pct(gcp),
-                pct(oth),
-            ]
-        )
-
-    # --- 4. KẺ BẢNG (BORDER) CHO TẤT CẢ Ô ---
-    thin = Side(style="thin")
-    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    max_row = ws.max_row
-    max_col = ws.max_column
-
-    for row in ws.iter_rows(
-        min_row=1, max_row=max_row, min_col=1, max_col=max_col
-    ):
-        for cell in row:
-            cell.border = thin_border
-
-    # --- 5. LƯU RA BUFFER ---
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    # --- 6. TÊN FILE: tenmay_thang.xlsx (VD: LINE_01_09.xlsx) ---
-    #safe_name = "".join(
-      #  ch if ch.isalnum() or ch == " " else "_" for ch in machine_name
-   # )
-   # safe_name = safe_name.replace(" ", "_")
-    filename = f"{machine_name}_{month:02d}.xlsx"
-
-    try:
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-    except TypeError:
-        # fallback nếu Flask cũ
-        return send_file(
-            output,
-            as_attachment=True,
-            attachment_filename=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-from flask import request, jsonify
-
+    # Tên file: tenmay_thang.xlsx (VD: LINE_01_09.xlsx)
+    filename, sheets = machine_month_report(machine_id, nam, month, data_type)
+    return stream_workbook(sheets, filename)
 @app.route("/api/machines/<int:machine_id>/year-ratio", methods=["GET"])
+@conditional("dayvalues_machine_month", "machine", refresh=maybe_sync_rollups)
+@cached("machine_year_ratio", ttl=300)
 def get_machine_year_ratio(machine_id):
     """
     Ratio theo NĂM, luôn trả đủ 12 tháng.
@@ -755,18 +448,18 @@ def get_machine_year_ratio(machine_id):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
 
+    # Đọc từ rollup tháng (AVG = Sum / Cnt)
     cursor.execute(
         """
         SELECT
-            MONTH(Days) AS m,
-            AVG(OEERatio)       AS avg_oee,
-            AVG(OKProductRatio) AS avg_ok,
-            AVG(OutputRatio)    AS avg_output,
-            AVG(ActivityRatio)  AS avg_activity
-        FROM sdvn.dayvalues
+            `Month` AS m,
+            OEERatio_Sum       / NULLIF(OEERatio_Cnt, 0)       AS avg_oee,
+            OKProductRatio_Sum / NULLIF(OKProductRatio_Cnt, 0) AS avg_ok,
+            OutputRatio_Sum    / NULLIF(OutputRatio_Cnt, 0)    AS avg_output,
+            ActivityRatio_Sum  / NULLIF(ActivityRatio_Cnt, 0)  AS avg_activity
+        FROM sdvn.dayvalues_machine_month
         WHERE MachineID = %s
-          AND YEAR(Days) = %s
-        GROUP BY MONTH(Days)
+          AND `Year` = %s
         ORDER BY m
         """,
         (machine_id, year),
@@ -802,8 +495,10 @@ def get_machine_year_ratio(machine_id):
                 }
             )
 
-    return jsonify({"months": months})
+    return jsonify({"months": series(months)})
 @app.route("/api/machines/<int:machine_id>/year", methods=["GET"])
+@conditional("dayvalues_machine_month", "machine", refresh=maybe_sync_rollups)
+@cached("machine_year", ttl=300)
 def get_machine_year_time(machine_id):
     """
     Thời gian theo NĂM, luôn trả đủ 12 tháng.
@@ -817,25 +512,25 @@ def get_machine_year_time(machine_id):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
 
+    # Đọc từ rollup tháng
     cursor.execute(
         """
         SELECT
-            MONTH(Days) AS m,
-            SUM(Operation)          AS op,
-            SUM(SmallStop)          AS ss,
-            SUM(Fault)              AS flt,
-            SUM(`Break`)            AS brk,
-            SUM(Maintenance)        AS mt,
-            SUM(Eat)                AS eat,
-            SUM(Waiting)            AS w,
-            SUM(MachineryEdit)      AS me,
-            SUM(ChangeProductCode)  AS cpc,
-            SUM(Glue_CleaningPaper) AS gcp,
-            SUM(Others)             AS oth
-        FROM sdvn.dayvalues
+            `Month` AS m,
+            Operation,
+            SmallStop,
+            Fault,
+            `Break`,
+            Maintenance,
+            Eat,
+            Waiting,
+            MachineryEdit,
+            ChangeProductCode,
+            Glue_CleaningPaper,
+            Others
+        FROM sdvn.dayvalues_machine_month
         WHERE MachineID = %s
-          AND YEAR(Days) = %s
-        GROUP BY MONTH(Days)
+          AND `Year` = %s
         ORDER BY m
         """,
         (machine_id, year),
@@ -844,52 +539,9 @@ def get_machine_year_time(machine_id):
     cursor.close()
     conn.close()
 
-    # Dict theo tháng
-    month_map = {int(r["m"]): r for r in rows}
-
-    months = []
-    for m in range(1, 13):  # luôn trả 1..12
-        if m in month_map:
-            r = month_map[m]
-            months.append(
-                {
-                    "month": m,
-                    "categories": {
-                        "Operation": float(r.get("op") or 0.0),
-                        "SmallStop": float(r.get("ss") or 0.0),
-                        "Fault": float(r.get("flt") or 0.0),
-                        "Break": float(r.get("brk") or 0.0),
-                        "Maintenance": float(r.get("mt") or 0.0),
-                        "Eat": float(r.get("eat") or 0.0),
-                        "Waiting": float(r.get("w") or 0.0),
-                        "MachineryEdit": float(r.get("me") or 0.0),
-                        "ChangeProductCode": float(r.get("cpc") or 0.0),
-                        "Glue_CleaningPaper": float(r.get("gcp") or 0.0),
-                        "Others": float(r.get("oth") or 0.0),
-                    },
-                }
-            )
-        else:
-            months.append(
-                {
-                    "month": m,
-                    "categories": {
-                        "Operation": 0,
-                        "SmallStop": 0,
-                        "Fault": 0,
-                        "Break": 0,
-                        "Maintenance": 0,
-                        "Eat": 0,
-                        "Waiting": 0,
-                        "MachineryEdit": 0,
-                        "ChangeProductCode": 0,
-                        "Glue_CleaningPaper": 0,
-                        "Others": 0,
-                    },
-                }
-            )
-
-    return jsonify({"months": months})
+    # luôn trả 1..12, tháng không có dữ liệu = 0
+    matrix = slot_matrix(rows, "m", 12)
+    return jsonify({"months": series(category_series(matrix, "month"))})
 
 
 """
@@ -897,203 +549,102 @@ Quý thêm phần Total Line
 """
 
 @app.route("/api/lines/<int:line_id>/day")
+@conditional("dayvalues", "production_output", "machine")
 def get_line_day(line_id):
     day = request.args.get("day")
     if not day:
         return jsonify({"error": "Missing day param"}), 400
 
+    # giờ + PowerRun + product của line, 1 query (chỉ máy IsActive)
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
+    snapshots = line_snapshots(cursor, day, [line_id])
+    cursor.close()
+    conn.close()
 
-    # --------- LẤY DỮ LIỆU THỜI GIAN TỔNG THEO LINE ----------
-    # SUM thời gian, AVG PowerRun cho tất cả máy thuộc line
-    cursor.execute(
-        """
-        SELECT 
-            dv.Days,
-            AVG(dv.PowerRun)          AS PowerRun,
-            SUM(dv.Operation)         AS Operation,
-            SUM(dv.SmallStop)         AS SmallStop,
-            SUM(dv.Fault)             AS Fault,
-            SUM(dv.Break)             AS Break,
-            SUM(dv.Maintenance)       AS Maintenance,
-            SUM(dv.Eat)               AS Eat,
-            SUM(dv.Waiting)           AS Waiting,
-            SUM(dv.MachineryEdit)     AS MachineryEdit,
-            SUM(dv.ChangeProductCode) AS ChangeProductCode,
-            SUM(dv.Glue_CleaningPaper) AS Glue_CleaningPaper,
-            SUM(dv.Others)            AS Others
-        FROM sdvn.dayvalues dv
-        JOIN sdvn.machine m ON dv.MachineID = m.MachineID
-        WHERE m.LineID = %s AND dv.Days = %s AND IsActive = 1
-        GROUP BY dv.Days
-        LIMIT 1
-        """,
-        (line_id, day),
-    )
-
-    row = cursor.fetchone()
-
-    if not row:
-        cursor.close()
-        conn.close()
+    if not snapshots or snapshots[0].get("data", True) is None:
         return jsonify({
             "line_id": line_id,
             "day": day,
             "data": None
         })
 
-    # ---- POWER RUN: format 2 chữ số sau dấu chấm ----
-    raw_power = row.get("PowerRun")
+    return jsonify(snapshots[0])
+@app.route("/api/lines/day")
+@conditional("dayvalues", "production_output", "machine", "productionline")
+def get_lines_day():
+    """
+    Ảnh chụp NGÀY cho nhiều line 1 lần (trang tổng quan nhà máy):
+      ?day=2025-08-23&lines=all      (mặc định)
+      ?day=2025-08-23&lines=1,2,3
+    Mỗi phần tử giống response /api/lines/<id>/day (+ line_name).
+    """
+    day = request.args.get("day")
+    if not day:
+        return jsonify({"error": "Missing day param"}), 400
     try:
-        power_val = float(raw_power) if raw_power is not None else 0.0
-    except Exception:
-        power_val = 0.0
-    power_run_str = f"{power_val:.2f}"
-
-    # ---- CÁC CATEGORY (cho pie + bảng) – SUM theo line ----
-    categories_raw = {
-        "Operation":          float(row["Operation"]          or 0.0),
-        "SmallStop":          float(row["SmallStop"]          or 0.0),
-        "Fault":              float(row["Fault"]              or 0.0),
-        "Break":              float(row["Break"]              or 0.0),
-        "Maintenance":        float(row["Maintenance"]        or 0.0),
-        "Eat":                float(row["Eat"]                or 0.0),
-        "Waiting":            float(row["Waiting"]            or 0.0),
-        "MachineryEdit":      float(row["MachineryEdit"]      or 0.0),
-        "ChangeProductCode":  float(row["ChangeProductCode"]  or 0.0),
-        "Glue_CleaningPaper": float(row["Glue_CleaningPaper"] or 0.0),
-        "Others":             float(row["Others"]             or 0.0),
-    }
-
-    total_hours = sum(categories_raw.values())
-    if total_hours <= 0:
-        total_hours = 1.0
-
-    color_map = {
-        "Operation":          "#00a03e",
-        "SmallStop":          "#f97316",
-        "Fault":              "#ef4444",
-        "Break":              "#eab308",
-        "Maintenance":        "#6b21a8",
-        "Eat":                "#22c55e",
-        "Waiting":            "#0ea5e9",
-        "MachineryEdit":      "#1d4ed8",
-        "ChangeProductCode":  "#a855f7",
-        "Glue_CleaningPaper": "#fb7185",
-        "Others":             "#6b7280",
-    }
-
-    detail_rows = []
-    pie_data = []
-
-    for label, value in categories_raw.items():
-        hours = float(value)
-        h = int(hours)
-        m = int(round((hours - h) * 60))
-        time_str = f"{h}h {m}m"
-
-        ratio = round((hours / total_hours) * 100.0, 2)
-        ratio_text = f"{ratio:.2f}%"
-
-        detail_rows.append({
-            "label": label,
-            "value": hours,
-            "time": time_str,
-            "ratio": ratio,
-            "ratio_text": ratio_text,
-            "color": color_map[label],
-        })
-
-        pie_data.append({
-            "name": label,
-            "value": ratio,
-            "color": color_map[label],
-        })
+        day = parse_day(day)
+    except ValueError:
+        return jsonify({"error": "Invalid day format, expected YYYY-MM-DD"}), 400
 
-    # --------- PRODUCT TỔNG THEO LINE ----------
-    # Có thể dùng logic giống C# CalculatorOutputLine nhưng giữ schema giống FE hiện tại
-    cursor.execute(
-        """
-        SELECT 
-            SUM(po.totalproduct_actual) AS TotalActual,
-            SUM(po.totalproduct_ok)     AS TotalOK,
-            SUM(po.totalproduct_ng)     AS TotalNG
-        FROM production_output po
-        JOIN machine m ON po.machineid = m.MachineID
-        WHERE po.days = %s AND m.LineID = %s AND IsActive = 1
-        """,
-        (day, line_id),
-    )
+    lines_param = (request.args.get("lines") or "all").strip().lower()
+    if lines_param == "all":
+        line_ids = None
+    else:
+        try:
+            line_ids = sorted({int(x) for x in lines_param.split(",") if x.strip()})
+        except ValueError:
+            return jsonify({"error": "Invalid lines param"}), 400
+        if not line_ids:
+            return jsonify({"error": "Invalid lines param"}), 400
 
-    prod = cursor.fetchone()
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    lines = line_snapshots(cursor, day, line_ids)
     cursor.close()
     conn.close()
 
-    if prod:
-        total_actual = float(prod["TotalActual"] or 0.0)
-        total_ok = float(prod["TotalOK"] or 0.0)
-        total_ng = float(prod["TotalNG"] or 0.0)
-    else:
-        total_actual = total_ok = total_ng = 0.0
-
-    # ratio OK/Total (giống máy)
-    ratio = (total_ok * 100.0 / total_actual) if total_actual > 0 else 0.0
-
-    product = {
-        "total": int(total_actual),
-        "ok": int(total_ok),
-        "ng": int(total_ng),
-        "ratio": round(ratio, 2),
-        "ratio_text": f"{ratio:.2f}%",
-    }
-
-    result = {
-        "line_id": line_id,
-        "day": row["Days"],
-        "power_run": power_run_str,
-        "total_hours": round(total_hours, 2),
-        "pie": pie_data,
-        "details": detail_rows,
-        "product": product,
-    }
-
-    return jsonify(result)
+    return jsonify({"day": day.isoformat(), "lines": lines})
 @app.route("/api/lines/<int:line_id>/month-ratio")
+@conditional("dayvalues", "machine", vary=dayvalues_store.version)
+@cached("line_month_ratio", ttl=60)
 def get_line_month_ratio(line_id):
     try:
         month = int(request.args.get("month"))
+        month_start, month_end = month_range(nam, month)
     except (TypeError, ValueError):
         return jsonify({"error": "Missing or invalid month param"}), 400
 
     data_type = request.args.get("data", "")
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    # Kho RAM (DVSTORE_ENABLED=1) có đủ tháng thì khỏi query
+    rows = dayvalues_store.line_days(line_id, month_start, month_end, avg_columns=RATIO_COLUMNS)
+    if rows is None:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
 
-    # Lấy từng ngày trong tháng, AVG ratio theo line (GIỮ NGUYÊN)
-    cursor.execute(
-        """
-        SELECT
-            dv.Days,
-            AVG(dv.OEERatio)       AS OEERatio,
-            AVG(dv.OKProductRatio) AS OKProductRatio,
-            AVG(dv.OutputRatio)    AS OutputRatio,
-            AVG(dv.ActivityRatio)  AS ActivityRatio
-        FROM sdvn.dayvalues dv
-        JOIN sdvn.machine m ON dv.MachineID = m.MachineID
-        WHERE m.LineID = %s AND IsActive = 1
-          AND MONTH(dv.Days) = %s
-          AND YEAR(dv.Days) = %s
-        GROUP BY dv.Days
-        ORDER BY dv.Days
-        """,
-        (line_id, month, nam),   # nam: biến năm global bạn đang dùng
-    )
+        # Lấy từng ngày trong tháng, AVG ratio theo line (GIỮ NGUYÊN)
+        cursor.execute(
+            """
+            SELECT
+                dv.Days,
+                AVG(dv.OEERatio)       AS OEERatio,
+                AVG(dv.OKProductRatio) AS OKProductRatio,
+                AVG(dv.OutputRatio)    AS OutputRatio,
+                AVG(dv.ActivityRatio)  AS ActivityRatio
+            FROM sdvn.dayvalues dv
+            JOIN sdvn.machine m ON dv.MachineID = m.MachineID
+            WHERE m.LineID = %s AND IsActive = 1
+              AND dv.Days >= %s AND dv.Days < %s
+            GROUP BY dv.Days
+            ORDER BY dv.Days
+            """,
+            (line_id, month_start, month_end),   # nam: biến năm global bạn đang dùng
+        )
 
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
 
     # HÀM LÀM TRÒN 2 CHỮ SỐ SAU DẤU .
     def f2(v):
@@ -1147,122 +698,62 @@ def get_line_month_ratio(line_id):
             "line_id": line_id,
             "month": month,
             "data_type": data_type or None,
-            "days": days,
+            "days": series(days),
         }
     )
 
 @app.route("/api/lines/<int:line_id>/month")
+@conditional("dayvalues", "machine", vary=dayvalues_store.version)
+@cached("line_month", ttl=60)
 def get_line_month_time(line_id):
     try:
         month = int(request.args.get("month"))
+        month_start, month_end = month_range(nam, month)
     except (TypeError, ValueError):
         return jsonify({"error": "Missing or invalid month param"}), 400
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute(
-        """
-        SELECT
-            dv.Days,
-            SUM(dv.Operation)         AS Operation,
-            SUM(dv.SmallStop)         AS SmallStop,
-            SUM(dv.Fault)             AS Fault,
-            SUM(dv.Break)             AS Break,
-            SUM(dv.Maintenance)       AS Maintenance,
-            SUM(dv.Eat)               AS Eat,
-            SUM(dv.Waiting)           AS Waiting,
-            SUM(dv.MachineryEdit)     AS MachineryEdit,
-            SUM(dv.ChangeProductCode) AS ChangeProductCode,
-            SUM(dv.Glue_CleaningPaper) AS Glue_CleaningPaper,
-            SUM(dv.Others)            AS Others
-        FROM sdvn.dayvalues dv
-        JOIN sdvn.machine m ON dv.MachineID = m.MachineID
-        WHERE m.LineID = %s AND IsActive = 1
-          AND MONTH(dv.Days) = %s
-          AND YEAR(dv.Days) = %s
-        GROUP BY dv.Days
-        ORDER BY dv.Days
-        """,
-        (line_id, month, nam),
-    )
-
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    day_map = {}
-    monthly_totals = {
-        "Operation": 0.0,
-        "SmallStop": 0.0,
-        "Fault": 0.0,
-        "Break": 0.0,
-        "Maintenance": 0.0,
-        "Eat": 0.0,
-        "Waiting": 0.0,
-        "MachineryEdit": 0.0,
-        "ChangeProductCode": 0.0,
-        "Glue_CleaningPaper": 0.0,
-        "Others": 0.0,
-    }
-
-    for row in rows:
-        day_raw = row["Days"]
-        if hasattr(day_raw, "day"):
-            dnum = day_raw.day
-        else:
-            try:
-                dnum = int(str(day_raw)[-2:])
-            except ValueError:
-                continue
-
-        categories = {
-            "Operation": float(row.get("Operation") or 0.0),
-            "SmallStop": float(row.get("SmallStop") or 0.0),
-            "Fault": float(row.get("Fault") or 0.0),
-            "Break": float(row.get("Break") or 0.0),
-            "Maintenance": float(row.get("Maintenance") or 0.0),
-            "Eat": float(row.get("Eat") or 0.0),
-            "Waiting": float(row.get("Waiting") or 0.0),
-            "MachineryEdit": float(row.get("MachineryEdit") or 0.0),
-            "ChangeProductCode": float(row.get("ChangeProductCode") or 0.0),
-            "Glue_CleaningPaper": float(row.get("Glue_CleaningPaper") or 0.0),
-            "Others": float(row.get("Others") or 0.0),
-        }
+    # Kho RAM (DVSTORE_ENABLED=1) có đủ tháng thì khỏi query
+    rows = dayvalues_store.line_days(line_id, month_start, month_end, sum_columns=TIME_CATEGORIES)
+    if rows is None:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
 
-        day_map[dnum] = categories
+        cursor.execute(
+            """
+            SELECT
+                dv.Days,
+                SUM(dv.Operation)         AS Operation,
+                SUM(dv.SmallStop)         AS SmallStop,
+                SUM(dv.Fault)             AS Fault,
+                SUM(dv.Break)             AS Break,
+                SUM(dv.Maintenance)       AS Maintenance,
+                SUM(dv.Eat)               AS Eat,
+                SUM(dv.Waiting)           AS Waiting,
+                SUM(dv.MachineryEdit)     AS MachineryEdit,
+                SUM(dv.ChangeProductCode) AS ChangeProductCode,
+                SUM(dv.Glue_CleaningPaper) AS Glue_CleaningPaper,
+                SUM(dv.Others)            AS Others
+            FROM sdvn.dayvalues dv
+            JOIN sdvn.machine m ON dv.MachineID = m.MachineID
+            WHERE m.LineID = %s AND IsActive = 1
+              AND dv.Days >= %s AND dv.Days < %s
+            GROUP BY dv.Days
+            ORDER BY dv.Days
+            """,
+            (line_id, month_start, month_end),
+        )
 
-    max_day = get_days_in_month(month)
-    days = []
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
 
-    for d in range(1, max_day + 1):
-        if d in day_map:
-            categories = day_map[d]
-        else:
-            categories = {
-                "Operation": 0.0,
-                "SmallStop": 0.0,
-                "Fault": 0.0,
-                "Break": 0.0,
-                "Maintenance": 0.0,
-                "Eat": 0.0,
-                "Waiting": 0.0,
-                "MachineryEdit": 0.0,
-                "ChangeProductCode": 0.0,
-                "Glue_CleaningPaper": 0.0,
-                "Others": 0.0,
-            }
-
-        for k in monthly_totals:
-            monthly_totals[k] += categories[k]
-
-        days.append({"day": d, "categories": categories})
+    matrix = slot_matrix(rows, "Days", get_days_in_month(month))
 
     result = {
         "line_id": line_id,
         "month": month,
-        "days": days,
-        "monthly_totals": {k: round(v, 2) for k, v in monthly_totals.items()},
+        "days": series(category_series(matrix, "day")),
+        "monthly_totals": category_totals(matrix),
     }
 
     return jsonify(result)
@@ -1270,196 +761,17 @@ def get_line_month_time(line_id):
 def export_line_month_excel(line_id):
     try:
         month = int(request.args.get("month"))
+        month_range(nam, month)
     except (TypeError, ValueError):
         return jsonify({"error": "Missing or invalid month param"}), 400
 
     data_type = request.args.get("data", "ALL")
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # Lấy tên line (tuỳ bảng của bạn)
-    cursor.execute(
-        "SELECT LineName FROM line WHERE LineID = %s",
-        (line_id,),
-    )
-    lrow = cursor.fetchone()
-    line_name = (
-        lrow["LineName"] if lrow and lrow.get("LineName") else f"Line_{line_id}"
-    )
-
-    # Dữ liệu theo ngày, gộp theo line
-    cursor.execute(
-        """
-        SELECT
-            dv.Days,
-            AVG(dv.OEERatio)       AS OEERatio,
-            AVG(dv.OKProductRatio) AS OKProductRatio,
-            AVG(dv.OutputRatio)    AS OutputRatio,
-            AVG(dv.ActivityRatio)  AS ActivityRatio,
-            SUM(dv.Operation)         AS Operation,
-            SUM(dv.SmallStop)         AS SmallStop,
-            SUM(dv.Fault)             AS Fault,
-            SUM(dv.Break)             AS Break,
-            SUM(dv.Maintenance)       AS Maintenance,
-            SUM(dv.Eat)               AS Eat,
-            SUM(dv.Waiting)           AS Waiting,
-            SUM(dv.MachineryEdit)     AS MachineryEdit,
-            SUM(dv.ChangeProductCode) AS ChangeProductCode,
-            SUM(dv.Glue_CleaningPaper) AS Glue_CleaningPaper,
-            SUM(dv.Others)            AS Others
-        FROM sdvn.dayvalues dv
-        JOIN sdvn.machine m ON dv.MachineID = m.MachineID
-        WHERE m.LineID = %s AND IsActive = 1
-          AND MONTH(dv.Days) = %s
-          AND YEAR(dv.Days) = %s
-        GROUP BY dv.Days
-        ORDER BY dv.Days
-        """,
-        (line_id, month, nam),
-    )
-    rows = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = line_name
-
-    ws.append(
-        [
-            f"Line: {line_name}",
-            f"Month: {month}",
-            f"Data filter: {data_type}",
-        ]
-    )
-    ws.append([])
-
-    headers = [
-        "Date",
-        "OEERatio",
-        "OKProductRatio",
-        "OutputRatio",
-        "ActivityRatio",
-        "Operation",
-        "SmallStop",
-        "Fault",
-        "Break",
-        "Maintenance",
-        "Eat",
-        "Waiting",
-        "MachineryEdit",
-        "ChangeProductCode",
-        "Glue_CleaningPaper",
-        "Others",
-        "OperationPct",
-        "SmallStopPct",
-        "FaultPct",
-        "BreakPct",
-        "MaintenancePct",
-        "EatPct",
-        "WaitingPct",
-        "MachineryEditPct",
-        "ChangeProductCodePct",
-        "Glue_CleaningPaperPct",
-        "OthersPct",
-    ]
-    ws.append(headers)
-
-    for row in rows:
-        day_raw = row["Days"]
-        day_str = (
-            day_raw.strftime("%Y-%m-%d")
-            if hasattr(day_raw, "strftime")
-            else str(day_raw)
-        )
-
-        oee = float(row.get("OEERatio") or 0.0)
-        okr = float(row.get("OKProductRatio") or 0.0)
-        out = float(row.get("OutputRatio") or 0.0)
-        act = float(row.get("ActivityRatio") or 0.0)
-
-        op   = float(row.get("Operation") or 0.0)
-        ss   = float(row.get("SmallStop") or 0.0)
-        flt  = float(row.get("Fault") or 0.0)
-        brk  = float(row.get("Break") or 0.0)
-        mt   = float(row.get("Maintenance") or 0.0)
-        eat  = float(row.get("Eat") or 0.0)
-        wait = float(row.get("Waiting") or 0.0)
-        me   = float(row.get("MachineryEdit") or 0.0)
-        cpc  = float(row.get("ChangeProductCode") or 0.0)
-        gcp  = float(row.get("Glue_CleaningPaper") or 0.0)
-        oth  = float(row.get("Others") or 0.0)
-
-        total_time = op + ss + flt + brk + mt + eat + wait + me + cpc + gcp + oth
-
-        def pct(val: float) -> float:
-            if total_time <= 0:
-                return 0.0
-            return round((val * 100.0) / total_time, 2)
-
-        ws.append(
-            [
-                day_str,
-                oee,
-                okr,
-                out,
-                act,
-                op,
-                ss,
-                flt,
-                brk,
-                mt,
-                eat,
-                wait,
-                me,
-                cpc,
-                gcp,
-                oth,
-                pct(op),
-                pct(ss),
-                pct(flt),
-                pct(brk),
-                pct(mt),
-                pct(eat),
-                pct(wait),
-                pct(me),
-                pct(cpc),
-                pct(gcp),
-                pct(oth),
-            ]
-        )
-
-    thin = Side(style="thin")
-    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
-    max_row = ws.max_row
-    max_col = ws.max_column
-    for row in ws.iter_rows(min_row=1, max_row=max_row, min_col=1, max_col=max_col):
-        for cell in row:
-            cell.border = thin_border
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    filename = f"{line_name}_month_{month:02d}.xlsx"
-
-    try:
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-    except TypeError:
-        return send_file(
-            output,
-            as_attachment=True,
-            attachment_filename=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+    filename, sheets = line_month_report(line_id, nam, month, data_type)
+    return stream_workbook(sheets, filename)
 @app.route("/api/lines/<int:line_id>/year-ratio", methods=["GET"])
+@conditional("dayvalues_line_month", "machine", refresh=maybe_sync_rollups)
+@cached("line_year_ratio", ttl=300)
 def get_line_year_ratio(line_id):
     """
     Ratio theo NĂM cho 1 LINE – AVG của tất cả máy trong line.
@@ -1476,19 +788,18 @@ def get_line_year_ratio(line_id):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
 
-    # Lấy AVG theo tháng của tất cả máy trong line (GIỮ NGUYÊN)
+    # AVG theo tháng của tất cả máy (IsActive = 1) trong line – đọc từ rollup line
     cursor.execute(
         """
         SELECT
-            MONTH(dv.Days) AS m,
-            AVG(dv.OEERatio)       AS avg_oee,
-            AVG(dv.OKProductRatio) AS avg_ok,
-            AVG(dv.OutputRatio)    AS avg_output,
-            AVG(dv.ActivityRatio)  AS avg_activity
-        FROM sdvn.dayvalues dv
-        JOIN machine m ON dv.MachineID = m.MachineID
-        WHERE m.LineID = %s AND YEAR(dv.Days) = %s AND IsActive = 1
-        GROUP BY MONTH(dv.Days)
+            `Month` AS m,
+            OEERatio_Sum       / NULLIF(OEERatio_Cnt, 0)       AS avg_oee,
+            OKProductRatio_Sum / NULLIF(OKProductRatio_Cnt, 0) AS avg_ok,
+            OutputRatio_Sum    / NULLIF(OutputRatio_Cnt, 0)    AS avg_output,
+            ActivityRatio_Sum  / NULLIF(ActivityRatio_Cnt, 0)  AS avg_activity
+        FROM sdvn.dayvalues_line_month
+        WHERE LineID = %s
+          AND `Year` = %s
         ORDER BY m
         """,
         (line_id, year),
@@ -1536,12 +847,14 @@ def get_line_year_ratio(line_id):
         {
             "line_id": line_id,
             "year": year,
-            "months": months,
+            "months": series(months),
             "data_type": data_type or None,
         }
     )
 
 @app.route("/api/lines/<int:line_id>/year", methods=["GET"])
+@conditional("dayvalues_line_month", "machine", refresh=maybe_sync_rollups)
+@cached("line_year", ttl=300)
 def get_line_year_time(line_id):
     """
     Thời gian theo NĂM cho 1 LINE – cộng SUM toàn bộ máy trong line,
@@ -1555,26 +868,25 @@ def get_line_year_time(line_id):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
 
+    # Đọc từ rollup line (đã SUM toàn bộ máy IsActive = 1)
     cursor.execute(
         """
         SELECT
-            MONTH(dv.Days)           AS m,
-            SUM(dv.Operation)        AS op,
-            SUM(dv.SmallStop)        AS ss,
-            SUM(dv.Fault)            AS flt,
-            SUM(dv.`Break`)          AS brk,
-            SUM(dv.Maintenance)      AS mt,
-            SUM(dv.Eat)              AS eat,
-            SUM(dv.Waiting)          AS w,
-            SUM(dv.MachineryEdit)    AS me,
-            SUM(dv.ChangeProductCode)  AS cpc,
-            SUM(dv.Glue_CleaningPaper) AS gcp,
-            SUM(dv.Others)             AS oth
-        FROM sdvn.dayvalues dv
-        JOIN machine m ON dv.MachineID = m.MachineID
-        WHERE m.LineID = %s AND IsActive = 1
-          AND YEAR(dv.Days) = %s
-        GROUP BY MONTH(dv.Days)
+            `Month`            AS m,
+            Operation,
+            SmallStop,
+            Fault,
+            `Break`,
+            Maintenance,
+            Eat,
+            Waiting,
+            MachineryEdit,
+            ChangeProductCode,
+            Glue_CleaningPaper,
+            Others
+        FROM sdvn.dayvalues_line_month
+        WHERE LineID = %s
+          AND `Year` = %s
         ORDER BY m
         """,
         (line_id, year),
@@ -1583,55 +895,13 @@ def get_line_year_time(line_id):
     cursor.close()
     conn.close()
 
-    month_map = {int(r["m"]): r for r in rows}
-
-    months = []
-    for m in range(1, 13):
-        if m in month_map:
-            r = month_map[m]
-            months.append(
-                {
-                    "month": m,
-                    "categories": {
-                        "Operation": float(r.get("op") or 0.0),
-                        "SmallStop": float(r.get("ss") or 0.0),
-                        "Fault": float(r.get("flt") or 0.0),
-                        "Break": float(r.get("brk") or 0.0),
-                        "Maintenance": float(r.get("mt") or 0.0),
-                        "Eat": float(r.get("eat") or 0.0),
-                        "Waiting": float(r.get("w") or 0.0),
-                        "MachineryEdit": float(r.get("me") or 0.0),
-                        "ChangeProductCode": float(r.get("cpc") or 0.0),
-                        "Glue_CleaningPaper": float(r.get("gcp") or 0.0),
-                        "Others": float(r.get("oth") or 0.0),
-                    },
-                }
-            )
-        else:
-            months.append(
-                {
-                    "month": m,
-                    "categories": {
-                        "Operation": 0.0,
-                        "SmallStop": 0.0,
-                        "Fault": 0.0,
-                        "Break": 0.0,
-                        "Maintenance": 0.0,
-                        "Eat": 0.0,
-                        "Waiting": 0.0,
-                        "MachineryEdit": 0.0,
-                        "ChangeProductCode": 0.0,
-                        "Glue_CleaningPaper": 0.0,
-                        "Others": 0.0,
-                    },
-                }
-            )
+    matrix = slot_matrix(rows, "m", 12)
 
     return jsonify(
         {
             "line_id": line_id,
             "year": year,
-            "months": months,
+            "months": series(category_series(matrix, "month")),
         }
     )
 @app.route("/api/lines/<int:line_id>/year-export", methods=["GET"])
@@ -1652,215 +922,8 @@ def export_line_year_excel(line_id):
 
     data_type = request.args.get("data", "ALL")  # để note vào header file
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # --- 1. LẤY TÊN LINE ---
-    # Giả sử bảng line: LineID, LineName
-    cursor.execute(
-        "SELECT LineName FROM line WHERE LineID = %s",
-        (line_id,),
-    )
-    lrow = cursor.fetchone()
-    line_name = (
-        lrow["LineName"] if lrow and lrow.get("LineName") else f"Line_{line_id}"
-    )
-
-    # --- 2. LẤY DỮ LIỆU NĂM (GỘP THEO THÁNG, AVG ratio & SUM time toàn line) ---
-    cursor.execute(
-        """
-        SELECT
-            MONTH(dv.Days)           AS m,
-            AVG(dv.OEERatio)         AS avg_oee,
-            AVG(dv.OKProductRatio)   AS avg_ok,
-            AVG(dv.OutputRatio)      AS avg_output,
-            AVG(dv.ActivityRatio)    AS avg_activity,
-            SUM(dv.Operation)        AS sum_op,
-            SUM(dv.SmallStop)        AS sum_small,
-            SUM(dv.Fault)            AS sum_fault,
-            SUM(dv.`Break`)          AS sum_break,
-            SUM(dv.Maintenance)      AS sum_maint,
-            SUM(dv.Eat)              AS sum_eat,
-            SUM(dv.Waiting)          AS sum_wait,
-            SUM(dv.MachineryEdit)    AS sum_me,
-            SUM(dv.ChangeProductCode)  AS sum_cpc,
-            SUM(dv.Glue_CleaningPaper) AS sum_gcp,
-            SUM(dv.Others)             AS sum_oth
-        FROM sdvn.dayvalues dv
-        JOIN machine m ON dv.MachineID = m.MachineID
-        WHERE m.LineID = %s AND IsActive = 1
-          AND YEAR(dv.Days) = %s
-        GROUP BY MONTH(dv.Days)
-        ORDER BY m
-        """,
-        (line_id, year),
-    )
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    month_map = {int(r["m"]): r for r in rows}
-
-    # --- 3. TẠO EXCEL ---
-    wb = Workbook()
-    ws = wb.active
-    ws.title = line_name
-
-    # Header thông tin chung
-    ws.append(
-        [
-            f"LineName: {line_name}",
-            f"Year: {year}",
-            f"Data filter: {data_type}",
-        ]
-    )
-    ws.append([])
-
-    headers = [
-        "Month",
-        # Ratio
-        "OEERatio",
-        "OKProductRatio",
-        "OutputRatio",
-        "ActivityRatio",
-        # Time (giờ)
-        "Operation",
-        "SmallStop",
-        "Fault",
-        "Break",
-        "Maintenance",
-        "Eat",
-        "Waiting",
-        "MachineryEdit",
-        "ChangeProductCode",
-        "Glue_CleaningPaper",
-        "Others",
-        # Time (%)
-        "OperationPct",
-        "SmallStopPct",
-        "FaultPct",
-        "BreakPct",
-        "MaintenancePct",
-        "EatPct",
-        "WaitingPct",
-        "MachineryEditPct",
-        "ChangeProductCodePct",
-        "Glue_CleaningPaperPct",
-        "OthersPct",
-    ]
-    ws.append(headers)
-
-    def pct_part(val, total):
-        if not total or total <= 0:
-            return 0.0
-        return round((val * 100.0) / total, 2)
-
-    for m in range(1, 13):
-        r = month_map.get(m)
-
-        if r:
-            oee = float(r.get("avg_oee") or 0.0)
-            okr = float(r.get("avg_ok") or 0.0)
-            out = float(r.get("avg_output") or 0.0)
-            act = float(r.get("avg_activity") or 0.0)
-
-            op   = float(r.get("sum_op") or 0.0)
-            ss   = float(r.get("sum_small") or 0.0)
-            flt  = float(r.get("sum_fault") or 0.0)
-            brk  = float(r.get("sum_break") or 0.0)
-            mt   = float(r.get("sum_maint") or 0.0)
-            eat  = float(r.get("sum_eat") or 0.0)
-            wait = float(r.get("sum_wait") or 0.0)
-            me   = float(r.get("sum_me") or 0.0)
-            cpc  = float(r.get("sum_cpc") or 0.0)
-            gcp  = float(r.get("sum_gcp") or 0.0)
-            oth  = float(r.get("sum_oth") or 0.0)
-        else:
-            oee = okr = out = act = 0.0
-            op = ss = flt = brk = mt = eat = wait = me = cpc = gcp = oth = 0.0
-
-        total_time = (
-            op
-            + ss
-            + flt
-            + brk
-            + mt
-            + eat
-            + wait
-            + me
-            + cpc
-            + gcp
-            + oth
-        )
-
-        ws.append(
-            [
-                m,
-                # Ratio
-                oee,
-                okr,
-                out,
-                act,
-                # Time
-                op,
-                ss,
-                flt,
-                brk,
-                mt,
-                eat,
-                wait,
-                me,
-                cpc,
-                gcp,
-                oth,
-                # Time %
-                pct_part(op, total_time),
-                pct_part(ss, total_time),
-                pct_part(flt, total_time),
-                pct_part(brk, total_time),
-                pct_part(mt, total_time),
-                pct_part(eat, total_time),
-                pct_part(wait, total_time),
-                pct_part(me, total_time),
-                pct_part(cpc, total_time),
-                pct_part(gcp, total_time),
-                pct_part(oth, total_time),
-            ]
-        )
-
-    thin = Side(style="thin")
-    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    max_row = ws.max_row
-    max_col = ws.max_column
-    for row in ws.iter_rows(min_row=1, max_row=max_row, min_col=1, max_col=max_col):
-        for cell in row:
-            cell.border = thin_border
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    safe_name = "".join(
-        ch if ch.isalnum() or ch == " " else "_" for ch in line_name
-    )
-    safe_name = safe_name.replace(" ", "_")
-    filename = f"{safe_name}_nam_{year}.xlsx"
-
-    try:
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-    except TypeError:
-        return send_file(
-            output,
-            as_attachment=True,
-            attachment_filename=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+    filename, sheets = line_year_report(line_id, year, data_type)
+    return stream_workbook(sheets, filename)
 
 """
 hết"""
@@ -1883,221 +946,10 @@ def export_machine_year_excel(machine_id):
 
     data_type = request.args.get("data", "ALL")  # để ghi chú trong header
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # --- 1. LẤY TÊN MÁY THEO ID (productionline) ---
-    cursor.execute(
-        "SELECT MachineName FROM machine WHERE MachineID = %s",
-        (machine_id,),
-    )
-    mrow = cursor.fetchone()
-    machine_name = (
-        mrow["MachineName"] if mrow and mrow.get("MachineName") else f"Machine_{machine_id}"
-    )
-
-    # --- 2. LẤY DỮ LIỆU NĂM (GỘP THEO THÁNG) ---
-    cursor.execute(
-        """
-        SELECT
-            MONTH(Days)           AS m,
-            AVG(OEERatio)         AS avg_oee,
-            AVG(OKProductRatio)   AS avg_ok,
-            AVG(OutputRatio)      AS avg_output,
-            AVG(ActivityRatio)    AS avg_activity,
-            SUM(Operation)        AS sum_op,
-            SUM(SmallStop)        AS sum_small,
-            SUM(Fault)            AS sum_fault,
-            SUM(`Break`)          AS sum_break,
-            SUM(Maintenance)      AS sum_maint,
-            SUM(Eat)              AS sum_eat,
-            SUM(Waiting)          AS sum_wait,
-            SUM(MachineryEdit)    AS sum_me,
-            SUM(ChangeProductCode)  AS sum_cpc,
-            SUM(Glue_CleaningPaper) AS sum_gcp,
-            SUM(Others)             AS sum_oth
-        FROM sdvn.dayvalues
-        WHERE MachineID = %s
-          AND YEAR(Days) = %s
-        GROUP BY MONTH(Days)
-        ORDER BY m
-        """,
-        (machine_id, year),
-    )
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    # map theo tháng
-    month_map = {int(r["m"]): r for r in rows}
-
-    # --- 3. TẠO EXCEL ---
-    wb = Workbook()
-    ws = wb.active
-    ws.title = machine_name
-
-    # Header thông tin chung
-    ws.append(
-        [
-            f"MachineName: {machine_name}",
-            f"Year: {year}",
-            f"Data filter: {data_type}",
-        ]
-    )
-    ws.append([])
-
-    # Header cột
-    headers = [
-        "Month",
-        # Ratio
-        "OEERatio",
-        "OKProductRatio",
-        "OutputRatio",
-        "ActivityRatio",
-        # Time (giờ)
-        "Operation",
-        "SmallStop",
-        "Fault",
-        "Break",
-        "Maintenance",
-        "Eat",
-        "Waiting",
-        "MachineryEdit",
-        "ChangeProductCode",
-        "Glue_CleaningPaper",
-        "Others",
-        # Time (%)
-        "OperationPct",
-        "SmallStopPct",
-        "FaultPct",
-        "BreakPct",
-        "MaintenancePct",
-        "EatPct",
-        "WaitingPct",
-        "MachineryEditPct",
-        "ChangeProductCodePct",
-        "Glue_CleaningPaperPct",
-        "OthersPct",
-    ]
-    ws.append(headers)
-
-    # helper tính %
-    def pct_part(val, total):
-        if not total or total <= 0:
-            return 0.0
-        return round((val * 100.0) / total, 2)
-
-    # Ghi đủ 12 tháng
-    for m in range(1, 13):
-        r = month_map.get(m)
-
-        if r:
-            oee = float(r.get("avg_oee") or 0.0)
-            okr = float(r.get("avg_ok") or 0.0)
-            out = float(r.get("avg_output") or 0.0)
-            act = float(r.get("avg_activity") or 0.0)
-
-            op   = float(r.get("sum_op") or 0.0)
-            ss   = float(r.get("sum_small") or 0.0)
-            flt  = float(r.get("sum_fault") or 0.0)
-            brk  = float(r.get("sum_break") or 0.0)
-            mt   = float(r.get("sum_maint") or 0.0)
-            eat  = float(r.get("sum_eat") or 0.0)
-            wait = float(r.get("sum_wait") or 0.0)
-            me   = float(r.get("sum_me") or 0.0)
-            cpc  = float(r.get("sum_cpc") or 0.0)
-            gcp  = float(r.get("sum_gcp") or 0.0)
-            oth  = float(r.get("sum_oth") or 0.0)
-        else:
-            oee = okr = out = act = 0.0
-            op = ss = flt = brk = mt = eat = wait = me = cpc = gcp = oth = 0.0
-
-        total_time = (
-            op
-            + ss
-            + flt
-            + brk
-            + mt
-            + eat
-            + wait
-            + me
-            + cpc
-            + gcp
-            + oth
-        )
-
-        ws.append(
-            [
-                m,          # Month
-                # Ratio
-                oee,
-                okr,
-                out,
-                act,
-                # Time
-                op,
-                ss,
-                flt,
-                brk,
-                mt,
-                eat,
-                wait,
-                me,
-                cpc,
-                gcp,
-                oth,
-                # Time %
-                pct_part(op, total_time),
-                pct_part(ss, total_time),
-                pct_part(flt, total_time),
-                pct_part(brk, total_time),
-                pct_part(mt, total_time),
-                pct_part(eat, total_time),
-                pct_part(wait, total_time),
-                pct_part(me, total_time),
-                pct_part(cpc, total_time),
-                pct_part(gcp, total_time),
-                pct_part(oth, total_time),
-            ]
-        )
-
-    # --- 4. KẺ BẢNG (BORDER) ---
-    thin = Side(style="thin")
-    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    max_row = ws.max_row
-    max_col = ws.max_column
-    for row in ws.iter_rows(min_row=1, max_row=max_row, min_col=1, max_col=max_col):
-        for cell in row:
-            cell.border = thin_border
-
-    # --- 5. GHI RA BUFFER & TÊN FILE ---
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    safe_name = "".join(
-        ch if ch.isalnum() or ch == " " else "_" for ch in machine_name
-    )
-    safe_name = safe_name.replace(" ", "_")
-    filename = f"{safe_name}_nam_{year}.xlsx"
-
-    try:
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-    except TypeError:
-        # nếu Flask cũ
-        return send_file(
-            output,
-            as_attachment=True,
-            attachment_filename=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+    filename, sheets = machine_year_report(machine_id, year, data_type)
+    return stream_workbook(sheets, filename)
 @app.route("/api/line-kpi", methods=["GET"])
+@conditional("dayvalues", "machine", "productionline")
 def get_line_kpi():
     line = request.args.get("line")            # Line550B, Line400B...
     month = request.args.get("month")          # "7"
@@ -2112,47 +964,18 @@ def get_line_kpi():
         return jsonify({"error": "Missing 'line' parameter"}), 400
 
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        query = """
-            SELECT 
-                pl.LineName,
-                dv.Days,
-                AVG(dv.OEERatio)       AS total_OEERatio,
-                AVG(dv.OKProductRatio) AS total_OKProductRatio,
-                AVG(dv.OutputRatio)    AS total_OutputRatio,
-                AVG(dv.ActivityRatio)  AS total_ActivityRatio
-            FROM dayvalues dv
-            JOIN machine m         ON dv.MachineID = m.MachineID
-            JOIN productionline pl ON m.LineID = pl.LineID
-            WHERE MONTH(dv.Days) = %s
-              AND YEAR(dv.Days) = %s
-              AND pl.LineName = %s
-            GROUP BY pl.LineName, dv.Days
-            ORDER BY dv.Days
-        """
-
-        cursor.execute(query, (month, year, line))
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        # lọc 1 line từ dataset KPI cả nhà máy (đã cache theo tháng)
+        days = line_kpi(year, month, line)
 
         chart_data = []
-        for r in rows:
-            d = r["Days"]
-            if isinstance(d, datetime):
-                day_num = d.day
-            else:
-                day_num = int(str(d).split("-")[2])
-
+        for d in days:
             chart_data.append({
-                "LineName": r["LineName"],
-                "day": day_num,
-                "oee": float(r["total_OEERatio"] or 0),
-                "ok": float(r["total_OKProductRatio"] or 0),
-                "output": float(r["total_OutputRatio"] or 0),
-                "activity": float(r["total_ActivityRatio"] or 0),
+                "LineName": line,
+                "day": d["day"],
+                "oee": d["oee"],
+                "ok": d["ok"],
+                "output": d["output"],
+                "activity": d["activity"],
                 "data_type": data_type,   # 👈 có dùng param data (lưu lại, sau cần phân tích/log)
             })
 
@@ -2161,6 +984,25 @@ def get_line_kpi():
     except Exception as e:
         print("Unknown error in /api/line-kpi:", e)
         return jsonify({"error": "Server error"}), 500
+@app.route("/api/plant-overview", methods=["GET"])
+@conditional("dayvalues", "machine", "productionline")
+def get_plant_overview():
+    """
+    KPI theo ngày (oee / ok / output / activity, AVG các máy) của MỌI line trong tháng.
+    ?year=2025&month=9 (mặc định tháng hiện tại)
+    {"year", "month", "lines": [{"line_id", "line_name", "days": [{"day", "oee", ...}]}]}
+    """
+    now = datetime.now()
+    month = request.args.get("month", type=int) or now.month
+    year = request.args.get("year", type=int) or now.year
+
+    try:
+        return jsonify(plant_kpi(year, month))
+    except ValueError:
+        return jsonify({"error": "Invalid month"}), 400
+    except Exception as e:
+        print("Unknown error in /api/plant-overview:", e)
+        return jsonify({"error": "Server error"}), 500
 @app.route("/api/export-kpi", methods=["GET"])
 def export_kpi():
     # Lấy param từ FE
@@ -2174,125 +1016,125 @@ def export_kpi():
     if not year:
         year = now.year
 
-    # Border mảnh cho bảng
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
+    try:
+        # Mỗi line 1 sheet, đủ ngày trong tháng (fill 0 nếu không có)
+        file_name, sheets = kpi_report(year, month, data_type)
+        return stream_workbook(sheets, file_name)
+
+    except Exception as e:
+        print("Unknown error in /api/export-kpi:", e)
+        return jsonify({"error": "Server error"}), 500
+# ==== THỐNG KÊ RATIO (mean / median / p10 / p90 / std / slope) ====
+@app.route("/api/ratio-stats", methods=["GET"])
+@conditional("dayvalues", "machine", vary=dayvalues_store.version)
+@cached("ratio_stats", ttl=300)
+def get_ratio_stats():
+    """
+    ?machine_id=5 | ?line_id=2, &year=2025 [&month=9]
+    Trả về thống kê của OEERatio, OKProductRatio, OutputRatio, ActivityRatio theo ngày
+    trong tháng (có month) hoặc cả năm – FE khỏi phải kéo cả chuỗi ngày về để tự tính.
+    """
+    machine_id = request.args.get("machine_id", type=int)
+    line_id = request.args.get("line_id", type=int)
+    if (machine_id is None) == (line_id is None):
+        return jsonify({"error": "Need exactly one of machine_id / line_id"}), 400
 
     try:
+        year = int(request.args.get("year"))
+        month = request.args.get("month")
+        if month:
+            month = int(month)
+            start, end = month_range(year, month)
+        else:
+            month = None
+            start, end = year_range(year)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Missing or invalid year/month param"}), 400
+
+    # Kho RAM nếu có, không thì 1 query
+    if machine_id is not None:
+        rows = dayvalues_store.machine_days(machine_id, start, end, RATIO_COLUMNS)
+    else:
+        rows = dayvalues_store.line_days(line_id, start, end, avg_columns=RATIO_COLUMNS)
+    if rows is None:
         conn = get_connection()
         cursor = conn.cursor(dictionary=True)
-
-        # Lấy KPI cho TẤT CẢ line trong tháng/năm
-        query = """
-            SELECT 
-                pl.LineName,
-                dv.Days,
-                AVG(dv.OEERatio)       AS total_OEERatio,
-                AVG(dv.OKProductRatio) AS total_OKProductRatio,
-                AVG(dv.OutputRatio)    AS total_OutputRatio,
-                AVG(dv.ActivityRatio)  AS total_ActivityRatio
-            FROM dayvalues dv
-            JOIN machine m         ON dv.MachineID = m.MachineID
-            JOIN productionline pl ON m.LineID = pl.LineID
-            WHERE MONTH(dv.Days) = %s
-              AND YEAR(dv.Days) = %s
-            GROUP BY pl.LineName, dv.Days
-            ORDER BY pl.LineName, dv.Days
-        """
-        cursor.execute(query, (month, year))
-        rows = cursor.fetchall()
-
+        if machine_id is not None:
+            rows = machine_ratio_rows(cursor, machine_id, start, end)
+        else:
+            rows = line_ratio_rows(cursor, line_id, start, end)
         cursor.close()
         conn.close()
 
-        # Gom data theo line -> data_by_line[line_name][day] = metrics
-        data_by_line = {}
-        for r in rows:
-            line_name = r["LineName"]
-            d = r["Days"]
-            if isinstance(d, datetime):
-                day_num = d.day
-            else:
-                day_num = int(str(d).split("-")[2])
-
-            if line_name not in data_by_line:
-                data_by_line[line_name] = {}
-
-            data_by_line[line_name][day_num] = {
-                "oee": float(r["total_OEERatio"] or 0),
-                "ok": float(r["total_OKProductRatio"] or 0),
-                "output": float(r["total_OutputRatio"] or 0),
-                "activity": float(r["total_ActivityRatio"] or 0),
-            }
-
-        # Tạo workbook Excel
-        wb = Workbook()
-        # Xoá sheet mặc định
-        default_ws = wb.active
-        wb.remove(default_ws)
-
-        # Số ngày trong tháng (tự xử lý 28/29/30/31)
-        days_in_month = calendar.monthrange(year, month)[1]
-
-        if not data_by_line:
-            # Không có line nào => vẫn tạo 1 sheet NoData
-            ws = wb.create_sheet(title="NoData")
-            ws.append(["Day", "OEERatio", "OKProductRatio", "OutputRatio", "ActivityRatio"])
-
-            for day in range(1, days_in_month + 1):
-                ws.append([day, 0, 0, 0, 0])
-
-            # Kẻ border
-            for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=5):
-                for cell in row:
-                    cell.border = thin_border
-
-        else:
-            # Mỗi line 1 sheet
-            for line_name, day_map in data_by_line.items():
-                sheet_name = (line_name or "Line")[:31]  # Sheet name max 31 ký tự
-                ws = wb.create_sheet(title=sheet_name)
-
-                # Header
-                ws.append(["Day", "OEERatio", "OKProductRatio", "OutputRatio", "ActivityRatio"])
-
-                # Duyệt tất cả ngày trong tháng, fill 0 nếu không có
-                for day in range(1, days_in_month + 1):
-                    metrics = day_map.get(day, {})
-                    oee = metrics.get("oee", 0)
-                    ok = metrics.get("ok", 0)
-                    output = metrics.get("output", 0)
-                    activity = metrics.get("activity", 0)
-                    ws.append([day, oee, ok, output, activity])
-
-                # Kẻ border cho toàn sheet
-                for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=5):
-                    for cell in row:
-                        cell.border = thin_border
-
-        # Xuất ra memory
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        file_name = f"OverView_T_{month}_{year}.xlsx"
+    return jsonify({
+        "machine_id": machine_id,
+        "line_id": line_id,
+        "year": year,
+        "month": month,
+        "days": len(rows),
+        "stats": ratio_stats(rows, start),
+    })
+# ==== EXPORT CHẠY NỀN ====
+def _export_job_payload(state):
+    payload = {
+        "job_id": state["job_id"],
+        "type": state["type"],
+        "params": state["params"],
+        "status": state["status"],
+        "error": state["error"],
+        "status_url": f"/api/exports/{state['job_id']}",
+    }
+    if state["status"] == "done":
+        payload["filename"] = state["filename"]
+        payload["download_url"] = f"/api/exports/{state['job_id']}/download"
+    return payload
+@app.route("/api/exports", methods=["POST"])
+def create_export_job():
+    """
+    Body: {"type": "machine-month|line-month|machine-year|line-year|kpi",
+           "params": {"machine_id"/"line_id", "year", "month", "data"}}
+    Trả 200 nếu file đã có sẵn (cùng version dữ liệu), 202 nếu đang build.
+    """
+    payload = request.get_json(silent=True) or {}
+    export_type = payload.get("type")
+    params = payload.get("params") or {}
 
+    try:
+        state = export_jobs.submit(export_type, params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(_export_job_payload(state)), 200 if state["status"] == "done" else 202
+@app.route("/api/exports/<job_id>", methods=["GET"])
+def get_export_job(job_id):
+    state = export_jobs.get_job(job_id)
+    if state is None:
+        return jsonify({"error": "Export job not found"}), 404
+    return jsonify(_export_job_payload(state))
+@app.route("/api/exports/<job_id>/download", methods=["GET"])
+def download_export_job(job_id):
+    state = export_jobs.get_job(job_id)
+    if state is None:
+        return jsonify({"error": "Export job not found"}), 404
+    if state["status"] != "done":
+        return jsonify(_export_job_payload(state)), 409
+
+    path = export_jobs.artifact_path(job_id)
+    try:
         return send_file(
-            output,
+            path,
             as_attachment=True,
-            download_name=file_name,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            download_name=state["filename"],
+            mimetype=XLSX_MIMETYPE,
+        )
+    except TypeError:
+        # Flask < 2.0
+        return send_file(
+            path,
+            as_attachment=True,
+            attachment_filename=state["filename"],
+            mimetype=XLSX_MIMETYPE,
         )
-
-
-    except Exception as e:
-        print("Unknown error in /api/export-kpi:", e)
-        return jsonify({"error": "Server error"}), 500
-    return jsonify(result)
 @app.route("/api/day-plans", methods=["GET"])
 def get_day_plans():
     idline = request.args.get("idline", type=int)
@@ -2302,53 +1144,27 @@ def get_day_plans():
     if not idline or not date:
         return jsonify({"error": "Missing params"}), 400
 
+    try:
+        day_start, day_end = day_range(date)
+    except ValueError:
+        return jsonify({"error": "Invalid date"}), 400
+
     db = get_connection()
-    cursor = db.cursor()
 
-    # === STEP 1: kiểm tra có dữ liệu chưa ===
-    cursor.execute("""
-        SELECT dv.idplan_production
-        FROM plan_production dv 
-        JOIN machine m ON dv.MachineID = m.MachineID
-        WHERE m.LineID = %s AND IsActive = 1
-          AND dv.Days = %s
-    """, (idline, date))
-
-    existing = cursor.fetchall()
-
-    # === STEP 2: nếu chưa có → INSERT tất cả máy theo line ===
-    if len(existing) == 0:
-        cursor.execute("""
-            SELECT MachineID, CycleTime 
-            FROM machine 
-            WHERE LineID = %s
-        """, (idline,))
-        machines = cursor.fetchall()
-
-        for (mid, cycletime) in machines:
-            cursor.execute("""
-                INSERT INTO plan_production
-                (MachineID, Days, DayPlan, Target_Product,
-                 StartTime_1, EndTime_1, StartTime_2, EndTime_2)
-                VALUES (%s, %s, 16, 0,
-                        %s, %s, %s, %s)
-            """, (
-                mid, date,
-                f"{date} 06:00:00",
-                f"{date} 14:00:00",
-                f"{date} 14:00:00",
-                f"{date} 22:00:00"
-            ))
-
-        db.commit()
+    # === STEP 1+2: máy nào của line chưa có plan ngày này → sinh plan mặc định (DayPlan = 16) ===
+    materialize(db, day_start, day_end, day_plan=16, line_id=idline)
+
+    cursor = db.cursor()
 
     # === STEP 3: Lấy lại dữ liệu sau khi insert (nếu có) ===
-    sql = """
+    # dòng DayPlan = 0 do pregenerator / màn hình tháng sinh mà chưa ai sửa → đọc ra 16 (không UPDATE)
+    day_plan_sql, day_plan_params = default_day_plan_sql("dv", 16)
+    sql = f"""
         SELECT 
             pl.LineName,
             m.MachineName,
             dv.Days,
-            dv.DayPlan,
+            {day_plan_sql} AS DayPlan,
             dv.Target_Product,
             m.CycleTime,
             dv.StartTime_1,
@@ -2363,7 +1179,7 @@ def get_day_plans():
           AND dv.Days = %s
     """
 
-    params = [idline, date]
+    params = day_plan_params + [idline, date]
 
     if idmachine:  # nếu FE chọn lọc 1 máy
         sql += " AND m.MachineID = %s"
@@ -2374,106 +1190,21 @@ def get_day_plans():
     cursor.execute(sql, params)
     rows = cursor.fetchall()
 
+    cursor.close()
+    db.close()
+
     return jsonify(format_rows(rows))
 @app.route("/api/day-plans/bulk-update", methods=["PUT"])
 def bulk_update_day_plans():
-    db = get_connection()
-    cursor = db.cursor()
-
     plans = request.get_json() or []
+    if not isinstance(plans, list):
+        return jsonify({"error": "Body must be an array"}), 400
 
-    def parse_dt(s):
-        from datetime import datetime
-        if not s:
-            return None
-        try:
-            if len(s) == 16:
-                return datetime.strptime(s, "%Y-%m-%dT%H:%M")
-            return datetime.fromisoformat(s)
-        except Exception:
-            return None
-
-    for p in plans:
-        if not isinstance(p, dict):
-            continue
-
-        plan_id = p.get("id")
-        if not plan_id:
-            continue
-
-        s1 = parse_dt(p.get("startShift1"))
-        e1 = parse_dt(p.get("endShift1"))
-        s2 = parse_dt(p.get("startShift2"))
-        e2 = parse_dt(p.get("endShift2"))
-
-        new_cycle_time = p.get("cycleTime")  # FE nhập
-
-        # 1. Lấy MachineID + CycleTime hiện tại
-        cursor.execute("""
-            SELECT dv.MachineID, m.CycleTime
-            FROM plan_production dv
-            JOIN machine m ON dv.MachineID = m.MachineID
-            WHERE dv.idplan_production = %s
-        """, (plan_id,))
-        row = cursor.fetchone()
-        if not row:
-            continue
-
-        machine_id, current_ct = row
-
-        # 2. Quyết định dùng cycleTime nào để TÍNH
-        cycle_time = None
-        try:
-            if new_cycle_time is not None and new_cycle_time != "":
-                cycle_time = float(new_cycle_time)   # ƯU TIÊN CYCLE MỚI
-            else:
-                cycle_time = float(current_ct) if current_ct is not None else 0
-        except Exception:
-            cycle_time = float(current_ct) if current_ct is not None else 0
-
-        # 3. Tính DayPlan = (End1-Start1)+(End2-Start2) (giờ, kiểu int)
-        diff1 = (e1 - s1).total_seconds()/3600 if (s1 and e1) else 0
-        diff2 = (e2 - s2).total_seconds()/3600 if (s2 and e2) else 0
-        day_plan = int(round(diff1 + diff2))
-
-        # 4. Target_Product = DayPlan * 3600 / CycleTime (dùng cycle_time MỚI)
-        target_product = int(day_plan * 3600 / cycle_time) if cycle_time and cycle_time > 0 else 0
-
-        # 5. UPDATE bảng plan_production
-        cursor.execute("""
-            UPDATE plan_production
-            SET
-                DayPlan = %s,
-                Target_Product = %s,
-                StartTime_1 = %s,
-                EndTime_1 = %s,
-                StartTime_2 = %s,
-                EndTime_2 = %s
-            WHERE idplan_production = %s
-        """, (
-            day_plan,
-            target_product,
-            s1.strftime("%Y-%m-%d %H:%M:%S") if s1 else None,
-            e1.strftime("%Y-%m-%d %H:%M:%S") if e1 else None,
-            s2.strftime("%Y-%m-%d %H:%M:%S") if s2 else None,
-            e2.strftime("%Y-%m-%d %H:%M:%S") if e2 else None,
-            plan_id,
-        ))
-
-        # 6. UPDATE CycleTime vào bảng machine (nếu FE có sửa)
-        if new_cycle_time is not None and new_cycle_time != "":
-            try:
-                ct_val = float(new_cycle_time)
-                cursor.execute("""
-                    UPDATE machine
-                    SET CycleTime = %s
-                    WHERE MachineID = %s
-                """, (ct_val, machine_id))
-            except Exception:
-                pass
-
-    db.commit()
-    return jsonify({"status": "ok", "updated": len(plans)})
+    # DayPlan = (End1-Start1)+(End2-Start2) làm tròn giờ, Target = DayPlan * 3600 / CycleTime
+    db = get_connection()
+    updated, errors = bulk_update_plans(db, plans, hours_rounding=round)
+    db.close()
+    return jsonify({"status": "ok", "updated": updated, "errors": errors})
 @app.route("/api/month-plans", methods=["GET"])
 def get_month_plans():
     idline = request.args.get("idline", type=int)
@@ -2484,12 +1215,10 @@ def get_month_plans():
     if not idline or not year or not month:
         return jsonify({"error": "Missing params"}), 400
 
-    db = get_connection()
-    cursor = db.cursor()
-
-    # Số ngày trong tháng
-    last_day = calendar.monthrange(year, month)[1]
-    all_days = [f"{year}-{month:02d}-{d:02d}" for d in range(1, last_day + 1)]
+    try:
+        month_start, month_end = month_range(year, month)
+    except ValueError:
+        return jsonify({"error": "Invalid month"}), 400
 
     # Lấy danh sách máy
     if idmachine:
@@ -2501,50 +1230,15 @@ def get_month_plans():
     else:
         machine_id_int = None
 
+    db = get_connection()
+
+    # Máy (1 máy hoặc cả line) thiếu ngày nào trong tháng → sinh plan mặc định (DayPlan = 0)
     if machine_id_int:
-        cursor.execute("""
-            SELECT MachineID, CycleTime 
-            FROM machine
-            WHERE MachineID = %s
-        """, (machine_id_int,))
+        materialize(db, month_start, month_end, day_plan=0, machine_id=machine_id_int)
     else:
-        cursor.execute("""
-            SELECT MachineID, CycleTime
-            FROM machine
-            WHERE LineID = %s
-        """, (idline,))
-
-    machines = cursor.fetchall()  # (MachineID, CycleTime)
-
-    # Với mỗi máy: nếu thiếu ngày nào trong tháng → insert
-    for (mid, cycletime) in machines:
-        cursor.execute("""
-            SELECT Days
-            FROM plan_production
-            WHERE MachineID = %s
-              AND YEAR(Days) = %s
-              AND MONTH(Days) = %s
-        """, (mid, year, month))
-
-        existing = {row[0].strftime("%Y-%m-%d") for row in cursor.fetchall()}
-        missing_days = [d for d in all_days if d not in existing]
-
-        for day in missing_days:
-            cursor.execute("""
-                INSERT INTO plan_production
-                (MachineID, Days, DayPlan, Target_Product,
-                 StartTime_1, EndTime_1, StartTime_2, EndTime_2)
-                VALUES (%s, %s, 0, 0,
-                        %s, %s, %s, %s)
-            """, (
-                mid, day,
-                f"{day} 06:00:00",
-                f"{day} 14:00:00",
-                f"{day} 14:00:00",
-                f"{day} 22:00:00",
-            ))
-
-    db.commit()
+        materialize(db, month_start, month_end, day_plan=0, line_id=idline)
+
+    cursor = db.cursor()
 
     # Lấy dữ liệu trả về cho FE
     sql = """
@@ -2564,11 +1258,10 @@ def get_month_plans():
         JOIN machine m ON dv.MachineID = m.MachineID
         JOIN productionline pl ON m.LineID = pl.LineID
         WHERE m.LineID = %s AND IsActive = 1
-          AND YEAR(dv.Days) = %s
-          AND MONTH(dv.Days) = %s
+          AND dv.Days >= %s AND dv.Days < %s
     """
 
-    params = [idline, year, month]
+    params = [idline, month_start, month_end]
 
     if machine_id_int:
         sql += " AND dv.MachineID = %s"
@@ -2579,358 +1272,69 @@ def get_month_plans():
     cursor.execute(sql, params)
     rows = cursor.fetchall()
 
+    cursor.close()
+    db.close()
+
     return jsonify(format_rows(rows))
 @app.route("/api/month-plans/bulk-update", methods=["PUT"])
 def bulk_update_month_plans():
-    db = get_connection()
-    cursor = db.cursor()
-
     plans = request.get_json() or []
     if not isinstance(plans, list):
         return jsonify({"error": "Body must be an array"}), 400
 
-    # --- HÀM HỖ TRỢ ---
-    def parse_dt(s):
-        if not s:
-            return None
-        try:
-            if len(s) == 16:  # yyyy-MM-ddTHH:mm
-                return datetime.strptime(s, "%Y-%m-%dT%H:%M")
-            return datetime.fromisoformat(s)
-        except:
-            return None
-
-    # Map máy có CT mới → only update nếu có thay đổi
-    machine_new_cycle = {}
-
-    # ================================
-    # 1) Quét các dòng để xem cycle time có thay đổi không
-    # ================================
-    for p in plans:
-        if not isinstance(p, dict):
-            continue
-
-        plan_id = p.get("id")
-        if not plan_id:
-            continue
-
-        new_ct_val = p.get("cycleTime")
-
-        # lấy machineID + cycleTime hiện tại trong DB
-        cursor.execute("""
-            SELECT dv.MachineID, m.CycleTime
-            FROM plan_production dv
-            JOIN machine m ON dv.MachineID = m.MachineID
-            WHERE dv.idplan_production = %s
-        """, (plan_id,))
-        row = cursor.fetchone()
-
-        if not row:
-            continue
-
-        machine_id, old_cycle = row
-
-        # Nếu FE không gửi cycle → bỏ qua
-        if new_ct_val is None or new_ct_val == "":
-            continue
-
-        try:
-            new_ct_int = int(new_ct_val)  # ép kiểu int
-        except:
-            continue
-
-        # Nếu cycleTime KHÁC DB → cần update
-        if old_cycle is None or int(old_cycle) != new_ct_int:
-            machine_new_cycle[machine_id] = new_ct_int
-
-    # ================================
-    # 2) Update cycle time chỉ những máy được sửa
-    # ================================
-    for mid, ct in machine_new_cycle.items():
-        print(">>> UPDATE MACHINE: MachineID =", mid, ", Cycle =", ct)
-        cursor.execute("""
-            UPDATE machine SET CycleTime = %s WHERE MachineID = %s
-        """, (ct, mid))
-
-    db.commit()   # commit riêng cycle time cho chắc chắn
-
-    # ================================
-    # 3) Lấy lại cycle time mới từ DB
-    # ================================
-    cycle_map = {}
-    for mid in machine_new_cycle.keys():
-        cursor.execute("SELECT CycleTime FROM machine WHERE MachineID = %s", (mid,))
-        row = cursor.fetchone()
-        if row:
-            cycle_map[mid] = int(row[0])   # đảm bảo int
-
-    # ================================
-    # 4) Update lại từng plan
-    # ================================
-    for p in plans:
-
-        plan_id = p.get("id")
-        if not plan_id:
-            continue
-
-        # lấy machineID
-        cursor.execute("""
-            SELECT MachineID FROM plan_production WHERE idplan_production = %s
-        """, (plan_id,))
-        r = cursor.fetchone()
-        if not r:
-            continue
-
-        machine_id = r[0]
-
-        # lấy cycle time mới nhất
-        if machine_id in cycle_map:
-            cycle_time = cycle_map[machine_id]
-        else:
-            cursor.execute("SELECT CycleTime FROM machine WHERE MachineID = %s", (machine_id,))
-            r2 = cursor.fetchone()
-            cycle_time = int(r2[0]) if r2 else 0
-
-        # parse time
-        s1 = parse_dt(p.get("startShift1"))
-        e1 = parse_dt(p.get("endShift1"))
-        s2 = parse_dt(p.get("startShift2"))
-        e2 = parse_dt(p.get("endShift2"))
-
-        diff1 = (e1 - s1).total_seconds()/3600 if (s1 and e1) else 0
-        diff2 = (e2 - s2).total_seconds()/3600 if (s2 and e2) else 0
-
-        day_plan = int(diff1 + diff2)
-
-        target_product = int(day_plan * 3600 / cycle_time) if cycle_time > 0 else 0
-
-        cursor.execute("""
-            UPDATE plan_production
-            SET DayPlan = %s,
-                Target_Product = %s,
-                StartTime_1 = %s,
-                EndTime_1 = %s,
-                StartTime_2 = %s,
-                EndTime_2 = %s
-            WHERE idplan_production = %s
-        """, (
-            day_plan,
-            target_product,
-            s1.strftime("%Y-%m-%d %H:%M:%S") if s1 else None,
-            e1.strftime("%Y-%m-%d %H:%M:%S") if e1 else None,
-            s2.strftime("%Y-%m-%d %H:%M:%S") if s2 else None,
-            e2.strftime("%Y-%m-%d %H:%M:%S") if e2 else None,
-            plan_id,
-        ))
-
-    db.commit()
-    return jsonify({"status": "ok"})
+    # Màn hình tháng: DayPlan cắt phần lẻ (int) như trước
+    db = get_connection()
+    updated, errors = bulk_update_plans(db, plans, hours_rounding=int)
+    db.close()
+    return jsonify({"status": "ok", "updated": updated, "errors": errors})
 @app.route("/api/error-events", methods=["GET"])
+@conditional("errorevent", "errorevent_daily", "errortype", "machine")
 def get_error_events():
     """
     Thống kê lỗi theo: Ngày + Line + (optional) Machine
     Trả về theo nhóm: MachineName + ErrorCode + ErrorName_Vie
     """
-    db = get_connection()
-    cursor = db.cursor()
-
-    # Lấy tham số từ query string
     date_str = request.args.get("date")      # bắt buộc, dạng "2025-08-23"
     line_id = request.args.get("lineid")     # bắt buộc
-    machine_id = request.args.get("machineid")  # optional
 
     if not date_str or not line_id:
         return jsonify({"error": "Thiếu tham số date hoặc lineid"}), 400
 
-    # Validate date format
     try:
-        _ = datetime.strptime(date_str, "%Y-%m-%d")
+        day_range(date_str)
     except ValueError:
         return jsonify({"error": "Định dạng date phải là YYYY-MM-DD"}), 400
 
-    # SQL base
-    sql = """
-        SELECT 
-            pl.MachineName,
-            m.ErrorCode,
-            m.ErrorName_Vie,
-
-            COUNT(*) AS ErrorCount,
-
-            MIN(dv.StartTime) AS FirstErrorStart,
-            MAX(dv.EndTime) AS LastErrorEnd,
-
-            SUM(TIMESTAMPDIFF(SECOND, dv.StartTime, dv.EndTime)) AS TotalErrorSeconds
-        FROM errorevent dv
-        JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
-        JOIN machine pl   ON dv.MachineID = pl.MachineID
-        WHERE DATE(dv.StartTime) = %s
-          AND pl.LineID = %s
-    """
-
-    params = [date_str, line_id]
-
-    # Nếu chọn máy cụ thể
-    if machine_id and machine_id != "All":
-        sql += " AND pl.MachineID = %s"
-        params.append(machine_id)
-
-    sql += """
-        GROUP BY pl.MachineName, m.ErrorCode, m.ErrorName_Vie
-        ORDER BY pl.MachineName, m.ErrorCode
-    """
-
-    cursor.execute(sql, params)
-    rows = cursor.fetchall()
-
-    result = []
-
-    for (
-        machine_name,
-        error_code,
-        error_name_vie,
-        error_count,
-        first_start,
-        last_end,
-        total_seconds,
-    ) in rows:
-
-        # Format DATETIME → string
-        def fmt_dt(dt):
-            return dt.strftime("%Y-%m-%d %H:%M:%S") if dt else None
-
-        # Format giây → "Xh Ym Zs"
-        def fmt_hms(seconds):
-            if seconds is None:
-                return None
-
-            s = int(seconds)
-            h = s // 3600
-            m = (s % 3600) // 60
-            sec = s % 60
-            return f"{h}h {m}m {sec}s"
-
-        result.append({
-            "machineName": machine_name,
-            "errorCode": error_code,
-            "errorName": error_name_vie,
-            "errorCount": int(error_count) if error_count else 0,
-
-            "firstErrorStart": fmt_dt(first_start),
-            "lastErrorEnd": fmt_dt(last_end),
-
-            "totalErrorSeconds": int(total_seconds) if total_seconds else 0,
-            "totalErrorDuration": fmt_hms(total_seconds),   # <<< dạng h m s
-        })
-
-    return jsonify(result)
+    return _error_events_response("day", line_id, day=date_str)
 @app.route("/api/error-events-month", methods=["GET"])
+@conditional("errorevent", "errorevent_daily", "errortype", "machine")
 def get_error_events_month():
     """
     Thống kê lỗi theo THÁNG:
-    FE truyền: year, month, lineid, machineid
+    FE truyền: month, lineid, machineid, year (optional – mặc định năm hiện tại)
     """
-    db = get_connection()
-    cursor = db.cursor()
-
-    # NHẬN THAM SỐ TỪ FE
-    #year = request.args.get("year")
-    month = request.args.get("month")
     line_id = request.args.get("lineid")
-    machine_id = request.args.get("machineid")
-
-    #if not year or not month or not line_id:
-        #return jsonify({"error": "Thiếu year, month hoặc lineid"}), 400
+    if not line_id:
+        return jsonify({"error": "Thiếu month hoặc lineid"}), 400
 
     try:
-        year_int = int(nam)
-        month_int = int(month)
-    except ValueError:
+        year_int = int(request.args.get("year") or datetime.today().year)
+        month_int = int(request.args.get("month"))
+        month_range(year_int, month_int)
+    except (TypeError, ValueError):
         return jsonify({"error": "year và month phải là số"}), 400
 
-    # SQL
-    sql = """
-        SELECT 
-            pl.MachineName,
-            m.ErrorCode,
-            m.ErrorName_Vie,
-
-            COUNT(*) AS ErrorCount,
-            MIN(dv.StartTime) AS FirstErrorStart,
-            MAX(dv.EndTime) AS LastErrorEnd,
-            SUM(TIMESTAMPDIFF(SECOND, dv.StartTime, dv.EndTime)) AS TotalSeconds
-        FROM errorevent dv
-        JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
-        JOIN machine pl  ON dv.MachineID = pl.MachineID
-        WHERE YEAR(dv.StartTime) = %s
-          AND MONTH(dv.StartTime) = %s
-          AND pl.LineID = %s
-    """
-
-    params = [year_int, month_int, line_id]
-
-    # Nếu có chọn máy thì lọc thêm
-    if machine_id and machine_id != "All":
-        sql += " AND pl.MachineID = %s"
-        params.append(machine_id)
-
-    sql += """
-        GROUP BY pl.MachineName, m.ErrorCode, m.ErrorName_Vie
-        ORDER BY pl.MachineName, m.ErrorCode
-    """
-
-    cursor.execute(sql, params)
-    rows = cursor.fetchall()
-
-    # Helper format
-    def fmt_dt(dt):
-        return dt.strftime("%Y-%m-%d %H:%M:%S") if dt else None
-
-    def fmt_hms(seconds):
-        if not seconds:
-            return "0h 0m 0s"
-        s = int(seconds)
-        h = s // 3600
-        m = (s % 3600) // 60
-        sec = s % 60
-        return f"{h}h {m}m {sec}s"
-
-    # Build response
-    result = []
-    for (
-        machine_name,
-        error_code,
-        error_name_vie,
-        error_count,
-        first_start,
-        last_end,
-        total_seconds,
-    ) in rows:
-        result.append({
-            "machineName": machine_name,
-            "errorCode": error_code,
-            "errorName": error_name_vie,
-            "errorCount": int(error_count),
-            "firstErrorStart": fmt_dt(first_start),
-            "lastErrorEnd": fmt_dt(last_end),
-            "totalErrorSeconds": int(total_seconds) if total_seconds else 0,
-            "totalErrorDuration": fmt_hms(total_seconds),
-        })
-
-    return jsonify(result)
+    return _error_events_response("month", line_id, year=year_int, month=month_int)
 @app.route("/api/error-events-year", methods=["GET"])
+@conditional("errorevent", "errorevent_daily", "errortype", "machine")
 def get_error_events_year():
     """
     Thống kê lỗi theo NĂM:
       - FE truyền: year, lineid, machineid (optional)
       - Group theo: MachineName + ErrorCode + ErrorName_Vie
     """
-    db = get_connection()
-    cursor = db.cursor()
-
     year = request.args.get("year")
     line_id = request.args.get("lineid")
-    machine_id = request.args.get("machineid")
 
     if not year or not line_id:
         return jsonify({"error": "Thiếu year hoặc lineid"}), 400
@@ -2940,296 +1344,268 @@ def get_error_events_year():
     except ValueError:
         return jsonify({"error": "year phải là số"}), 400
 
-    sql = """
-        SELECT 
-            pl.MachineName,
-            m.ErrorCode,
-            m.ErrorName_Vie,
-
-            COUNT(*) AS ErrorCount,
-            MIN(dv.StartTime) AS FirstErrorStart,
-            MAX(dv.EndTime) AS LastErrorEnd,
-            SUM(TIMESTAMPDIFF(SECOND, dv.StartTime, dv.EndTime)) AS TotalSeconds
-        FROM errorevent dv
-        JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
-        JOIN machine pl  ON dv.MachineID = pl.MachineID
-        WHERE YEAR(dv.StartTime) = %s
-          AND pl.LineID = %s
-    """
-    params = [year_int, line_id]
-
-    if machine_id and machine_id != "All":
-        sql += " AND pl.MachineID = %s"
-        params.append(machine_id)
-
-    sql += """
-        GROUP BY 
-            pl.MachineName,
-            m.ErrorCode,
-            m.ErrorName_Vie
-        ORDER BY 
-            pl.MachineName,
-            m.ErrorCode
-    """
-
-    cursor.execute(sql, params)
-    rows = cursor.fetchall()
-
-    def fmt_dt(dt):
-        return dt.strftime("%Y-%m-%d %H:%M:%S") if dt else None
-
-    def fmt_hms(seconds):
-        if not seconds:
-            return "0h 0m 0s"
-        s = int(seconds)
-        h = s // 3600
-        m = (s % 3600) // 60
-        sec = s % 60
-        return f"{h}h {m}m {sec}s"
+    return _error_events_response("year", line_id, year=year_int)
+def _error_events_response(granularity, line_id, **period):
+    """Phần chung của 3 API error-events: machineid, sortBy (mặc định theo tên), limit."""
+    try:
+        machine_id = parse_machine(request.args.get("machineid"))
+        limit = parse_limit(request.args.get("limit"))
+    except ValueError:
+        return jsonify({"error": "machineid hoặc limit không hợp lệ"}), 400
 
-    result = []
-    for (
-        machine_name,
-        error_code,
-        error_name_vie,
-        error_count,
-        first_start,
-        last_end,
-        total_seconds,
-    ) in rows:
-        result.append({
-            "machineName": machine_name,
-            "errorCode": error_code,
-            "errorName": error_name_vie,
-            "errorCount": int(error_count) if error_count else 0,
-            "firstErrorStart": fmt_dt(first_start),
-            "lastErrorEnd": fmt_dt(last_end),
-            "totalErrorSeconds": int(total_seconds) if total_seconds else 0,
-            "totalErrorDuration": fmt_hms(total_seconds),
-        })
+    db = get_connection()
+    cursor = db.cursor(dictionary=True)
+    rows = error_groups(
+        cursor, granularity, line_id, machine_id,
+        sort=request.args.get("sortBy", "name"), limit=limit, source=error_source(db), **period
+    )
+    cursor.close()
+    db.close()
 
-    return jsonify(result)
+    return jsonify([event_item(r) for r in rows])
 @app.route("/api/erroranalys/day", methods=["GET"])
+@conditional("errorevent", "errorevent_daily", "errortype", "machine")
 def get_erroranalys_day():
-    db= get_connection()
     date = request.args.get("date")        # ví dụ: '2025-08-23'
     line_id = request.args.get("idline")   # ví dụ: '3'
-    machine_id = request.args.get("idmay") # có thể None hoặc không truyền
-    sort_by = request.args.get("sortBy", "count")  # 'count' | 'time'
 
     if not date or not line_id:
         return jsonify({"error": "Missing date or idline"}), 400
 
-    if sort_by not in ("count", "time"):
-        sort_by = "count"
-
-    sql = """
-        SELECT 
-            pl.MachineID,
-            pl.MachineName,
-            m.ErrorCode,
-            m.ErrorName_Vie,
-            COUNT(*) AS ErrorCount,
-            SUM(TIMESTAMPDIFF(SECOND, dv.StartTime, dv.EndTime)) AS TotalErrorSeconds
-        FROM errorevent dv
-        JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
-        JOIN machine pl ON dv.MachineID = pl.MachineID
-        WHERE DATE(dv.StartTime) = %s
-          AND pl.LineID = %s
-          AND (%s IS NULL OR pl.MachineID = %s)
-        GROUP BY pl.MachineID, pl.MachineName, m.ErrorCode, m.ErrorName_Vie
-        ORDER BY
-            CASE WHEN %s = 'count' THEN ErrorCount END DESC,
-            CASE WHEN %s = 'time'  THEN TotalErrorSeconds END DESC;
-    """
-
-    params = (
-        date,
-        line_id,
-        machine_id,
-        machine_id,
-        sort_by,
-        sort_by,
-    )
-
-    cursor = db.cursor(dictionary=True)
-    cursor.execute(sql, params)
-    rows = cursor.fetchall()
-    cursor.close()
-
-    # 🔁 Format TotalErrorSeconds -> RecoveryTime dạng "0h 0m 0s"
-    for row in rows:
-        total_sec = row.get("TotalErrorSeconds")
-        row["RecoveryTime"] = format_seconds_to_hms_string(total_sec)
-
-        # Nếu KHÔNG muốn FE nhận raw giây nữa thì bỏ comment dòng sau:
-        # row.pop("TotalErrorSeconds", None)
+    try:
+        day_range(date)
+    except ValueError:
+        return jsonify({"error": "Invalid date, expected YYYY-MM-DD"}), 400
 
-    return jsonify(rows)
+    return _error_analysis_response("day", line_id, day=date)
 @app.route("/api/error-analysis/month", methods=["GET"])
+@conditional("errorevent", "errorevent_daily", "errortype", "machine")
 def get_error_analysis_month():
-    try:
-        # 1. Lấy tham số từ query
-        idline = request.args.get("idline", type=int)
-        if not idline:
-            return jsonify({"error": "Missing idline"}), 400
-
-        month = request.args.get("month", type=int)
-        if not month or month < 1 or month > 12:
-            return jsonify({"error": "Invalid month"}), 400
-
-        # idmay có thể là None hoặc 'All' hoặc số
-        idmay_raw = request.args.get("idmay", default=None)
-        sort_by = request.args.get("sortBy", default="count")
-
-        # Năm: dùng năm hiện tại (vì FE không chọn year)
+    idline = request.args.get("idline", type=int)
+    if not idline:
+        return jsonify({"error": "Missing idline"}), 400
 
+    month = request.args.get("month", type=int)
+    if not month or month < 1 or month > 12:
+        return jsonify({"error": "Invalid month"}), 400
 
-        # 2. Validate sort_by
-        if sort_by not in ("count", "time"):
-            sort_by = "count"
+    # Năm: FE chưa chọn year → mặc định năm hiện tại
+    year = request.args.get("year", type=int) or datetime.today().year
 
-        # 3. Xây ORDER BY an toàn
-        if sort_by == "time":
-            order_by = "TotalErrorSeconds DESC, ErrorCount DESC"
-        else:
-            order_by = "ErrorCount DESC, TotalErrorSeconds DESC"
-
-        # 4. Xây SQL
-        base_sql = """
-            SELECT 
-                pl.MachineName,
-                m.ErrorCode,
-                m.ErrorName_Vie,
-                COUNT(*) AS ErrorCount,
-                SUM(TIMESTAMPDIFF(SECOND, dv.StartTime, dv.EndTime)) AS TotalErrorSeconds
-            FROM errorevent dv
-            JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
-            JOIN machine pl ON dv.MachineID = pl.MachineID
-            WHERE MONTH(dv.StartTime) = %s
-              AND YEAR(dv.StartTime) = %s
-              AND pl.LineID = %s
-                
-        """
+    return _error_analysis_response("month", idline, year=year, month=month)
+@app.route("/api/error-analysis/year", methods=["GET"])
+@conditional("errorevent", "errorevent_daily", "errortype", "machine")
+def get_error_analysis_year():
+    idline = request.args.get("idline", type=int)
+    if not idline:
+        return jsonify({"error": "Missing idline"}), 400
 
-        params = [month, nam, idline]
+    year = request.args.get("year", type=int) or datetime.today().year
 
-        # nếu idmay khác 'All' thì filter theo MachineID
-        if idmay_raw and idmay_raw != "All":
-            base_sql += " AND dv.MachineID = %s"
-            try:
-                params.append(int(idmay_raw))
-            except ValueError:
-                return jsonify({"error": "Invalid idmay"}), 400
+    return _error_analysis_response("year", idline, year=year)
+def _error_analysis_response(granularity, line_id, **period):
+    """Phần chung của 3 API error-analysis: idmay ('All' = cả line), sortBy count | time, limit (top-N)."""
+    sort_by = request.args.get("sortBy", "count")
+    if sort_by not in ("count", "time"):
+        sort_by = "count"
 
-        base_sql += """
-            GROUP BY pl.MachineName, m.ErrorCode, m.ErrorName_Vie
-        """
-        base_sql += f" ORDER BY {order_by}"
+    try:
+        machine_id = parse_machine(request.args.get("idmay"))
+        limit = parse_limit(request.args.get("limit"))
+    except ValueError:
+        return jsonify({"error": "Invalid idmay or limit"}), 400
 
-        # 5. Query DB
+    try:
         conn = get_connection()
         cursor = conn.cursor(dictionary=True)
-
-        cursor.execute(base_sql, params)
-        rows = cursor.fetchall()
-
+        rows = error_groups(
+            cursor, granularity, line_id, machine_id,
+            sort=sort_by, limit=limit, source=error_source(conn), **period
+        )
         cursor.close()
         conn.close()
-
-        # 6. Chuẩn hóa dữ liệu trả về
-        result = []
-        for row in rows:
-            total_seconds = row.get("TotalErrorSeconds") or 0
-            result.append({
-                "MachineName": row.get("MachineName"),
-                "ErrorCode": row.get("ErrorCode"),
-                "ErrorName_Vie": row.get("ErrorName_Vie"),
-                "ErrorCount": int(row.get("ErrorCount") or 0),
-                "TotalErrorSeconds": int(total_seconds),
-                "RecoveryTime": format_seconds_to_hms_string(int(total_seconds)),
-            })
-
-        return jsonify(result)
     except Exception as e:
-        # log lỗi nếu cần
-        print("Error in /api/error-analysis/month:", e)
+        print(f"Error in error analysis ({granularity}):", e)
         return jsonify({"error": "Internal server error"}), 500
-@app.route("/api/error-analysis/year", methods=["GET"])
-def get_error_analysis_year():
-    try:
-        idline = request.args.get("idline", type=int)
-        year = request.args.get("year", type=int)
-        idmay_raw = request.args.get("idmay", default=None)
-        sort_by = request.args.get("sortBy", default="count")
 
-        if not idline:
-            return jsonify({"error": "Missing idline"}), 400
-        if not year:
-            year = datetime.today().year
+    return jsonify([analysis_item(r) for r in rows])
+@app.route("/api/error-pareto", methods=["GET"])
+@conditional("errorevent", "errorevent_daily", "errortype", "machine")
+@cached("error_pareto", ttl=300, group="errorevent")
+def get_error_pareto():
+    """
+    Pareto nguyên nhân dừng máy: top N mã lỗi + % tích luỹ + nhóm "others".
+    ?machine_id=5 | ?line_id=2 | (không có = cả nhà máy),
+    &date=2025-08-23 | &year=2025[&month=8], &by=count|time, &top=10
+    """
+    machine_id = request.args.get("machine_id", type=int)
+    line_id = request.args.get("line_id", type=int)
 
-        if sort_by not in ("count", "time"):
-            sort_by = "count"
+    by = request.args.get("by", "count")
+    if by not in PARETO_METRICS:
+        return jsonify({"error": "by must be count or time"}), 400
 
-        if sort_by == "time":
-            order_by = "TotalErrorSeconds DESC, ErrorCount DESC"
+    top = request.args.get("top", PARETO_DEFAULT_TOP, type=int)
+    if not 1 <= top <= PARETO_MAX_TOP:
+        return jsonify({"error": f"top must be in 1..{PARETO_MAX_TOP}"}), 400
+
+    try:
+        if request.args.get("date"):
+            granularity, period = "day", {"day": request.args["date"]}
+        elif request.args.get("month"):
+            granularity = "month"
+            period = {"year": int(request.args.get("year")), "month": int(request.args["month"])}
         else:
-            order_by = "ErrorCount DESC, TotalErrorSeconds DESC"
-
-        sql = """
-            SELECT 
-                pl.MachineName,
-                m.ErrorCode,
-                m.ErrorName_Vie,
-                COUNT(*) AS ErrorCount,
-                SUM(TIMESTAMPDIFF(SECOND, dv.StartTime, dv.EndTime)) AS TotalErrorSeconds
-            FROM errorevent dv
-            JOIN errortype m ON dv.ErrorTypeID = m.ErrorTypeID
-            JOIN machine pl ON dv.MachineID = pl.MachineID
-            WHERE 
-                YEAR(dv.StartTime) = %s
-                AND pl.LineID = %s
-        """
+            granularity, period = "year", {"year": int(request.args.get("year"))}
+        period_range(granularity, **period)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Missing or invalid date/year/month param"}), 400
 
-        params = [year, idline]
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    result = error_pareto(
+        cursor, granularity, line_id, machine_id, by=by, top=top, source=error_source(conn), **period
+    )
+    cursor.close()
+    conn.close()
 
-        if idmay_raw and idmay_raw != "All":
-            sql += " AND dv.MachineID = %s"
-            try:
-                params.append(int(idmay_raw))
-            except ValueError:
-                return jsonify({"error": "Invalid idmay"}), 400
+    return jsonify({
+        "machine_id": machine_id,
+        "line_id": line_id,
+        "granularity": granularity,
+        "date": period.get("day"),
+        "year": period.get("year"),
+        "month": period.get("month"),
+        **result,
+    })
+def _timeline_range():
+    """(start, end) của ?date= | ?year=&month= (sai → TypeError / ValueError)."""
+    if request.args.get("date"):
+        return day_range(request.args["date"])
+    return month_range(int(request.args.get("year")), int(request.args.get("month")))
+def _timeline_live_bucket():
+    """
+    Khoảng chứa hiện tại → ETag / key cache đổi mỗi `resolution` giây (poll không bị đóng băng).
+    Khoảng đã qua → None: ETag theo bộ đếm trigger của errorevent, UPDATE EndTime đóng event cũ cũng đổi.
+    """
+    try:
+        _, end = _timeline_range()
+    except (TypeError, ValueError):
+        return None
+    resolution = request.args.get("resolution", DEFAULT_RESOLUTION, type=int)
+    return live_bucket(end, resolution if resolution and resolution > 0 else DEFAULT_RESOLUTION)
+@app.route("/api/error-timeline", methods=["GET"])
+@conditional("errorevent", "errortype", "machine", vary=_timeline_live_bucket)
+@cached("error_timeline", ttl=60, group="errorevent")
+def get_error_timeline():
+    """
+    Timeline dừng máy cho Gantt: ?machine_id=5 | ?line_id=2, &date=2025-08-23 | &year=2025&month=8,
+    &resolution=60 (giây / đơn vị segment, 1..3600).
+    Mỗi máy: downtime thật (đã gộp event chồng nhau), MTBF / MTTR, segments [offset, length, code].
+    """
+    machine_id = request.args.get("machine_id", type=int)
+    line_id = request.args.get("line_id", type=int)
+    if (machine_id is None) == (line_id is None):
+        return jsonify({"error": "Need exactly one of machine_id / line_id"}), 400
 
-        sql += """
-            GROUP BY pl.MachineName, m.ErrorCode, m.ErrorName_Vie
-        """
-        sql += f" ORDER BY {order_by}"
+    resolution = request.args.get("resolution", DEFAULT_RESOLUTION, type=int)
+    if not 1 <= resolution <= 3600:
+        return jsonify({"error": "resolution must be in 1..3600"}), 400
 
-        conn = get_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-        cur.close()
+    try:
+        start, end = _timeline_range()
+    except (TypeError, ValueError):
+        return jsonify({"error": "Missing or invalid date or year/month param"}), 400
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    if machine_id is not None:
+        cursor.execute("SELECT MachineID, MachineName FROM machine WHERE MachineID = %s", (machine_id,))
+    else:
+        cursor.execute(
+            "SELECT MachineID, MachineName FROM machine WHERE LineID = %s ORDER BY MachineID",
+            (line_id,),
+        )
+    machines = cursor.fetchall()
+    cursor.close()
+
+    try:
+        result = error_timeline(conn, machines, start, end, resolution)
+    finally:
         conn.close()
 
-        result = []
-        for row in rows:
-            total_seconds = int(row.get("TotalErrorSeconds") or 0)
-            result.append({
-                "MachineName": row.get("MachineName"),
-                "ErrorCode": row.get("ErrorCode"),
-                "ErrorName_Vie": row.get("ErrorName_Vie"),
-                "ErrorCount": int(row.get("ErrorCount") or 0),
-                "TotalErrorSeconds": total_seconds,
-                "RecoveryTime": format_seconds_to_hms_string(total_seconds),
-            })
+    return jsonify({"machine_id": machine_id, "line_id": line_id, **result})
+def _reliability_range():
+    """(start, end) của ?window=[&end=] | ?date= | ?year=[&month=] (sai → TypeError / ValueError)."""
+    if request.args.get("window"):
+        return rolling_range(request.args["window"], request.args.get("end") or datetime.today().date())
+    if request.args.get("date"):
+        return day_range(request.args["date"])
+    if request.args.get("month"):
+        return month_range(int(request.args.get("year")), int(request.args["month"]))
+    return year_range(int(request.args.get("year")))
+def _reliability_live_bucket():
+    """
+    Khoảng chứa hiện tại (VD window không có end = tới hôm nay) → ETag / key cache đổi mỗi phút.
+    Khoảng đã qua → None: ETag theo bộ đếm trigger của errorevent, UPDATE EndTime đóng event cũ cũng đổi.
+    """
+    try:
+        _, end = _reliability_range()
+    except (TypeError, ValueError):
+        return None
+    return live_bucket(end, 60)
+@app.route("/api/reliability", methods=["GET"])
+@conditional("errorevent", "errortype", "machine", vary=_reliability_live_bucket)
+@cached("reliability", ttl=600, group="errorevent")
+def get_reliability():
+    """
+    MTBF / MTTR: ?machine_id=5 | ?line_id=2 | (không có = cả nhà máy),
+    khoảng: &date=2025-08-23 | &year=2025[&month=8] | &window=30[&end=2025-08-23] (N ngày gần nhất),
+    &group=type (máy + loại lỗi, mặc định) | machine (máy, mọi loại lỗi)
+    """
+    machine_id = request.args.get("machine_id", type=int)
+    line_id = request.args.get("line_id", type=int)
 
-        return jsonify(result)
+    group = request.args.get("group", "type")
+    if group not in RELIABILITY_GROUPS:
+        return jsonify({"error": "group must be type or machine"}), 400
 
-    except Exception as e:
-        print("Error in /api/error-analysis/year:", e)
-        return jsonify({"error": "Internal server error"}), 500
+    try:
+        start, end = _reliability_range()
+    except (TypeError, ValueError):
+        return jsonify({"error": "Missing or invalid date / year / month / window param"}), 400
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    rows = reliability(cursor, start, end, line_id, machine_id, group)
+    cursor.close()
+    conn.close()
+
+    return jsonify({
+        "machine_id": machine_id,
+        "line_id": line_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group": group,
+        "items": rows,
+    })
+
+# ==== KHỞI TẠO WORKER ====
+def init_worker():
+    """
+    Gọi 1 lần trong mỗi process phục vụ request, SAU khi fork
+    (gunicorn: hook post_worker_init). Không dùng lại socket MySQL / thread của process cha.
+    """
+    reset_pool()
+    start_pregenerator()  # sinh sẵn plan tháng hiện tại + tháng tới
+    start_store()         # kho dayvalues trong RAM (nếu DVSTORE_ENABLED=1)
+    start_error_rollup()  # đồng bộ bảng tổng hợp errorevent_daily cho các API lỗi
 
 
 if __name__ == "__main__":
+    # Dev server (debugger + reloader). Production: xem wsgi.py
+    # Reloader chạy 2 process: process cha chỉ theo dõi file, process con (WERKZEUG_RUN_MAIN=true)
+    # mới phục vụ request → chỉ khởi động thread nền ở process con.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        init_worker()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,24 @@
+"""Tên cột dùng chung cho các bảng dayvalues / rollup."""
+
+# 11 nhóm thời gian (giờ) – đúng thứ tự FE đang hiển thị
+TIME_CATEGORIES = (
+    "Operation",
+    "SmallStop",
+    "Fault",
+    "Break",
+    "Maintenance",
+    "Eat",
+    "Waiting",
+    "MachineryEdit",
+    "ChangeProductCode",
+    "Glue_CleaningPaper",
+    "Others",
+)
+
+# 4 tỷ lệ KPI theo ngày
+RATIO_COLUMNS = (
+    "OEERatio",
+    "OKProductRatio",
+    "OutputRatio",
+    "ActivityRatio",
+)
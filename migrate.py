@@ -0,0 +1,76 @@
+"""
+Chạy các file migrations/NNN_*.sql theo thứ tự, mỗi file đúng 1 lần.
+
+    python migrate.py            # áp dụng các file chưa chạy
+    python migrate.py --list     # xem trạng thái
+
+Các file đã chạy được ghi vào bảng schema_migrations.
+"""
+import argparse
+import os
+import re
+
+from db import connect
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def split_statements(sql_text):
+    # bỏ comment "-- ..." rồi tách theo dấu ;
+    lines = [ln for ln in sql_text.splitlines() if not ln.strip().startswith("--")]
+    body = "\n".join(lines)
+    return [stmt.strip() for stmt in body.split(";") if stmt.strip()]
+
+
+def list_migrations():
+    files = [f for f in os.listdir(MIGRATIONS_DIR) if re.match(r"^\d+_.*\.sql$", f)]
+    return sorted(files)
+
+
+def applied_migrations(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name       VARCHAR(255) NOT NULL PRIMARY KEY,
+            applied_at DATETIME     NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT name FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy migration SQL cho database sdvn")
+    parser.add_argument("--list", action="store_true", help="chỉ liệt kê trạng thái")
+    args = parser.parse_args()
+
+    conn = connect()
+    cursor = conn.cursor()
+    done = applied_migrations(cursor)
+
+    for name in list_migrations():
+        if name in done:
+            print("✔ đã chạy:", name)
+            continue
+        if args.list:
+            print("… chưa chạy:", name)
+            continue
+
+        print("▶ đang chạy:", name)
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as f:
+            statements = split_statements(f.read())
+
+        # DDL của MySQL tự commit từng câu → nếu lỗi giữa chừng cần sửa tay rồi chạy lại
+        for stmt in statements:
+            cursor.execute(stmt)
+            if cursor.with_rows:
+                cursor.fetchall()
+        cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+        conn.commit()
+        print("✅ xong:", name)
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+-- Index phục vụ lọc theo khoảng thời gian [start, end) (xem periods.py).
+-- Query kiểu: WHERE MachineID = ? AND Days >= ? AND Days < ?
+
+ALTER TABLE dayvalues
+    ADD INDEX idx_dayvalues_machine_days (MachineID, Days),
+    ADD INDEX idx_dayvalues_days (Days);
+
+ALTER TABLE errorevent
+    ADD INDEX idx_errorevent_machine_start (MachineID, StartTime),
+    ADD INDEX idx_errorevent_start (StartTime);
+
+ALTER TABLE plan_production
+    ADD INDEX idx_plan_machine_days (MachineID, Days);
+
+ALTER TABLE production_output
+    ADD INDEX idx_output_machine_days (machineid, days);
+
+ALTER TABLE machine
+    ADD INDEX idx_machine_line_active (LineID, IsActive);
@@ -0,0 +1,67 @@
+-- Bảng tổng hợp theo tháng cho dayvalues (xem rollup.py).
+-- Thời gian: SUM theo tháng. Tỷ lệ: lưu SUM + COUNT(giá trị khác NULL) để AVG = Sum / Cnt
+-- cộng dồn được từ máy lên line.
+
+CREATE TABLE IF NOT EXISTS dayvalues_machine_month (
+    MachineID           INT       NOT NULL,
+    `Year`              SMALLINT  NOT NULL,
+    `Month`             TINYINT   NOT NULL,
+    `RowCount`          INT       NOT NULL DEFAULT 0,
+    Operation           DOUBLE    NOT NULL DEFAULT 0,
+    SmallStop           DOUBLE    NOT NULL DEFAULT 0,
+    Fault               DOUBLE    NOT NULL DEFAULT 0,
+    `Break`             DOUBLE    NOT NULL DEFAULT 0,
+    Maintenance         DOUBLE    NOT NULL DEFAULT 0,
+    Eat                 DOUBLE    NOT NULL DEFAULT 0,
+    Waiting             DOUBLE    NOT NULL DEFAULT 0,
+    MachineryEdit       DOUBLE    NOT NULL DEFAULT 0,
+    ChangeProductCode   DOUBLE    NOT NULL DEFAULT 0,
+    Glue_CleaningPaper  DOUBLE    NOT NULL DEFAULT 0,
+    Others              DOUBLE    NOT NULL DEFAULT 0,
+    OEERatio_Sum        DOUBLE    NOT NULL DEFAULT 0,
+    OEERatio_Cnt        INT       NOT NULL DEFAULT 0,
+    OKProductRatio_Sum  DOUBLE    NOT NULL DEFAULT 0,
+    OKProductRatio_Cnt  INT       NOT NULL DEFAULT 0,
+    OutputRatio_Sum     DOUBLE    NOT NULL DEFAULT 0,
+    OutputRatio_Cnt     INT       NOT NULL DEFAULT 0,
+    ActivityRatio_Sum   DOUBLE    NOT NULL DEFAULT 0,
+    ActivityRatio_Cnt   INT       NOT NULL DEFAULT 0,
+    UpdatedAt           DATETIME  NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (MachineID, `Year`, `Month`),
+    KEY idx_dmm_year (`Year`, `Month`)
+);
+
+CREATE TABLE IF NOT EXISTS dayvalues_line_month (
+    LineID              INT       NOT NULL,
+    `Year`              SMALLINT  NOT NULL,
+    `Month`             TINYINT   NOT NULL,
+    `RowCount`          INT       NOT NULL DEFAULT 0,
+    Operation           DOUBLE    NOT NULL DEFAULT 0,
+    SmallStop           DOUBLE    NOT NULL DEFAULT 0,
+    Fault               DOUBLE    NOT NULL DEFAULT 0,
+    `Break`             DOUBLE    NOT NULL DEFAULT 0,
+    Maintenance         DOUBLE    NOT NULL DEFAULT 0,
+    Eat                 DOUBLE    NOT NULL DEFAULT 0,
+    Waiting             DOUBLE    NOT NULL DEFAULT 0,
+    MachineryEdit       DOUBLE    NOT NULL DEFAULT 0,
+    ChangeProductCode   DOUBLE    NOT NULL DEFAULT 0,
+    Glue_CleaningPaper  DOUBLE    NOT NULL DEFAULT 0,
+    Others              DOUBLE    NOT NULL DEFAULT 0,
+    OEERatio_Sum        DOUBLE    NOT NULL DEFAULT 0,
+    OEERatio_Cnt        INT       NOT NULL DEFAULT 0,
+    OKProductRatio_Sum  DOUBLE    NOT NULL DEFAULT 0,
+    OKProductRatio_Cnt  INT       NOT NULL DEFAULT 0,
+    OutputRatio_Sum     DOUBLE    NOT NULL DEFAULT 0,
+    OutputRatio_Cnt     INT       NOT NULL DEFAULT 0,
+    ActivityRatio_Sum   DOUBLE    NOT NULL DEFAULT 0,
+    ActivityRatio_Cnt   INT       NOT NULL DEFAULT 0,
+    UpdatedAt           DATETIME  NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (LineID, `Year`, `Month`)
+);
+
+-- Mốc đồng bộ: watermark = idDayValues lớn nhất đã được gộp vào rollup
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name          VARCHAR(64) NOT NULL PRIMARY KEY,
+    watermark     BIGINT      NOT NULL DEFAULT 0,
+    refreshed_at  DATETIME    NULL
+);
@@ -0,0 +1,11 @@
+-- Nhật ký invalidation cho cache response trong process (xem cache.py).
+-- Mỗi worker đọc các dòng id > mốc của mình; machine_id / line_id NULL = xoá cả group.
+
+CREATE TABLE IF NOT EXISTS cache_invalidation (
+    id          BIGINT       NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    grp         VARCHAR(64)  NOT NULL,
+    machine_id  INT          NULL,
+    line_id     INT          NULL,
+    created_at  DATETIME     NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_cache_inv_created (created_at)
+);
@@ -0,0 +1,14 @@
+-- Mỗi máy chỉ có 1 dòng dayvalues / ngày (để insert.py --mode upsert chạy lại không bị trùng).
+-- Xoá các dòng trùng (MachineID, Days), giữ dòng có idDayValues lớn nhất (dòng ghi sau cùng).
+-- Sau khi chạy nên dựng lại rollup: python rollup.py --rebuild
+
+DELETE dv
+FROM dayvalues dv
+JOIN dayvalues newer
+  ON newer.MachineID = dv.MachineID
+ AND newer.Days = dv.Days
+ AND newer.idDayValues > dv.idDayValues;
+
+ALTER TABLE dayvalues
+    DROP INDEX idx_dayvalues_machine_days,
+    ADD UNIQUE KEY uq_dayvalues_machine_day (MachineID, Days);
@@ -0,0 +1,14 @@
+-- Mỗi máy chỉ có 1 plan / ngày → sinh plan bằng INSERT IGNORE (plans.materialize) an toàn
+-- khi nhiều request / worker cùng mở 1 tháng.
+-- Xoá các dòng trùng (MachineID, Days), giữ dòng idplan_production nhỏ nhất (dòng sinh đầu tiên).
+
+DELETE p
+FROM plan_production p
+JOIN plan_production older
+  ON older.MachineID = p.MachineID
+ AND older.Days = p.Days
+ AND older.idplan_production < p.idplan_production;
+
+ALTER TABLE plan_production
+    DROP INDEX idx_plan_machine_days,
+    ADD UNIQUE KEY uq_plan_machine_day (MachineID, Days);
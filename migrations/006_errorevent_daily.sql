@@ -0,0 +1,16 @@
+-- Bảng tổng hợp errorevent theo (máy, loại lỗi, ngày) – xem error_rollup.py.
+-- Ngày = DATE(StartTime) (giống điều kiện StartTime >= ngày AND < ngày + 1 của các API lỗi).
+-- TotalSeconds NULL khi mọi event trong nhóm chưa có EndTime (giống SUM(TIMESTAMPDIFF(...))).
+
+CREATE TABLE IF NOT EXISTS errorevent_daily (
+    MachineID     INT       NOT NULL,
+    Days          DATE      NOT NULL,
+    ErrorTypeID   INT       NOT NULL,
+    EventCount    INT       NOT NULL DEFAULT 0,
+    TotalSeconds  BIGINT    NULL,
+    FirstStart    DATETIME  NULL,
+    LastEnd       DATETIME  NULL,
+    UpdatedAt     DATETIME  NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (MachineID, Days, ErrorTypeID),
+    KEY idx_eed_days (Days)
+);
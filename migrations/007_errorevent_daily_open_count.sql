@@ -0,0 +1,10 @@
+-- OpenCount = số event trong nhóm chưa có EndTime (COUNT(*) - COUNT(EndTime)).
+-- error_rollup.sync() tính lại các (máy, ngày) còn OpenCount > 0 ngoài cửa sổ hot
+-- → lần dừng kéo dài hơn ERROR_ROLLUP_HOT_DAYS ngày vẫn có TotalSeconds / LastEnd đúng khi đóng.
+-- Xoá trạng thái rollup → lần sync sau dựng lại toàn bộ (trong lúc đó API lỗi đọc thẳng errorevent).
+
+ALTER TABLE errorevent_daily
+    ADD COLUMN OpenCount INT NOT NULL DEFAULT 0 AFTER LastEnd,
+    ADD KEY idx_eed_open (OpenCount);
+
+DELETE FROM rollup_state WHERE name = 'errorevent';
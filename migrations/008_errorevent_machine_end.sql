@@ -0,0 +1,5 @@
+-- Event bắt đầu trước khoảng nhưng còn chạy trong khoảng (EndTime IS NULL OR EndTime > start)
+-- cho error_timeline.py / reliability.py: range scan theo (MachineID, EndTime) thay vì quét lịch sử máy.
+
+ALTER TABLE errorevent
+    ADD INDEX idx_errorevent_machine_end (MachineID, EndTime);
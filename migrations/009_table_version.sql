@@ -0,0 +1,114 @@
+-- Bộ đếm thay đổi của từng bảng cho ETag / cache response / job export (versions.py),
+-- thay cho information_schema.TABLES.UPDATE_TIME: MySQL 8 nhớ UPDATE_TIME
+-- information_schema_stats_expiry giây (mặc định 86400) → UPDATE / DELETE có thể trễ cả ngày.
+--
+-- Trigger AFTER INSERT / UPDATE / DELETE tăng version trong cùng transaction với lệnh ghi
+-- → bắt được mọi writer (app, insert.py, collector ngoài app), kể cả UPDATE tại chỗ / upsert.
+-- Lưu ý:
+--   - tạo trigger khi bật binlog cần quyền SUPER hoặc log_bin_trust_function_creators = 1
+--   - TRUNCATE không chạy trigger → sau TRUNCATE: UPDATE table_version SET version = version + 1 WHERE tbl = '...'
+--   - writer của cùng 1 bảng chờ nhau trên dòng version tới khi commit (transaction ghi nên ngắn)
+--   - machine: UPDATE chỉ tăng version khi đổi cột mà API đọc (MachineID, MachineName, LineID, IsActive);
+--     đổi CycleTime (plans.py) không làm ETag / cache của các API đọc machine hết hạn.
+--     API mới đọc thêm cột của machine → thêm cột vào trg_machine_upd.
+
+CREATE TABLE IF NOT EXISTS table_version (
+    tbl         VARCHAR(64)      NOT NULL PRIMARY KEY,
+    version     BIGINT UNSIGNED  NOT NULL DEFAULT 0,
+    changed_at  TIMESTAMP(6)     NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+);
+
+INSERT IGNORE INTO table_version (tbl) VALUES
+    ('dayvalues'),
+    ('errorevent'),
+    ('production_output'),
+    ('plan_production'),
+    ('machine'),
+    ('productionline'),
+    ('errortype');
+
+DROP TRIGGER IF EXISTS trg_dayvalues_ins;
+CREATE TRIGGER trg_dayvalues_ins AFTER INSERT ON dayvalues FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'dayvalues';
+
+DROP TRIGGER IF EXISTS trg_dayvalues_upd;
+CREATE TRIGGER trg_dayvalues_upd AFTER UPDATE ON dayvalues FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'dayvalues';
+
+DROP TRIGGER IF EXISTS trg_dayvalues_del;
+CREATE TRIGGER trg_dayvalues_del AFTER DELETE ON dayvalues FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'dayvalues';
+
+DROP TRIGGER IF EXISTS trg_errorevent_ins;
+CREATE TRIGGER trg_errorevent_ins AFTER INSERT ON errorevent FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'errorevent';
+
+DROP TRIGGER IF EXISTS trg_errorevent_upd;
+CREATE TRIGGER trg_errorevent_upd AFTER UPDATE ON errorevent FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'errorevent';
+
+DROP TRIGGER IF EXISTS trg_errorevent_del;
+CREATE TRIGGER trg_errorevent_del AFTER DELETE ON errorevent FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'errorevent';
+
+DROP TRIGGER IF EXISTS trg_production_output_ins;
+CREATE TRIGGER trg_production_output_ins AFTER INSERT ON production_output FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'production_output';
+
+DROP TRIGGER IF EXISTS trg_production_output_upd;
+CREATE TRIGGER trg_production_output_upd AFTER UPDATE ON production_output FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'production_output';
+
+DROP TRIGGER IF EXISTS trg_production_output_del;
+CREATE TRIGGER trg_production_output_del AFTER DELETE ON production_output FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'production_output';
+
+DROP TRIGGER IF EXISTS trg_plan_production_ins;
+CREATE TRIGGER trg_plan_production_ins AFTER INSERT ON plan_production FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'plan_production';
+
+DROP TRIGGER IF EXISTS trg_plan_production_upd;
+CREATE TRIGGER trg_plan_production_upd AFTER UPDATE ON plan_production FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'plan_production';
+
+DROP TRIGGER IF EXISTS trg_plan_production_del;
+CREATE TRIGGER trg_plan_production_del AFTER DELETE ON plan_production FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'plan_production';
+
+DROP TRIGGER IF EXISTS trg_machine_ins;
+CREATE TRIGGER trg_machine_ins AFTER INSERT ON machine FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'machine';
+
+DROP TRIGGER IF EXISTS trg_machine_upd;
+CREATE TRIGGER trg_machine_upd AFTER UPDATE ON machine FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'machine'
+      AND NOT (OLD.MachineID <=> NEW.MachineID AND OLD.MachineName <=> NEW.MachineName
+               AND OLD.LineID <=> NEW.LineID AND OLD.IsActive <=> NEW.IsActive);
+
+DROP TRIGGER IF EXISTS trg_machine_del;
+CREATE TRIGGER trg_machine_del AFTER DELETE ON machine FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'machine';
+
+DROP TRIGGER IF EXISTS trg_productionline_ins;
+CREATE TRIGGER trg_productionline_ins AFTER INSERT ON productionline FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'productionline';
+
+DROP TRIGGER IF EXISTS trg_productionline_upd;
+CREATE TRIGGER trg_productionline_upd AFTER UPDATE ON productionline FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'productionline';
+
+DROP TRIGGER IF EXISTS trg_productionline_del;
+CREATE TRIGGER trg_productionline_del AFTER DELETE ON productionline FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'productionline';
+
+DROP TRIGGER IF EXISTS trg_errortype_ins;
+CREATE TRIGGER trg_errortype_ins AFTER INSERT ON errortype FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'errortype';
+
+DROP TRIGGER IF EXISTS trg_errortype_upd;
+CREATE TRIGGER trg_errortype_upd AFTER UPDATE ON errortype FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'errortype';
+
+DROP TRIGGER IF EXISTS trg_errortype_del;
+CREATE TRIGGER trg_errortype_del AFTER DELETE ON errortype FOR EACH ROW
+    UPDATE table_version SET version = version + 1 WHERE tbl = 'errortype';
@@ -0,0 +1,107 @@
+"""
+KPI theo ngày của MỌI line trong 1 tháng – 1 query GROUP BY LineName, Days
+(nhóm theo tên line như /api/line-kpi cũ: 2 line trùng tên vẫn gộp chung, line_id = MIN(LineID)).
+
+Dùng chung cho:
+  - /api/plant-overview   (trang tổng quan, trước đây gọi /api/line-kpi từng line)
+  - /api/line-kpi         (lọc 1 line từ cùng dataset)
+  - export_kpi / job "kpi" (reports.kpi_report)
+
+Cache trong process theo (year, month), kèm version của dayvalues / machine / productionline
+lấy qua conditional.current_version – cùng bộ đếm trigger (versions.py) và cùng bộ nhớ version
+với ETag của các route → body không bao giờ cũ hơn ETag; version đổi thì tính lại.
+"""
+import threading
+import time
+
+from conditional import current_version
+from db import get_connection
+from periods import month_range
+
+OVERVIEW_TABLES = ("dayvalues", "machine", "productionline")
+OVERVIEW_MAX_MONTHS = 24
+
+KPI_FIELDS = (
+    ("oee", "OEERatio"),
+    ("ok", "OKProductRatio"),
+    ("output", "OutputRatio"),
+    ("activity", "ActivityRatio"),
+)
+
+_cache = {}   # (year, month) -> {"version", "used_at", "data"}
+_lock = threading.Lock()
+
+
+def _query(cursor, year, month):
+    month_start, month_end = month_range(year, month)
+    cursor.execute(
+        f"""
+        SELECT
+            MIN(pl.LineID) AS LineID,
+            pl.LineName,
+            dv.Days,
+            {", ".join(f"AVG(dv.{col}) AS {key}" for key, col in KPI_FIELDS)}
+        FROM dayvalues dv
+        JOIN machine m         ON dv.MachineID = m.MachineID
+        JOIN productionline pl ON m.LineID = pl.LineID
+        WHERE dv.Days >= %s AND dv.Days < %s
+        GROUP BY pl.LineName, dv.Days
+        ORDER BY pl.LineName, dv.Days
+        """,
+        (month_start, month_end),
+    )
+    rows = cursor.fetchall()
+
+    lines = {}
+    for r in rows:
+        line = lines.setdefault(r["LineName"], {
+            "line_id": r["LineID"],
+            "line_name": r["LineName"],
+            "days": [],
+        })
+        day = {"day": r["Days"].day}
+        for key, _ in KPI_FIELDS:
+            day[key] = float(r[key] or 0)
+        line["days"].append(day)
+
+    return {
+        "year": year,
+        "month": month,
+        "lines": list(lines.values()),
+    }
+
+
+def plant_kpi(year, month):
+    """Dataset KPI cả nhà máy cho (year, month) – xem docstring module."""
+    month_range(year, month)  # validate
+    key = (year, month)
+    version, _ = current_version(OVERVIEW_TABLES)
+
+    with _lock:
+        entry = _cache.get(key)
+    if entry and entry["version"] == version:
+        data = entry["data"]
+    else:
+        conn = get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            data = _query(cursor, year, month)
+            cursor.close()
+        finally:
+            conn.close()
+
+    with _lock:
+        _cache[key] = {"version": version, "used_at": time.monotonic(), "data": data}
+        while len(_cache) > OVERVIEW_MAX_MONTHS:
+            oldest = min(_cache, key=lambda k: _cache[k]["used_at"])
+            del _cache[oldest]
+    return data
+
+
+def line_kpi(year, month, line_name):
+    """Các ngày của 1 line (theo LineName, không phân biệt hoa thường như MySQL) trong dataset."""
+    wanted = (line_name or "").strip().lower()
+    for line in plant_kpi(year, month)["lines"]:
+        if (line["line_name"] or "").strip().lower() == wanted:
+            return line["days"]
+    return []
@@ -0,0 +1,52 @@
+"""
+Khoảng thời gian nửa mở [start, end) cho ngày / tháng / năm.
+
+Thay cho YEAR(Days) = %s AND MONTH(Days) = %s hay DATE(StartTime) = %s:
+MySQL không dùng được index trên cột khi cột bị bọc trong hàm, còn
+    Days >= %s AND Days < %s
+thì dùng được index (MachineID, Days) / (MachineID, StartTime).
+
+start, end là kiểu date → dùng được cho cả cột DATE (Days) và DATETIME (StartTime).
+"""
+from datetime import date, datetime, timedelta
+
+
+def parse_day(day):
+    """'2025-08-23' | date | datetime → date. Sai định dạng → ValueError."""
+    if isinstance(day, datetime):
+        return day.date()
+    if isinstance(day, date):
+        return day
+    return datetime.strptime(str(day).strip(), "%Y-%m-%d").date()
+
+
+def day_range(day):
+    start = parse_day(day)
+    return start, start + timedelta(days=1)
+
+
+def month_range(year, month):
+    year, month = int(year), int(month)
+    if not 1 <= month <= 12:
+        raise ValueError(f"month phải trong 1..12, nhận {month}")
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def year_range(year):
+    year = int(year)
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def period_range(granularity, day=None, year=None, month=None):
+    """
+    granularity: 'day' (cần day) | 'month' (cần year, month) | 'year' (cần year)
+    """
+    if granularity == "day":
+        return day_range(day)
+    if granularity == "month":
+        return month_range(year, month)
+    if granularity == "year":
+        return year_range(year)
+    raise ValueError(f"granularity không hợp lệ: {granularity}")
@@ -0,0 +1,384 @@
+"""
+plan_production cho màn hình kế hoạch ngày / tháng.
+
+materialize(): sinh plan mặc định cho các (MachineID, ngày) còn thiếu
+  - 1 query anti-join (lịch ngày CROSS JOIN machine LEFT JOIN plan_production) đếm dòng thiếu
+  - thiếu thì 1 câu INSERT IGNORE ... SELECT (unique (MachineID, Days) chống trùng)
+  - đủ rồi thì GET không ghi gì
+default_day_plan_sql() (màn hình ngày): dòng mặc định "chưa ai sửa" của màn hình tháng / pregenerator
+  (DayPlan = 0, Target_Product = 0, đúng 2 ca DEFAULT_SHIFTS) đọc ra DayPlan của màn hình ngày bằng CASE
+  trong SELECT – GET không UPDATE gì. Người dùng lưu 2 ca mặc định thì DayPlan = 16 chứ không bao giờ = 0
+  → dòng đã sửa giữ nguyên.
+start_pregenerator(): thread nền sinh sẵn tháng hiện tại + PLAN_PREGENERATE_MONTHS tháng tới
+
+bulk_update_plans():
+  1. 1 query IN (...) lấy MachineID + CycleTime của mọi plan trong request
+  2. Tính DayPlan / Target_Product trong Python, gom lỗi từng dòng
+  3. Ghi trong 1 transaction:
+       - UPDATE machine.CycleTime (chỉ máy đổi CT)
+       - nạp bảng tạm bằng 1 INSERT nhiều dòng rồi UPDATE ... JOIN bảng tạm
+  → số round trip cố định, không phụ thuộc số plan.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime
+
+from db import get_connection
+from periods import month_range
+
+PREGENERATE_ENABLED = os.environ.get("PLAN_PREGENERATE", "1") != "0"
+PREGENERATE_MONTHS = int(os.environ.get("PLAN_PREGENERATE_MONTHS", "1"))
+PREGENERATE_INTERVAL = float(os.environ.get("PLAN_PREGENERATE_INTERVAL", "3600"))
+PREGENERATE_LOCK = "plan_pregenerate"
+
+# 2 ca mặc định của plan mới sinh
+DEFAULT_SHIFTS = (("06:00:00", "14:00:00"), ("14:00:00", "22:00:00"))
+
+IN_CHUNK = 1000
+DT_FORMAT = "%Y-%m-%d %H:%M:%S"
+TMP_TABLE = "tmp_plan_update"
+
+
+class PlanRowError(ValueError):
+    pass
+
+
+def parse_shift_dt(s):
+    """'yyyy-MM-ddTHH:mm' | ISO → datetime. Rỗng → None. Sai → PlanRowError."""
+    if not s:
+        return None
+    try:
+        if len(s) == 16:  # yyyy-MM-ddTHH:mm
+            return datetime.strptime(s, "%Y-%m-%dT%H:%M")
+        return datetime.fromisoformat(s)
+    except (TypeError, ValueError):
+        raise PlanRowError(f"Invalid datetime: {s}")
+
+
+def parse_cycle_time(value):
+    """cycleTime FE gửi → số > 0 (int nếu chẵn). Rỗng → None."""
+    if value is None or value == "":
+        return None
+    try:
+        ct = float(value)
+    except (TypeError, ValueError):
+        raise PlanRowError(f"Invalid cycleTime: {value}")
+    if ct <= 0:
+        raise PlanRowError(f"cycleTime must be > 0, got {value}")
+    return int(ct) if ct.is_integer() else ct
+
+
+def _shift_hours(start, end, name):
+    if not (start and end):
+        return 0
+    if end < start:
+        raise PlanRowError(f"{name}: end is before start")
+    return (end - start).total_seconds() / 3600
+
+
+def _fmt(dt):
+    return dt.strftime(DT_FORMAT) if dt else None
+
+
+def _load_plans(cursor, plan_ids):
+    """{idplan_production: (MachineID, CycleTime)} – 1 query / IN_CHUNK id."""
+    found = {}
+    ids = list(plan_ids)
+    for i in range(0, len(ids), IN_CHUNK):
+        chunk = ids[i:i + IN_CHUNK]
+        cursor.execute(
+            f"""
+            SELECT dv.idplan_production, dv.MachineID, m.CycleTime
+            FROM plan_production dv
+            JOIN machine m ON dv.MachineID = m.MachineID
+            WHERE dv.idplan_production IN ({", ".join(["%s"] * len(chunk))})
+            """,
+            chunk,
+        )
+        for plan_id, machine_id, cycle_time in cursor.fetchall():
+            found[plan_id] = (machine_id, cycle_time)
+    return found
+
+
+def _apply_plan_rows(cursor, rows):
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {TMP_TABLE}")
+    cursor.execute(
+        f"""
+        CREATE TEMPORARY TABLE {TMP_TABLE} (
+            idplan_production INT PRIMARY KEY,
+            DayPlan INT,
+            Target_Product INT,
+            StartTime_1 DATETIME NULL,
+            EndTime_1 DATETIME NULL,
+            StartTime_2 DATETIME NULL,
+            EndTime_2 DATETIME NULL
+        ) ENGINE=MEMORY
+        """
+    )
+    # executemany với INSERT ... VALUES → connector gộp thành 1 câu nhiều dòng
+    cursor.executemany(
+        f"""
+        INSERT INTO {TMP_TABLE}
+        (idplan_production, DayPlan, Target_Product,
+         StartTime_1, EndTime_1, StartTime_2, EndTime_2)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """,
+        rows,
+    )
+    cursor.execute(
+        f"""
+        UPDATE plan_production p
+        JOIN {TMP_TABLE} t ON t.idplan_production = p.idplan_production
+        SET p.DayPlan = t.DayPlan,
+            p.Target_Product = t.Target_Product,
+            p.StartTime_1 = t.StartTime_1,
+            p.EndTime_1 = t.EndTime_1,
+            p.StartTime_2 = t.StartTime_2,
+            p.EndTime_2 = t.EndTime_2
+        """
+    )
+    cursor.execute(f"DROP TEMPORARY TABLE {TMP_TABLE}")
+
+
+def bulk_update_plans(conn, plans, hours_rounding=round):
+    """
+    plans: [{"id", "cycleTime", "startShift1", "endShift1", "startShift2", "endShift2"}, ...]
+    hours_rounding: round (màn hình ngày) | int (màn hình tháng, cắt phần lẻ như cũ)
+
+    CycleTime dùng để tính = cycleTime FE gửi cho máy đó trong request, không có thì lấy trong DB.
+    Các dòng cùng máy gửi cycleTime khác nhau → mọi dòng gửi cycleTime của máy đó bị báo lỗi
+    (không đoán dòng nào đúng), CycleTime của máy giữ nguyên.
+
+    Trả về (số plan đã update, [lỗi từng dòng]). Dòng lỗi bị bỏ qua, dòng hợp lệ vẫn ghi.
+    """
+    errors = []
+    parsed = []  # (index, plan_id, new_ct, s1, e1, s2, e2)
+
+    for index, p in enumerate(plans):
+        if not isinstance(p, dict):
+            errors.append({"index": index, "id": None, "error": "Row must be an object"})
+            continue
+        plan_id = p.get("id")
+        if not plan_id:
+            errors.append({"index": index, "id": None, "error": "Missing id"})
+            continue
+        try:
+            plan_id = int(plan_id)
+            new_ct = parse_cycle_time(p.get("cycleTime"))
+            s1 = parse_shift_dt(p.get("startShift1"))
+            e1 = parse_shift_dt(p.get("endShift1"))
+            s2 = parse_shift_dt(p.get("startShift2"))
+            e2 = parse_shift_dt(p.get("endShift2"))
+        except (PlanRowError, TypeError, ValueError) as e:
+            errors.append({"index": index, "id": plan_id, "error": str(e)})
+            continue
+        parsed.append((index, plan_id, new_ct, s1, e1, s2, e2))
+
+    cursor = conn.cursor()
+    try:
+        # 1) plan → máy + CycleTime hiện tại
+        existing = _load_plans(cursor, {row[1] for row in parsed})
+
+        # 2) CycleTime mới theo máy; 1 máy nhận nhiều giá trị khác nhau → lỗi các dòng đó
+        machine_cycle = {mid: ct for mid, ct in existing.values()}
+        requested = {}
+        for index, plan_id, new_ct, *_ in parsed:
+            if plan_id in existing and new_ct is not None:
+                requested.setdefault(existing[plan_id][0], {})[float(new_ct)] = new_ct
+        conflicts = {mid for mid, values in requested.items() if len(values) > 1}
+        if conflicts:
+            kept = []
+            for row in parsed:
+                index, plan_id, new_ct = row[:3]
+                if plan_id in existing and new_ct is not None and existing[plan_id][0] in conflicts:
+                    errors.append({
+                        "index": index,
+                        "id": plan_id,
+                        "error": "Conflicting cycleTime for the same machine in this request",
+                    })
+                    continue
+                kept.append(row)
+            parsed = kept
+        machine_new_cycle = {}
+        for mid, values in requested.items():
+            if mid in conflicts:
+                continue
+            ct = next(iter(values.values()))
+            if machine_cycle.get(mid) is None or float(machine_cycle[mid]) != float(ct):
+                machine_new_cycle[mid] = ct
+        machine_cycle.update(machine_new_cycle)
+
+        # 3) DayPlan / Target_Product
+        rows = []
+        for index, plan_id, new_ct, s1, e1, s2, e2 in parsed:
+            if plan_id not in existing:
+                errors.append({"index": index, "id": plan_id, "error": "Plan not found"})
+                continue
+            try:
+                hours = _shift_hours(s1, e1, "shift 1") + _shift_hours(s2, e2, "shift 2")
+            except PlanRowError as e:
+                errors.append({"index": index, "id": plan_id, "error": str(e)})
+                continue
+
+            machine_id = existing[plan_id][0]
+            cycle_time = float(machine_cycle.get(machine_id) or 0)
+            day_plan = int(hours_rounding(hours))
+            target_product = int(day_plan * 3600 / cycle_time) if cycle_time > 0 else 0
+            rows.append((plan_id, day_plan, target_product, _fmt(s1), _fmt(e1), _fmt(s2), _fmt(e2)))
+
+        # 4) Ghi – 1 transaction
+        if machine_new_cycle:
+            cursor.executemany(
+                "UPDATE machine SET CycleTime = %s WHERE MachineID = %s",
+                [(ct, mid) for mid, ct in machine_new_cycle.items()],
+            )
+            # không publish "catalog": không API cache nào trả CycleTime (trigger machine cũng bỏ qua cột này)
+        if rows:
+            _apply_plan_rows(cursor, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    errors.sort(key=lambda e: e["index"])
+    return len(rows), errors
+
+
+# ==== SINH PLAN MẶC ĐỊNH ====
+def _missing_plans_sql(select_list, line_id=None, machine_id=None):
+    """WITH lịch ngày [start, end) + anti-join plan_production. Params: start, end, [lọc]."""
+    where, params = "", []
+    if machine_id is not None:
+        where, params = "AND m.MachineID = %s", [machine_id]
+    elif line_id is not None:
+        where, params = "AND m.LineID = %s", [line_id]
+
+    sql = f"""
+        WITH RECURSIVE cal (Days) AS (
+            SELECT CAST(%s AS DATE)
+            UNION ALL
+            SELECT Days + INTERVAL 1 DAY FROM cal WHERE Days + INTERVAL 1 DAY < %s
+        )
+        SELECT {select_list}
+        FROM machine m
+        CROSS JOIN cal
+        LEFT JOIN plan_production p
+               ON p.MachineID = m.MachineID AND p.Days = cal.Days
+        WHERE p.idplan_production IS NULL
+          {where}
+    """
+    return sql, params
+
+
+def default_day_plan_sql(alias, day_plan):
+    """
+    Biểu thức SELECT: DayPlan của dòng alias, dòng mặc định chưa ai sửa
+    (DayPlan = 0, Target_Product = 0, đúng 2 ca DEFAULT_SHIFTS) → day_plan. Params: day_plan.
+    """
+    (s1, e1), (s2, e2) = DEFAULT_SHIFTS
+    a = alias
+    sql = f"""
+        CASE WHEN {a}.DayPlan = 0 AND {a}.Target_Product = 0
+              AND {a}.StartTime_1 = TIMESTAMP({a}.Days, '{s1}') AND {a}.EndTime_1 = TIMESTAMP({a}.Days, '{e1}')
+              AND {a}.StartTime_2 = TIMESTAMP({a}.Days, '{s2}') AND {a}.EndTime_2 = TIMESTAMP({a}.Days, '{e2}')
+             THEN %s ELSE {a}.DayPlan END
+    """
+    return sql, [day_plan]
+
+
+def materialize(conn, start, end, day_plan, line_id=None, machine_id=None):
+    """
+    Sinh plan mặc định (DayPlan = day_plan, Target_Product = 0, 2 ca DEFAULT_SHIFTS)
+    cho mọi ngày trong [start, end) mà máy chưa có plan.
+    Lọc theo machine_id, hoặc line_id (mọi máy của line), không truyền = mọi máy.
+    Trả về số dòng đã thêm.
+    """
+    cursor = conn.cursor()
+    try:
+        sql, params = _missing_plans_sql("COUNT(*)", line_id, machine_id)
+        cursor.execute(sql, [start, end] + params)
+        if int(cursor.fetchone()[0]) == 0:
+            return 0
+
+        (s1, e1), (s2, e2) = DEFAULT_SHIFTS
+        sql, params = _missing_plans_sql(
+            f"""m.MachineID, cal.Days, %s, 0,
+                TIMESTAMP(cal.Days, '{s1}'), TIMESTAMP(cal.Days, '{e1}'),
+                TIMESTAMP(cal.Days, '{s2}'), TIMESTAMP(cal.Days, '{e2}')""",
+            line_id,
+            machine_id,
+        )
+        cursor.execute(
+            """
+            INSERT IGNORE INTO plan_production
+            (MachineID, Days, DayPlan, Target_Product,
+             StartTime_1, EndTime_1, StartTime_2, EndTime_2)
+            """ + sql,
+            [start, end, day_plan] + params,
+        )
+        inserted = cursor.rowcount
+        conn.commit()
+        return inserted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def pregenerate(conn, months_ahead=PREGENERATE_MONTHS):
+    """
+    Sinh plan (DayPlan = 0 như màn hình tháng) cho tháng hiện tại + months_ahead tháng tới.
+    Màn hình ngày vẫn hiện DayPlan mặc định của nó: get_day_plans đọc qua default_day_plan_sql.
+    """
+    today = date.today()
+    start, _ = month_range(today.year, today.month)
+    last_year = today.year + (today.month - 1 + months_ahead) // 12
+    last_month = (today.month - 1 + months_ahead) % 12 + 1
+    _, end = month_range(last_year, last_month)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (PREGENERATE_LOCK,))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        return 0
+    try:
+        return materialize(conn, start, end, day_plan=0)
+    finally:
+        cursor.execute("DO RELEASE_LOCK(%s)", (PREGENERATE_LOCK,))
+        cursor.close()
+
+
+_pregenerator = None
+_pregenerator_lock = threading.Lock()
+
+
+def _pregenerate_loop():
+    while True:
+        try:
+            conn = get_connection()
+            try:
+                inserted = pregenerate(conn)
+            finally:
+                conn.close()
+            if inserted:
+                print(f"Plan pregenerate: {inserted} rows")
+        except Exception as e:
+            print("Plan pregenerate error:", e)
+        time.sleep(PREGENERATE_INTERVAL)
+
+
+def start_pregenerator():
+    """Chạy 1 thread nền / process (gọi nhiều lần không sao). PLAN_PREGENERATE=0 để tắt."""
+    global _pregenerator
+    if not PREGENERATE_ENABLED:
+        return
+    with _pregenerator_lock:
+        if _pregenerator is None or not _pregenerator.is_alive():
+            _pregenerator = threading.Thread(
+                target=_pregenerate_loop, name="plan-pregenerate", daemon=True
+            )
+            _pregenerator.start()
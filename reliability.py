@@ -0,0 +1,125 @@
+"""
+MTBF / MTTR theo máy + loại lỗi (hoặc theo máy, mọi loại lỗi) trong 1 khoảng thời gian.
+
+Cùng định nghĩa với error_timeline.py (stop_metrics), nhưng tính hết trong DB – 1 query:
+  - event cắt vào [start, min(end, now)) như _clip; event chưa có EndTime = dừng tới hiện tại;
+    event bắt đầu trước start nhưng còn chạy lúc start cũng được tính (index idx_errorevent_machine_end)
+  - MAX(End) OVER (PARTITION BY máy[, loại lỗi] ORDER BY Start ROWS ... 1 PRECEDING) = điểm kết thúc
+    xa nhất của các event trước (event lồng nhau không tạo "khoảng chạy" giả như LAG(EndTime))
+  - Start > PrevEnd → 1 lần dừng mới; phần dừng thật của event = GREATEST(End - GREATEST(Start, PrevEnd), 0)
+    → downtime đã gộp event chồng nhau (giống merge_intervals)
+  - MTTR = downtime / số lần dừng, MTBF = (thời gian của khoảng - downtime) / số lần dừng
+
+Khoảng: ngày / tháng / năm (periods.period_range) hoặc cửa sổ trượt N ngày kết thúc tại 1 ngày.
+"""
+from datetime import datetime, timedelta
+
+from error_timeline import stop_metrics
+from periods import parse_day
+
+GROUPS = {
+    "type": ("cl.MachineID, cl.ErrorTypeID", "ev.MachineID, ev.ErrorTypeID"),
+    "machine": ("cl.MachineID", "ev.MachineID"),
+}
+MAX_WINDOW_DAYS = 366
+
+
+def rolling_range(days, end_day):
+    """N ngày kết thúc tại end_day (gồm end_day) → (start, end) nửa mở."""
+    days = int(days)
+    if not 1 <= days <= MAX_WINDOW_DAYS:
+        raise ValueError(f"window phải trong 1..{MAX_WINDOW_DAYS}")
+    end = parse_day(end_day) + timedelta(days=1)
+    return end - timedelta(days=days), end
+
+
+def reliability(cursor, start, end, line_id=None, machine_id=None, group="type", now=None):
+    """
+    Phạm vi: machine_id → 1 máy; line_id → 1 line; cả 2 None → cả nhà máy. group: "type" | "machine".
+    Cursor dictionary=True. Mỗi dòng: machine_id, machine_name, (error_code, error_name),
+    events, failures (lần dừng đã gộp), repair_seconds (downtime), mttr_seconds, uptime_seconds, mtbf_seconds.
+    """
+    partition, group_by = GROUPS[group]
+    now = now or datetime.now()
+    range_start = datetime.combine(start, datetime.min.time())
+    range_end = min(datetime.combine(end, datetime.min.time()), now)
+    span = max((range_end - range_start).total_seconds(), 0)
+
+    scope_filter, scope_params = "", []
+    if machine_id is not None:
+        scope_filter, scope_params = "AND dv.MachineID = %s", [machine_id]
+    elif line_id is not None:
+        scope_filter = "AND dv.MachineID IN (SELECT MachineID FROM machine WHERE LineID = %s)"
+        scope_params = [line_id]
+
+    type_columns = "m.ErrorCode, m.ErrorName_Vie," if group == "type" else ""
+    type_join = "JOIN errortype m ON ev.ErrorTypeID = m.ErrorTypeID" if group == "type" else ""
+    type_group = ", m.ErrorCode, m.ErrorName_Vie" if group == "type" else ""
+
+    cursor.execute(
+        f"""
+        WITH raw AS (
+            SELECT dv.MachineID, dv.ErrorTypeID, dv.StartTime, dv.EndTime
+            FROM errorevent dv
+            WHERE dv.StartTime >= %s AND dv.StartTime < %s {scope_filter}
+            UNION ALL
+            SELECT dv.MachineID, dv.ErrorTypeID, dv.StartTime, dv.EndTime
+            FROM errorevent dv
+            WHERE (dv.EndTime IS NULL OR dv.EndTime > %s) AND dv.StartTime < %s {scope_filter}
+        ),
+        cl AS (
+            SELECT
+                MachineID,
+                ErrorTypeID,
+                GREATEST(StartTime, %s) AS S,
+                LEAST(COALESCE(EndTime, %s), %s) AS E
+            FROM raw
+        ),
+        ev AS (
+            SELECT
+                cl.MachineID,
+                cl.ErrorTypeID,
+                cl.S,
+                cl.E,
+                MAX(cl.E) OVER (
+                    PARTITION BY {partition} ORDER BY cl.S
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ) AS PrevEnd
+            FROM cl
+            WHERE cl.E > cl.S
+        )
+        SELECT
+            {group_by},
+            pl.MachineName,
+            {type_columns}
+            COUNT(*) AS Events,
+            CAST(SUM(ev.PrevEnd IS NULL OR ev.S > ev.PrevEnd) AS SIGNED) AS Stops,
+            CAST(SUM(GREATEST(
+                TIMESTAMPDIFF(SECOND, GREATEST(ev.S, COALESCE(ev.PrevEnd, ev.S)), ev.E), 0
+            )) AS SIGNED) AS DowntimeSeconds
+        FROM ev
+        JOIN machine pl ON ev.MachineID = pl.MachineID
+        {type_join}
+        GROUP BY {group_by}, pl.MachineName{type_group}
+        ORDER BY {group_by}
+        """,
+        [range_start, range_end] + scope_params
+        + [range_start, range_start] + scope_params
+        + [range_start, now, range_end],
+    )
+
+    result = []
+    for r in cursor.fetchall():
+        item = {"machine_id": r["MachineID"], "machine_name": r["MachineName"]}
+        if group == "type":
+            item["error_code"] = r["ErrorCode"]
+            item["error_name"] = r["ErrorName_Vie"]
+        downtime, stops = int(r["DowntimeSeconds"]), int(r["Stops"])
+        item.update({
+            "events": int(r["Events"]),
+            "failures": stops,
+            "repair_seconds": downtime,
+            **stop_metrics(span, downtime, stops),
+        })
+        result.append(item)
+    return result
@@ -0,0 +1,212 @@
+"""
+Dữ liệu cho các file Excel export.
+
+Mỗi hàm *_report() query DB xong trả về (tên file, [Sheet, ...]) – phần ghi xlsx
+do excel_export lo, nên cùng 1 report dùng được cho cả HTTP stream lẫn job export nền.
+"""
+import calendar
+
+from aggregation import detail_rows
+from db import get_connection
+from excel_export import Sheet
+from metrics import RATIO_COLUMNS, TIME_CATEGORIES
+from overview import KPI_FIELDS, plant_kpi
+from periods import month_range
+from rollup import maybe_sync as maybe_sync_rollups
+
+# Ratio | Time (giờ) | Time (%)
+DETAIL_COLUMNS = (
+    list(RATIO_COLUMNS)
+    + list(TIME_CATEGORIES)
+    + [f"{c}Pct" for c in TIME_CATEGORIES]
+)
+DETAIL_WIDTH = 1 + len(DETAIL_COLUMNS)
+
+KPI_HEADERS = ["Day", "OEERatio", "OKProductRatio", "OutputRatio", "ActivityRatio"]
+
+# SELECT rollup tháng với alias trùng tên cột dayvalues
+_ROLLUP_SELECT = ",\n".join(
+    [f"{c}_Sum / NULLIF({c}_Cnt, 0) AS {c}" for c in RATIO_COLUMNS]
+    + [f"`{c}` AS `{c}`" for c in TIME_CATEGORIES]
+)
+_DAY_SELECT = ",\n".join(
+    [f"AVG(dv.{c}) AS {c}" for c in RATIO_COLUMNS]
+    + [f"SUM(dv.`{c}`) AS `{c}`" for c in TIME_CATEGORIES]
+)
+
+
+def safe_filename(name):
+    return "".join(ch if ch.isalnum() or ch == " " else "_" for ch in name).replace(" ", "_")
+
+
+def _fmt_day(day_raw):
+    return day_raw.strftime("%Y-%m-%d") if hasattr(day_raw, "strftime") else str(day_raw)
+
+
+def _machine_name(cursor, machine_id):
+    cursor.execute("SELECT MachineName FROM machine WHERE MachineID = %s", (machine_id,))
+    mrow = cursor.fetchone()
+    return mrow["MachineName"] if mrow and mrow.get("MachineName") else f"Machine_{machine_id}"
+
+
+def _line_name(cursor, line_id):
+    cursor.execute("SELECT LineName FROM productionline WHERE LineID = %s", (line_id,))
+    lrow = cursor.fetchone()
+    return lrow["LineName"] if lrow and lrow.get("LineName") else f"Line_{line_id}"
+
+
+# ==== THÁNG: 1 dòng / ngày có dữ liệu ====
+def machine_month_report(machine_id, year, month, data_type="ALL"):
+    month_start, month_end = month_range(year, month)
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    machine_name = _machine_name(cursor, machine_id)
+    cursor.execute(
+        f"""
+        SELECT
+            Days,
+            {", ".join(RATIO_COLUMNS)},
+            {", ".join(f"`{c}`" for c in TIME_CATEGORIES)}
+        FROM sdvn.dayvalues
+        WHERE MachineID = %s
+          AND Days >= %s AND Days < %s
+        ORDER BY Days
+        """,
+        (machine_id, month_start, month_end),
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    def sheet_rows():
+        yield [f"Machine: {machine_name}", f"Month: {month}", f"Data filter: {data_type}"]
+        yield []
+        yield ["Date"] + DETAIL_COLUMNS
+        yield from detail_rows([_fmt_day(r["Days"]) for r in rows], rows)
+
+    filename = f"{machine_name}_{month:02d}.xlsx"
+    return filename, [Sheet(machine_name, sheet_rows(), DETAIL_WIDTH)]
+
+
+def line_month_report(line_id, year, month, data_type="ALL"):
+    month_start, month_end = month_range(year, month)
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    line_name = _line_name(cursor, line_id)
+    # Dữ liệu theo ngày, gộp theo line (AVG ratio, SUM giờ của các máy IsActive)
+    cursor.execute(
+        f"""
+        SELECT
+            dv.Days,
+            {_DAY_SELECT}
+        FROM sdvn.dayvalues dv
+        JOIN sdvn.machine m ON dv.MachineID = m.MachineID
+        WHERE m.LineID = %s AND IsActive = 1
+          AND dv.Days >= %s AND dv.Days < %s
+        GROUP BY dv.Days
+        ORDER BY dv.Days
+        """,
+        (line_id, month_start, month_end),
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    def sheet_rows():
+        yield [f"Line: {line_name}", f"Month: {month}", f"Data filter: {data_type}"]
+        yield []
+        yield ["Date"] + DETAIL_COLUMNS
+        yield from detail_rows([_fmt_day(r["Days"]) for r in rows], rows)
+
+    filename = f"{line_name}_month_{month:02d}.xlsx"
+    return filename, [Sheet(line_name, sheet_rows(), DETAIL_WIDTH)]
+
+
+# ==== NĂM: 12 dòng (tháng 1..12), đọc từ rollup tháng ====
+def _year_rows(cursor, table, key_column, key, year):
+    cursor.execute(
+        f"""
+        SELECT
+            `Month` AS m,
+            {_ROLLUP_SELECT}
+        FROM sdvn.{table}
+        WHERE {key_column} = %s
+          AND `Year` = %s
+        ORDER BY m
+        """,
+        (key, year),
+    )
+    return {int(r["m"]): r for r in cursor.fetchall()}
+
+
+def machine_year_report(machine_id, year, data_type="ALL"):
+    conn = get_connection()
+    maybe_sync_rollups(conn)
+    cursor = conn.cursor(dictionary=True)
+    machine_name = _machine_name(cursor, machine_id)
+    month_map = _year_rows(cursor, "dayvalues_machine_month", "MachineID", machine_id, year)
+    cursor.close()
+    conn.close()
+
+    def sheet_rows():
+        yield [f"MachineName: {machine_name}", f"Year: {year}", f"Data filter: {data_type}"]
+        yield []
+        yield ["Month"] + DETAIL_COLUMNS
+        months = range(1, 13)
+        yield from detail_rows(months, [month_map.get(m) for m in months])
+
+    filename = f"{safe_filename(machine_name)}_nam_{year}.xlsx"
+    return filename, [Sheet(machine_name, sheet_rows(), DETAIL_WIDTH)]
+
+
+def line_year_report(line_id, year, data_type="ALL"):
+    conn = get_connection()
+    maybe_sync_rollups(conn)
+    cursor = conn.cursor(dictionary=True)
+    line_name = _line_name(cursor, line_id)
+    month_map = _year_rows(cursor, "dayvalues_line_month", "LineID", line_id, year)
+    cursor.close()
+    conn.close()
+
+    def sheet_rows():
+        yield [f"LineName: {line_name}", f"Year: {year}", f"Data filter: {data_type}"]
+        yield []
+        yield ["Month"] + DETAIL_COLUMNS
+        months = range(1, 13)
+        yield from detail_rows(months, [month_map.get(m) for m in months])
+
+    filename = f"{safe_filename(line_name)}_nam_{year}.xlsx"
+    return filename, [Sheet(line_name, sheet_rows(), DETAIL_WIDTH)]
+
+
+# ==== KPI TẤT CẢ LINE: mỗi line 1 sheet, đủ ngày trong tháng ====
+def kpi_report(year, month, data_type="all"):
+    # Cùng dataset với /api/plant-overview (cache theo tháng), không query lại
+    data = plant_kpi(year, month)
+
+    # data_by_line[line_name][day] = [oee, ok, output, activity]
+    data_by_line = {}
+    for line in data["lines"]:
+        day_map = data_by_line.setdefault(line["line_name"], {})
+        for d in line["days"]:
+            day_map[d["day"]] = [d[key] for key, _ in KPI_FIELDS]
+
+    days_in_month = calendar.monthrange(year, month)[1]
+
+    def sheet_rows(day_map):
+        yield KPI_HEADERS
+        for day in range(1, days_in_month + 1):
+            yield [day] + day_map.get(day, [0, 0, 0, 0])
+
+    if not data_by_line:
+        # Không có line nào => vẫn tạo 1 sheet NoData
+        sheets = [Sheet("NoData", sheet_rows({}), len(KPI_HEADERS))]
+    else:
+        sheets = [
+            Sheet(line_name or "Line", sheet_rows(day_map), len(KPI_HEADERS))
+            for line_name, day_map in data_by_line.items()
+        ]
+
+    return f"OverView_T_{month}_{year}.xlsx", sheets
@@ -0,0 +1,416 @@
+"""
+Rollup theo tháng cho dayvalues:
+  - dayvalues_machine_month: (MachineID, Year, Month)
+  - dayvalues_line_month:    (LineID, Year, Month) – gộp từ rollup máy, chỉ máy IsActive = 1
+
+Mỗi bucket lưu SUM 11 nhóm thời gian + SUM/COUNT 4 tỷ lệ (AVG = Sum / Cnt).
+
+Cập nhật:
+  - refresh_buckets(): tính lại đúng các bucket (MachineID, năm, tháng) bị ảnh hưởng
+  - sync(): gom các dòng mới theo watermark idDayValues + làm mới tháng hiện tại khi bộ đếm
+    thay đổi của dayvalues (versions.py) đổi (dòng của tháng hiện tại bị UPDATE tại chỗ, id không đổi)
+  - maybe_sync(): như sync() nhưng mỗi process tối đa 1 lần / ROLLUP_SYNC_INTERVAL giây;
+    @conditional(..., refresh=maybe_sync) gọi trước khi tính ETag
+  - có thay đổi thì ghi cache_invalidation group "rollup" → version của dayvalues_machine_month /
+    dayvalues_line_month đổi → ETag / key cache của API năm theo đúng dữ liệu rollup đang trả
+
+Dòng lệnh:
+    python rollup.py --rebuild [--year 2025]   # dựng lại toàn bộ
+    python rollup.py --sync
+    python rollup.py --check [--year 2025]     # so rollup với bảng gốc
+
+Lưu ý: đổi IsActive của máy không tự cập nhật rollup line → chạy --rebuild.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+from db import connect, get_connection
+from metrics import RATIO_COLUMNS, TIME_CATEGORIES
+from periods import month_range, parse_day, year_range
+from versions import data_version
+
+SYNC_INTERVAL = float(os.environ.get("ROLLUP_SYNC_INTERVAL", "30"))
+STATE_NAME = "dayvalues"
+LOCK_NAME = "rollup_dayvalues"
+INVALIDATION_GROUP = "rollup"
+
+ROLLUP_COLUMNS = (
+    ("RowCount",)
+    + TIME_CATEGORIES
+    + tuple(f"{c}_{suffix}" for c in RATIO_COLUMNS for suffix in ("Sum", "Cnt"))
+)
+_COLS_SQL = ", ".join(f"`{c}`" for c in ROLLUP_COLUMNS)
+
+
+def _raw_aggregates(alias=None):
+    """Biểu thức gộp trên dayvalues, đúng thứ tự ROLLUP_COLUMNS."""
+    p = f"{alias}." if alias else ""
+    exprs = ["COUNT(*)"]
+    exprs += [f"COALESCE(SUM({p}`{c}`), 0)" for c in TIME_CATEGORIES]
+    for c in RATIO_COLUMNS:
+        exprs += [f"COALESCE(SUM({p}`{c}`), 0)", f"COUNT({p}`{c}`)"]
+    return ", ".join(exprs)
+
+
+def _rollup_sums(alias):
+    return ", ".join(f"SUM({alias}.`{c}`)" for c in ROLLUP_COLUMNS)
+
+
+# ==== REFRESH THEO BUCKET ====
+def refresh_machine_bucket(cursor, machine_id, year, month):
+    start, end = month_range(year, month)
+    cursor.execute(
+        "DELETE FROM dayvalues_machine_month WHERE MachineID = %s AND `Year` = %s AND `Month` = %s",
+        (machine_id, year, month),
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO dayvalues_machine_month (MachineID, `Year`, `Month`, {_COLS_SQL})
+        SELECT MachineID, %s, %s, {_raw_aggregates()}
+        FROM dayvalues
+        WHERE MachineID = %s AND Days >= %s AND Days < %s
+        GROUP BY MachineID
+        """,
+        (year, month, machine_id, start, end),
+    )
+
+
+def refresh_line_bucket(cursor, line_id, year, month):
+    cursor.execute(
+        "DELETE FROM dayvalues_line_month WHERE LineID = %s AND `Year` = %s AND `Month` = %s",
+        (line_id, year, month),
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO dayvalues_line_month (LineID, `Year`, `Month`, {_COLS_SQL})
+        SELECT m.LineID, r.`Year`, r.`Month`, {_rollup_sums("r")}
+        FROM dayvalues_machine_month r
+        JOIN machine m ON r.MachineID = m.MachineID
+        WHERE m.LineID = %s AND m.IsActive = 1
+          AND r.`Year` = %s AND r.`Month` = %s
+        GROUP BY m.LineID, r.`Year`, r.`Month`
+        """,
+        (line_id, year, month),
+    )
+
+
+def refresh_month(cursor, year, month):
+    """Tính lại 1 tháng cho TẤT CẢ máy + line (2 câu INSERT ... SELECT theo khoảng ngày)."""
+    start, end = month_range(year, month)
+    cursor.execute(
+        "DELETE FROM dayvalues_machine_month WHERE `Year` = %s AND `Month` = %s",
+        (year, month),
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO dayvalues_machine_month (MachineID, `Year`, `Month`, {_COLS_SQL})
+        SELECT MachineID, %s, %s, {_raw_aggregates()}
+        FROM dayvalues
+        WHERE Days >= %s AND Days < %s
+        GROUP BY MachineID
+        """,
+        (year, month, start, end),
+    )
+    cursor.execute(
+        "DELETE FROM dayvalues_line_month WHERE `Year` = %s AND `Month` = %s",
+        (year, month),
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO dayvalues_line_month (LineID, `Year`, `Month`, {_COLS_SQL})
+        SELECT m.LineID, r.`Year`, r.`Month`, {_rollup_sums("r")}
+        FROM dayvalues_machine_month r
+        JOIN machine m ON r.MachineID = m.MachineID
+        WHERE m.IsActive = 1 AND r.`Year` = %s AND r.`Month` = %s
+        GROUP BY m.LineID, r.`Year`, r.`Month`
+        """,
+        (year, month),
+    )
+
+
+def buckets_from_days(pairs):
+    """[(MachineID, Days), ...] → {(MachineID, năm, tháng)}; bỏ qua ngày lỗi."""
+    buckets = set()
+    for machine_id, day in pairs:
+        try:
+            d = parse_day(day)
+        except (TypeError, ValueError):
+            continue
+        buckets.add((int(machine_id), d.year, d.month))
+    return buckets
+
+
+def refresh_buckets(cursor, buckets):
+    """
+    Tính lại các bucket máy (MachineID, năm, tháng) + bucket line tương ứng.
+    KHÔNG commit – người gọi tự commit cùng transaction ghi dayvalues.
+    """
+    buckets = {(int(mid), int(y), int(m)) for mid, y, m in buckets}
+    if not buckets:
+        return 0
+
+    for machine_id, year, month in sorted(buckets):
+        refresh_machine_bucket(cursor, machine_id, year, month)
+
+    machine_ids = sorted({b[0] for b in buckets})
+    placeholders = ", ".join(["%s"] * len(machine_ids))
+    cursor.execute(
+        f"SELECT MachineID, LineID FROM machine WHERE MachineID IN ({placeholders})",
+        machine_ids,
+    )
+    line_of = {mid: lid for mid, lid in cursor.fetchall() if lid is not None}
+
+    line_buckets = {(line_of[mid], y, m) for mid, y, m in buckets if mid in line_of}
+    for line_id, year, month in sorted(line_buckets):
+        refresh_line_bucket(cursor, line_id, year, month)
+
+    return len(buckets)
+
+
+# ==== ĐỒNG BỘ THEO WATERMARK ====
+def _read_watermark(cursor):
+    cursor.execute("SELECT watermark FROM rollup_state WHERE name = %s", (STATE_NAME,))
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+def _write_watermark(cursor, watermark):
+    cursor.execute(
+        """
+        INSERT INTO rollup_state (name, watermark, refreshed_at)
+        VALUES (%s, %s, NOW())
+        ON DUPLICATE KEY UPDATE watermark = VALUES(watermark), refreshed_at = VALUES(refreshed_at)
+        """,
+        (STATE_NAME, watermark),
+    )
+
+
+def publish(cursor):
+    """Báo rollup đã đổi (version của bảng rollup – versions.py). KHÔNG commit."""
+    cursor.execute("INSERT INTO cache_invalidation (grp) VALUES (%s)", (INVALIDATION_GROUP,))
+
+
+_last_source_version = None
+
+
+def sync(conn, hot=True):
+    """
+    Gom các dòng dayvalues có idDayValues > watermark vào rollup.
+    hot=True: tính lại tháng hiện tại nếu dayvalues đổi từ lần sync trước (dòng của hôm nay vẫn đang được UPDATE).
+    Trả về False nếu worker khác đang sync (không chờ).
+    """
+    global _last_source_version
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        return False
+
+    try:
+        source_version = data_version(conn, "dayvalues")
+        watermark = _read_watermark(cursor)
+        cursor.execute("SELECT COALESCE(MAX(idDayValues), 0) FROM dayvalues")
+        top = int(cursor.fetchone()[0])
+
+        buckets = set()
+        if top > watermark:
+            cursor.execute(
+                """
+                SELECT DISTINCT MachineID, YEAR(Days), MONTH(Days)
+                FROM dayvalues
+                WHERE idDayValues > %s AND idDayValues <= %s
+                """,
+                (watermark, top),
+            )
+            buckets = {tuple(int(v) for v in r) for r in cursor.fetchall() if None not in r}
+
+        changed = False
+        if hot and source_version != _last_source_version:
+            today = date.today()
+            refresh_month(cursor, today.year, today.month)
+            buckets = {b for b in buckets if (b[1], b[2]) != (today.year, today.month)}
+            changed = True
+
+        changed = refresh_buckets(cursor, buckets) > 0 or changed
+        _write_watermark(cursor, top)
+        if changed:
+            publish(cursor)
+        conn.commit()
+        _last_source_version = source_version
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("DO RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.close()
+    return True
+
+
+_last_sync = 0.0
+_sync_lock = threading.Lock()
+
+
+def maybe_sync(conn=None):
+    """
+    Gọi trước khi đọc rollup (conn=None → tự mượn connection khi tới lượt sync);
+    lỗi sync không làm hỏng request.
+    """
+    global _last_sync
+    with _sync_lock:
+        if time.monotonic() - _last_sync < SYNC_INTERVAL:
+            return False
+        _last_sync = time.monotonic()
+    own = conn is None
+    try:
+        conn = conn or get_connection()
+        return sync(conn)
+    except Exception as e:
+        print("Rollup sync error:", e)
+        return False
+    finally:
+        if own and conn is not None:
+            conn.close()
+
+
+# ==== DỰNG LẠI / KIỂM TRA ====
+def rebuild(conn, year=None):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(idDayValues), 0) FROM dayvalues")
+    top = int(cursor.fetchone()[0])
+
+    where, params = "", ()
+    if year:
+        start, end = year_range(year)
+        where, params = "WHERE Days >= %s AND Days < %s", (start, end)
+        cursor.execute("DELETE FROM dayvalues_machine_month WHERE `Year` = %s", (year,))
+        cursor.execute("DELETE FROM dayvalues_line_month WHERE `Year` = %s", (year,))
+    else:
+        cursor.execute("DELETE FROM dayvalues_machine_month")
+        cursor.execute("DELETE FROM dayvalues_line_month")
+
+    cursor.execute(
+        f"""
+        INSERT INTO dayvalues_machine_month (MachineID, `Year`, `Month`, {_COLS_SQL})
+        SELECT MachineID, YEAR(Days), MONTH(Days), {_raw_aggregates()}
+        FROM dayvalues
+        {where}
+        GROUP BY MachineID, YEAR(Days), MONTH(Days)
+        """,
+        params,
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO dayvalues_line_month (LineID, `Year`, `Month`, {_COLS_SQL})
+        SELECT m.LineID, r.`Year`, r.`Month`, {_rollup_sums("r")}
+        FROM dayvalues_machine_month r
+        JOIN machine m ON r.MachineID = m.MachineID
+        WHERE m.IsActive = 1 {"AND r.`Year` = %s" if year else ""}
+        GROUP BY m.LineID, r.`Year`, r.`Month`
+        """,
+        (year,) if year else (),
+    )
+    if not year:
+        _write_watermark(cursor, top)
+    publish(cursor)
+    conn.commit()
+    cursor.close()
+
+
+def _compare(expected, actual, level, tolerance):
+    problems = []
+    for key in sorted(set(expected) | set(actual)):
+        exp, act = expected.get(key), actual.get(key)
+        if exp is None or act is None:
+            problems.append({"level": level, "key": key, "column": None,
+                             "raw": exp is not None, "rollup": act is not None})
+            continue
+        for col, e, a in zip(ROLLUP_COLUMNS, exp, act):
+            if abs(float(e or 0) - float(a or 0)) > tolerance:
+                problems.append({"level": level, "key": key, "column": col, "raw": e, "rollup": a})
+    return problems
+
+
+def check(conn, year=None, tolerance=1e-6):
+    """So rollup với bảng gốc dayvalues. Trả về danh sách chênh lệch (rỗng = khớp)."""
+    cursor = conn.cursor()
+    where, params = "", ()
+    if year:
+        start, end = year_range(year)
+        where, params = "AND dv.Days >= %s AND dv.Days < %s", (start, end)
+
+    cursor.execute(
+        f"""
+        SELECT dv.MachineID, YEAR(dv.Days), MONTH(dv.Days), {_raw_aggregates("dv")}
+        FROM dayvalues dv
+        WHERE 1 = 1 {where}
+        GROUP BY dv.MachineID, YEAR(dv.Days), MONTH(dv.Days)
+        """,
+        params,
+    )
+    raw_machine = {tuple(int(v) for v in r[:3]): r[3:] for r in cursor.fetchall()}
+
+    cursor.execute(
+        f"""
+        SELECT m.LineID, YEAR(dv.Days), MONTH(dv.Days), {_raw_aggregates("dv")}
+        FROM dayvalues dv
+        JOIN machine m ON dv.MachineID = m.MachineID
+        WHERE m.IsActive = 1 {where}
+        GROUP BY m.LineID, YEAR(dv.Days), MONTH(dv.Days)
+        """,
+        params,
+    )
+    raw_line = {tuple(int(v) for v in r[:3]): r[3:] for r in cursor.fetchall()}
+
+    year_filter = "WHERE `Year` = %s" if year else ""
+    year_params = (year,) if year else ()
+    cursor.execute(
+        f"SELECT MachineID, `Year`, `Month`, {_COLS_SQL} FROM dayvalues_machine_month {year_filter}",
+        year_params,
+    )
+    roll_machine = {tuple(int(v) for v in r[:3]): r[3:] for r in cursor.fetchall()}
+    cursor.execute(
+        f"SELECT LineID, `Year`, `Month`, {_COLS_SQL} FROM dayvalues_line_month {year_filter}",
+        year_params,
+    )
+    roll_line = {tuple(int(v) for v in r[:3]): r[3:] for r in cursor.fetchall()}
+    cursor.close()
+
+    return (
+        _compare(raw_machine, roll_machine, "machine", tolerance)
+        + _compare(raw_line, roll_line, "line", tolerance)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollup tháng cho dayvalues")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--rebuild", action="store_true")
+    group.add_argument("--sync", action="store_true")
+    group.add_argument("--check", action="store_true")
+    parser.add_argument("--year", type=int)
+    args = parser.parse_args()
+
+    conn = connect()
+    t0 = time.perf_counter()
+    if args.rebuild:
+        rebuild(conn, args.year)
+        print(f"✅ Dựng lại rollup xong ({time.perf_counter() - t0:.2f}s)")
+    elif args.sync:
+        ok = sync(conn)
+        print("✅ Sync xong" if ok else "⚠ Worker khác đang sync, bỏ qua")
+    else:
+        problems = check(conn, args.year)
+        for p in problems[:50]:
+            print("⚠", p)
+        print(f"{'✅ Rollup khớp bảng gốc' if not problems else f'⚠ {len(problems)} chênh lệch'}")
+        conn.close()
+        sys.exit(1 if problems else 0)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
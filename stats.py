@@ -0,0 +1,87 @@
+"""
+Thống kê phân phối cho 4 ratio (OEE, OK, Output, Activity) của 1 máy / 1 line trong 1 khoảng ngày.
+
+Mỗi ratio: count, mean, median, p10, p90, std, min, max, slope (xu hướng / ngày, hồi quy tuyến tính).
+NULL bị bỏ qua (giống AVG của MySQL). Tính bằng NumPy trên kết quả của 1 query.
+"""
+import numpy as np
+
+from metrics import RATIO_COLUMNS
+
+STAT_DIGITS = 4
+
+
+def _series(rows, start):
+    """rows (Days + 4 ratio) → (x = số ngày tính từ start, ma trận (ngày, 4) NaN = NULL)."""
+    x = np.array([(r["Days"] - start).days for r in rows], dtype=float)
+    values = np.array([[r.get(c) for c in RATIO_COLUMNS] for r in rows], dtype=float)
+    return x, values.reshape(len(rows), len(RATIO_COLUMNS))
+
+
+def _slope(x, y):
+    if len(x) < 2 or np.all(x == x[0]):
+        return 0.0
+    x_mean = x.mean()
+    return float(((x - x_mean) * (y - y.mean())).sum() / ((x - x_mean) ** 2).sum())
+
+
+def ratio_stats(rows, start):
+    """{ratio: {count, mean, median, p10, p90, std, min, max, slope}}; ratio không có dữ liệu → count 0, còn lại None."""
+    x, values = _series(rows, start)
+    result = {}
+    for j, name in enumerate(RATIO_COLUMNS):
+        col = values[:, j]
+        ok = ~np.isnan(col)
+        y, xs = col[ok], x[ok]
+        if not len(y):
+            result[name] = {
+                "count": 0, "mean": None, "median": None, "p10": None, "p90": None,
+                "std": None, "min": None, "max": None, "slope": None,
+            }
+            continue
+        p10, median, p90 = np.percentile(y, [10, 50, 90])
+        result[name] = {
+            "count": int(len(y)),
+            "mean": round(float(y.mean()), STAT_DIGITS),
+            "median": round(float(median), STAT_DIGITS),
+            "p10": round(float(p10), STAT_DIGITS),
+            "p90": round(float(p90), STAT_DIGITS),
+            "std": round(float(y.std()), STAT_DIGITS),
+            "min": round(float(y.min()), STAT_DIGITS),
+            "max": round(float(y.max()), STAT_DIGITS),
+            "slope": round(_slope(xs, y), STAT_DIGITS),
+        }
+    return result
+
+
+def machine_ratio_rows(cursor, machine_id, start, end):
+    cursor.execute(
+        f"""
+        SELECT Days, {", ".join(RATIO_COLUMNS)}
+        FROM sdvn.dayvalues
+        WHERE MachineID = %s
+          AND Days >= %s AND Days < %s
+        ORDER BY Days
+        """,
+        (machine_id, start, end),
+    )
+    return cursor.fetchall()
+
+
+def line_ratio_rows(cursor, line_id, start, end):
+    """1 dòng / ngày: AVG ratio của các máy IsActive trong line (như month-ratio của line)."""
+    cursor.execute(
+        f"""
+        SELECT
+            dv.Days,
+            {", ".join(f"AVG(dv.{c}) AS {c}" for c in RATIO_COLUMNS)}
+        FROM sdvn.dayvalues dv
+        JOIN sdvn.machine m ON dv.MachineID = m.MachineID
+        WHERE m.LineID = %s AND IsActive = 1
+          AND dv.Days >= %s AND dv.Days < %s
+        GROUP BY dv.Days
+        ORDER BY dv.Days
+        """,
+        (line_id, start, end),
+    )
+    return cursor.fetchall()
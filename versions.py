@@ -0,0 +1,93 @@
+"""
+"Phiên bản dữ liệu" của 1 bảng: đổi khi có dòng mới / sửa / xoá.
+
+Ghép từ:
+  - table_version.version: bộ đếm do trigger AFTER INSERT/UPDATE/DELETE tăng
+    (migrations/009_table_version.sql) → mọi lệnh ghi, kể cả UPDATE tại chỗ / upsert / writer ngoài app
+  - MAX(id) của cache_invalidation (group) → bảng dẫn xuất (rollup, errorevent_daily) do job đồng bộ
+    ghi sau mỗi lần đổi; publish_invalidation thủ công (/api/cache/invalidate) cũng đổi version
+
+Không dùng information_schema.TABLES.UPDATE_TIME: MySQL 8 nhớ giá trị này
+information_schema_stats_expiry giây (mặc định 86400) → có thể trễ cả ngày.
+
+Dùng cho:
+  - key file export đã build (export_jobs): cùng version = cùng dữ liệu = dùng lại file cũ
+  - ETag / Last-Modified của các API đọc (conditional.py)
+"""
+from datetime import datetime, timezone
+
+# bảng -> (dòng trong table_version, group trong cache_invalidation)
+VERSIONED_TABLES = {
+    "dayvalues": ("dayvalues", "dayvalues"),
+    "dayvalues_machine_month": (None, "rollup"),   # rollup.py ghi cache_invalidation sau mỗi lần đổi
+    "dayvalues_line_month": (None, "rollup"),
+    "errorevent": ("errorevent", None),
+    "errorevent_daily": (None, "errorevent"),      # error_rollup.py ghi cache_invalidation sau mỗi lần đổi
+    "production_output": ("production_output", None),
+    "plan_production": ("plan_production", None),
+    "machine": ("machine", "catalog"),
+    "productionline": ("productionline", "catalog"),
+    "errortype": ("errortype", None),
+}
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _utc(epoch):
+    return datetime.fromtimestamp(float(epoch), timezone.utc) if epoch is not None else None
+
+
+def tables_state(conn, tables):
+    """
+    {bảng: (version, updated_at)} cho nhiều bảng, gộp query:
+    1 query table_version, 1 query cache_invalidation.
+    updated_at = lần đổi gần nhất (datetime UTC) hoặc None.
+    Bảng có bộ đếm nhưng thiếu dòng trong table_version (chưa chạy migrate.py) → RuntimeError.
+    """
+    tables = list(dict.fromkeys(tables))
+    cursor = conn.cursor()
+
+    counters = {}
+    names = [VERSIONED_TABLES[t][0] for t in tables if VERSIONED_TABLES[t][0]]
+    if names:
+        cursor.execute(
+            f"""
+            SELECT tbl, version, UNIX_TIMESTAMP(changed_at)
+            FROM table_version
+            WHERE tbl IN ({_placeholders(names)})
+            """,
+            names,
+        )
+        counters = {name: (version, changed) for name, version, changed in cursor.fetchall()}
+
+    invalidations = {}
+    groups = sorted({VERSIONED_TABLES[t][1] for t in tables if VERSIONED_TABLES[t][1]})
+    if groups:
+        cursor.execute(
+            f"""
+            SELECT grp, MAX(id), UNIX_TIMESTAMP(MAX(created_at))
+            FROM cache_invalidation
+            WHERE grp IN ({_placeholders(groups)})
+            GROUP BY grp
+            """,
+            groups,
+        )
+        invalidations = {grp: (inv_id, created) for grp, inv_id, created in cursor.fetchall()}
+    cursor.close()
+
+    result = {}
+    for t in tables:
+        name, group = VERSIONED_TABLES[t]
+        if name and name not in counters:
+            raise RuntimeError(f"table_version chưa có dòng '{name}' – chạy python migrate.py")
+        counter, changed = counters.get(name, (0, None))
+        inv_id, created = invalidations.get(group, (0, None))
+        stamps = [ts for ts in (_utc(changed), _utc(created)) if ts is not None]
+        result[t] = (f"{counter}-{inv_id}", max(stamps) if stamps else None)
+    return result
+
+
+def data_version(conn, table="dayvalues"):
+    return tables_state(conn, [table])[table][0]
@@ -0,0 +1,32 @@
+"""
+Entry point production.
+
+Linux (nhiều process x nhiều thread):
+    gunicorn -c gunicorn.conf.py wsgi:app
+    kill -HUP <pid master>        # reload code + config, worker cũ xử lý nốt request rồi mới thoát
+
+Windows / không có gunicorn (1 process, nhiều thread):
+    python wsgi.py                # waitress, APP_THREADS thread
+
+Dev server cũ (debugger + reloader) vẫn chạy bằng: python main.py
+
+Thư viện cần cài: pip install -r requirements.txt
+(gunicorn trên Linux / waitress trên Windows; quart, aiomysql, hypercorn chỉ cho async_api.py)
+"""
+import os
+
+from main import app
+
+
+if __name__ == "__main__":
+    from waitress import serve
+
+    from main import init_worker
+
+    init_worker()
+    serve(
+        app,
+        host=os.environ.get("APP_HOST", "0.0.0.0"),
+        port=int(os.environ.get("APP_PORT", "5000")),
+        threads=int(os.environ.get("APP_THREADS", "8")),
+    )